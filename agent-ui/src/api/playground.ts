@@ -9,7 +9,7 @@ import {
   ComboboxTeam,
   Team
 } from '@/types/playground'
-import { TaskGroup, TaskFilter } from '@/types/tasks'
+import { TaskGroup, TaskFilter, WorkflowTask } from '@/types/tasks'
 
 export const getPlaygroundAgentsAPI = async (
   endpoint: string
@@ -186,7 +186,8 @@ export const deletePlaygroundTeamSessionAPI = async (
 export const getFathomTasksAPI = async (
   baseUrl: string,
   filter?: TaskFilter,
-  signal?: AbortSignal
+  signal?: AbortSignal,
+  onGroups?: (groups: TaskGroup[]) => void
 ): Promise<TaskGroup[]> => {
   try {
     const params = new URLSearchParams()
@@ -197,16 +198,49 @@ export const getFathomTasksAPI = async (
     if (filter?.states?.length) params.append('states', filter.states.join(','))
     if (filter?.correlationIds?.length) params.append('correlationIds', filter.correlationIds.join(','))
     
-    const url = `${APIRoutes.GetFathomTasks(baseUrl)}${params.toString() ? `?${params.toString()}` : ''}`
+    // NDJSON TaskGroup lines merged by ultimateParentId (`complete` replaces, otherwise children append),
+    // then TasksCompleted (or TasksError)
+    const url = `${APIRoutes.StreamFathomTasks(baseUrl)}${params.toString() ? `?${params.toString()}` : ''}`
     
     const response = await fetch(url, { method: 'GET', signal })
     
-    if (!response.ok) {
+    if (!response.ok || !response.body) {
       throw new Error(`Failed to fetch tasks: ${response.statusText}`)
     }
     
-    const data = await response.json()
-    return data.taskGroups || []
+    const merged = new Map<string, { ultimateParent: WorkflowTask | null; children: WorkflowTask[] }>()
+    const toGroups = (): TaskGroup[] =>
+      Array.from(merged.values())
+        .filter((g): g is { ultimateParent: WorkflowTask; children: WorkflowTask[] } => g.ultimateParent !== null)
+        .map((g) => ({ ...g, totalCount: g.children.length + 1 }))
+    const reader = response.body.getReader()
+    const decoder = new TextDecoder()
+    let buffer = ''
+    for (;;) {
+      const { done, value } = await reader.read()
+      buffer += done ? decoder.decode() : decoder.decode(value, { stream: true })
+      const lines = buffer.split('\n')
+      buffer = done ? '' : (lines.pop() ?? '')
+      let changed = false
+      for (const line of lines) {
+        if (!line.trim()) continue
+        const event = JSON.parse(line)
+        if (event.event === 'TaskGroup') {
+          const current = merged.get(event.ultimateParentId)
+          merged.set(event.ultimateParentId, {
+            ultimateParent: event.ultimateParent ?? current?.ultimateParent ?? null,
+            children: event.complete || !current ? event.children : [...current.children, ...event.children]
+          })
+          changed = true
+        } else if (event.event === 'TasksError') {
+          throw new Error(event.detail)
+        }
+      }
+      // Render groups as they arrive rather than after the whole listing
+      if (onGroups && changed) onGroups(toGroups())
+      if (done) break
+    }
+    return toGroups()
     
   } catch (error) {
     // Suppress UI noise for cancelled requests during debounced typing
@@ -41,5 +41,6 @@ export const APIRoutes = {
 
   // Fathom API routes
   GetFathomTasks: (baseUrl: string) => `${baseUrl}/fathom/tasks`,
+  StreamFathomTasks: (baseUrl: string) => `${baseUrl}/fathom/tasks/stream`,
   GetFathomTask: (baseUrl: string, taskId: string) => `${baseUrl}/fathom/tasks/${taskId}`
 }
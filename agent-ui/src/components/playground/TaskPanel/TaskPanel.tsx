@@ -46,7 +46,7 @@ export function TaskPanel({ showHeader = true, className, visibleOverride }: Tas
         abortRef.current = controller
         // Use backend endpoint (port 8000) instead of playground endpoint
         const backendUrl = selectedEndpoint.replace(':7777', ':8000')
-        const groups = await getFathomTasksAPI(backendUrl, taskFilter, controller.signal)
+        const groups = await getFathomTasksAPI(backendUrl, taskFilter, controller.signal, setTaskGroups)
         setTaskGroups(groups)
       } catch (error) {
         // Ignore aborted requests generated by debounced typing/backspacing
@@ -185,6 +185,8 @@ const useAIChatStreamHandler = () => {
       })
 
       let lastContent = ''
+      // Delta stream: false after a missed delta until the next checkpoint
+      let deltaInSync = true
       let newSessionId = sessionId
       try {
         const endpointUrl = constructEndpointUrl(selectedEndpoint)
@@ -208,6 +210,7 @@ const useAIChatStreamHandler = () => {
         }
 
         formData.append('stream', 'true')
+        formData.append('stream_mode', 'delta')
         // Guard session id: only send valid UUIDish values; avoid 'null'/'undefined'
         const sidCandidate = ((sessionId ?? currentSessionId) ?? '').trim()
         const sid = sidCandidate && sidCandidate !== 'null' && sidCandidate !== 'undefined' ? sidCandidate : ''
@@ -282,7 +285,8 @@ const useAIChatStreamHandler = () => {
               chunk.event === RunEvent.ToolCallStarted ||
               chunk.event === RunEvent.TeamToolCallStarted ||
               chunk.event === RunEvent.ToolCallCompleted ||
-              chunk.event === RunEvent.TeamToolCallCompleted
+              chunk.event === RunEvent.TeamToolCallCompleted ||
+              chunk.event === RunEvent.ToolCallProgress
             ) {
               setMessages((prevMessages) => {
                 const newMessages = [...prevMessages]
@@ -313,9 +317,22 @@ const useAIChatStreamHandler = () => {
                   lastMessage.role === 'agent' &&
                   typeof chunk.content === 'string'
                 ) {
-                  const uniqueContent = chunk.content.replace(lastContent, '')
-                  lastMessage.content += uniqueContent
-                  lastContent = chunk.content
+                  if (chunk.checkpoint) {
+                    lastMessage.content = chunk.content
+                    lastContent = chunk.content
+                    deltaInSync = true
+                  } else if (chunk.delta) {
+                    if (deltaInSync && chunk.offset === lastContent.length) {
+                      lastMessage.content += chunk.content
+                      lastContent += chunk.content
+                    } else {
+                      deltaInSync = false
+                    }
+                  } else {
+                    const uniqueContent = chunk.content.replace(lastContent, '')
+                    lastMessage.content += uniqueContent
+                    lastContent = chunk.content
+                  }
 
                   // Handle tool calls streaming
                   lastMessage.tool_calls = processChunkToolCalls(
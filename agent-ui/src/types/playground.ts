@@ -92,6 +92,7 @@ export enum RunEvent {
   RunError = 'RunError',
   ToolCallStarted = 'ToolCallStarted',
   ToolCallCompleted = 'ToolCallCompleted',
+  ToolCallProgress = 'ToolCallProgress',
   UpdatingMemory = 'UpdatingMemory',
   ReasoningStarted = 'ReasoningStarted',
   ReasoningStep = 'ReasoningStep',
@@ -126,6 +127,12 @@ export interface NewRunResponse {
 export interface RunResponseContent {
   content?: string | object
   content_type: string
+  /** stream_mode=delta: `content` is only the new text, starting at `offset` */
+  delta?: boolean
+  /** stream_mode=delta: `content` is the whole answer so far (resync point) */
+  checkpoint?: boolean
+  seq?: number
+  offset?: number
   context?: MessageContext[]
   event: RunEvent
   event_data?: object
@@ -148,6 +155,10 @@ export interface RunResponseContent {
 export interface RunResponse {
   content?: string | object
   content_type: string
+  delta?: boolean
+  checkpoint?: boolean
+  seq?: number
+  offset?: number
   context?: MessageContext[]
   event: RunEvent
   event_data?: object
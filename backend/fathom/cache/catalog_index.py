@@ -0,0 +1,270 @@
+from __future__ import annotations
+
+import heapq
+import re
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+
+_WORD_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+
+
+def field_tokens(text: str) -> Set[str]:
+    """Lowercased words of a field name or description; CamelCase is split (LusidInstrumentId -> lusid, instrument, id)."""
+    text = text or ""
+    tokens = {w.lower() for w in _WORD_RE.findall(text)}
+    tokens |= {w.lower() for w in re.findall(r"[A-Za-z0-9]+", text)}
+    return tokens
+
+
+def like_to_regex(pattern: str) -> "re.Pattern[str]":
+    """Compile a SQL LIKE pattern (`%`/`*` any run, `_` one character), case-insensitively."""
+    out = []
+    for ch in pattern:
+        if ch in "%*":
+            out.append(".*")
+        elif ch == "_":
+            out.append(".")
+        else:
+            out.append(re.escape(ch))
+    return re.compile("^" + "".join(out) + "$", re.IGNORECASE | re.DOTALL)
+
+
+def trigrams(text: str) -> Set[str]:
+    padded = f"  {text.lower()} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _dice(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return 2.0 * len(a & b) / (len(a) + len(b))
+
+
+class FuzzyTableMatcher:
+    """Ranked did-you-mean suggestions for dotted table names (`Lusid.Portfolio.Holding`).
+
+    Candidates come from a trigram inverted index, probing the query's rarest trigrams first under a fixed
+    posting budget, so lookups stay well under a millisecond however large the catalog is. The shortlist
+    is re-scored on the whole name plus segment by segment, so a misspelt or missing provider prefix
+    (`Portfolio.Holdings`) still ranks the right table first.
+    """
+
+    def __init__(self, posting_budget: int = 1500, shortlist: int = 24) -> None:
+        self._postings: Dict[str, Set[str]] = {}
+        self._grams: Dict[str, Set[str]] = {}
+        self._segments: Dict[str, List[Set[str]]] = {}
+        self._posting_budget = posting_budget
+        self._shortlist = shortlist
+
+    def __len__(self) -> int:
+        return len(self._grams)
+
+    def add(self, key: str) -> None:
+        if key in self._grams:
+            return
+        grams = trigrams(key)
+        self._grams[key] = grams
+        self._segments[key] = [trigrams(seg) for seg in key.split(".") if seg]
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(key)
+
+    def score(self, query: str, key: str, query_grams: Optional[Set[str]] = None) -> float:
+        query_grams = query_grams if query_grams is not None else trigrams(query)
+        whole = _dice(query_grams, self._grams[key])
+        segments = self._segments[key]
+        query_segments = [trigrams(seg) for seg in query.split(".") if seg]
+        if segments and query_segments:
+            per_segment = sum(max(_dice(q, c) for c in segments) for q in query_segments) / len(query_segments)
+        else:
+            per_segment = whole
+        bonus = 0.1 if key.startswith(query) else 0.0
+        return 0.5 * whole + 0.5 * per_segment + bonus
+
+    def suggest(self, query: str, n: int = 5, cutoff: float = 0.3) -> List[str]:
+        """Up to `n` keys scoring at least `cutoff` (0..1), best first."""
+        query = query.strip().lower()
+        if not query or not self._grams:
+            return []
+        query_grams = trigrams(query)
+        # Rarest trigrams carry the most signal; a typo's trigrams usually have no postings at all (cost 0)
+        probes = sorted((gram for gram in query_grams if gram in self._postings), key=lambda g: len(self._postings[g]))
+        counts: Counter = Counter()
+        spent = 0
+        for i, gram in enumerate(probes):
+            postings = self._postings[gram]
+            if i >= 3 and spent + len(postings) > self._posting_budget:
+                break
+            counts.update(postings)
+            spent += len(postings)
+        shortlist = heapq.nlargest(self._shortlist, counts.items(), key=lambda kv: kv[1])
+        scored = [(self.score(query, key, query_grams), key) for key, _ in shortlist if key != query]
+        scored.sort(key=lambda sk: (-sk[0], sk[1]))
+        return [key for score, key in scored[:n] if score >= cutoff]
+
+
+class _TrieNode:
+    __slots__ = ("children", "tables")
+
+    def __init__(self) -> None:
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.tables: List[str] = []
+
+
+class CatalogIndex:
+    """Local index over the Luminesce catalog (`/api/Catalog/fields` rows).
+
+    - Trie over lowercased table names: wildcard `tableLike` patterns walk their literal prefix, then the
+      few remaining candidates are matched against the full pattern
+    - Inverted index from field-name / description words to (table, field): "which tables have a column
+      like X" without scanning every table
+    - `complete` is set once the whole catalog has been bulk-loaded; until then the index only knows the
+      tables seen so far and callers must not treat a wildcard miss as authoritative
+    """
+
+    def __init__(self) -> None:
+        self._root = _TrieNode()
+        self._names: Dict[str, str] = {}
+        self._fields: Dict[str, List[Dict[str, Any]]] = {}
+        self._postings: Dict[str, Set[Tuple[str, int]]] = {}
+        self._matcher = FuzzyTableMatcher()
+        self.complete = False
+        self.loaded_at: Optional[float] = None
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def __contains__(self, table: str) -> bool:
+        return table.strip().lower() in self._names
+
+    # --- maintenance -------------------------------------------------------------------------
+
+    def add_table(self, table: str, fields: List[Dict[str, Any]]) -> None:
+        key = table.strip().lower()
+        if not key:
+            return
+        if key in self._names:
+            self._unindex_fields(key)
+        else:
+            node = self._root
+            for ch in key:
+                node = node.children.setdefault(ch, _TrieNode())
+            node.tables.append(key)
+            self._matcher.add(key)
+        self._names[key] = table.strip()
+        self._fields[key] = list(fields)
+        for pos, field in enumerate(self._fields[key]):
+            words = field_tokens(field.get("FieldName") or "") | field_tokens(field.get("Description") or "")
+            for word in words:
+                self._postings.setdefault(word, set()).add((key, pos))
+
+    def _unindex_fields(self, key: str) -> None:
+        for pos, field in enumerate(self._fields.get(key, [])):
+            words = field_tokens(field.get("FieldName") or "") | field_tokens(field.get("Description") or "")
+            for word in words:
+                bucket = self._postings.get(word)
+                if bucket is not None:
+                    bucket.discard((key, pos))
+                    if not bucket:
+                        del self._postings[word]
+
+    def replace_all(self, tables: Iterable[Tuple[str, List[Dict[str, Any]]]]) -> None:
+        fresh = CatalogIndex()
+        for table, fields in tables:
+            fresh.add_table(table, fields)
+        self._root, self._names, self._fields, self._postings = fresh._root, fresh._names, fresh._fields, fresh._postings
+        self._matcher = fresh._matcher
+
+    # --- lookups -----------------------------------------------------------------------------
+
+    def table_names(self) -> List[str]:
+        return list(self._names.values())
+
+    def fields(self, table: str) -> Optional[List[Dict[str, Any]]]:
+        return self._fields.get(table.strip().lower())
+
+    def _under(self, prefix: str) -> List[str]:
+        node = self._root
+        for ch in prefix:
+            node = node.children.get(ch)
+            if node is None:
+                return []
+        out: List[str] = []
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            out.extend(current.tables)
+            stack.extend(current.children.values())
+        return out
+
+    def match_tables(self, pattern: str) -> List[str]:
+        """Table names matching a LIKE pattern (plain names match exactly, case-insensitively)."""
+        lowered = pattern.strip().lower()
+        cut = min([i for i in (lowered.find("%"), lowered.find("*"), lowered.find("_")) if i >= 0] or [len(lowered)])
+        prefix = lowered[:cut]
+        if cut == len(lowered):
+            return [self._names[lowered]] if lowered in self._names else []
+        regex = like_to_regex(lowered)
+        return sorted(self._names[k] for k in self._under(prefix) if regex.match(k))
+
+    def match_fields(self, table_like: str) -> List[Dict[str, Any]]:
+        """Catalog rows for every table matching `table_like` (the shape `/api/Catalog/fields` returns)."""
+        out: List[Dict[str, Any]] = []
+        for name in self.match_tables(table_like):
+            for field in self._fields.get(name.lower(), []):
+                item = dict(field)
+                item.setdefault("TableName", name)
+                out.append(item)
+        return out
+
+    def search_fields(self, field_like: str, table_like: str = "%", limit: int = 200) -> List[Dict[str, Any]]:
+        """Fields whose name matches `field_like` (LIKE pattern or words; descriptions count for words).
+
+        Ranked: exact name, name containing every word, then description-only matches.
+        """
+        query = field_like.strip()
+        if not query:
+            return []
+        allowed: Optional[Set[str]] = None
+        if table_like.strip() not in ("", "%", "*"):
+            allowed = {name.lower() for name in self.match_tables(table_like)}
+        hits: List[Tuple[int, str, int]] = []
+        if any(ch in query for ch in "%*_"):
+            regex = like_to_regex(query)
+            for key, fields in self._fields.items():
+                if allowed is not None and key not in allowed:
+                    continue
+                for pos, field in enumerate(fields):
+                    if regex.match(field.get("FieldName") or ""):
+                        hits.append((0, key, pos))
+        else:
+            words = field_tokens(query)
+            candidates: Optional[Set[Tuple[str, int]]] = None
+            for word in words:
+                bucket = self._postings.get(word, set())
+                candidates = set(bucket) if candidates is None else candidates & bucket
+                if not candidates:
+                    return []
+            lowered = query.lower()
+            for key, pos in candidates or ():
+                if allowed is not None and key not in allowed:
+                    continue
+                name = (self._fields[key][pos].get("FieldName") or "")
+                if name.lower() == lowered:
+                    rank = 0
+                elif words <= field_tokens(name):
+                    rank = 1
+                else:
+                    rank = 2
+                hits.append((rank, key, pos))
+        hits.sort(key=lambda h: (h[0], h[1], h[2]))
+        out: List[Dict[str, Any]] = []
+        for _, key, pos in hits[:limit]:
+            item = dict(self._fields[key][pos])
+            item.setdefault("TableName", self._names[key])
+            out.append(item)
+        return out
+
+    def suggest_tables(self, name: str, n: int = 5) -> List[str]:
+        """Did-you-mean candidates for an unknown table name, best first."""
+        return [self._names[key] for key in self._matcher.suggest(name, n=n)]
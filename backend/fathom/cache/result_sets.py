@@ -0,0 +1,320 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import os
+import pickle
+import shutil
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set, Tuple
+
+
+def default_result_spill_dir() -> str:
+    return os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", ".cache", "result_sets"))
+
+
+def _write_table(path: str, table: Any) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as fh:
+        pickle.dump(table, fh, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _read_table(path: str) -> Any:
+    with open(path, "rb") as fh:
+        return pickle.load(fh)
+
+
+def _remove_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True  # exists but belongs to another user
+    return True
+
+
+def _remove_stale_spills(spill_dir: str, keep: str) -> int:
+    """Delete spill entries not owned by a live process (other than `keep`); returns how many were removed."""
+    try:
+        names = os.listdir(spill_dir)
+    except OSError:
+        return 0
+    removed = 0
+    for name in names:
+        path = os.path.join(spill_dir, name)
+        if path == keep:
+            continue
+        pid, _, _ = name.partition("-")
+        if os.path.isdir(path) and pid.isdigit() and int(pid) != os.getpid() and _process_alive(int(pid)):
+            continue  # another worker's live spill directory
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            _remove_file(path)
+        removed += 1
+    return removed
+
+
+class _StoredTable:
+    """One table object and where it lives; shared by every result set (in any session) that refers to it."""
+
+    __slots__ = ("serial", "table", "nbytes", "path", "entries", "spilling", "loading")
+
+    def __init__(self, serial: int, table: Any, nbytes: int) -> None:
+        self.serial = serial
+        self.table = table
+        self.nbytes = nbytes
+        self.path: Optional[str] = None
+        self.entries: Set["_ResultSet"] = set()
+        self.spilling = False
+        self.loading: Optional[asyncio.Future] = None
+
+
+class _ResultSet:
+    __slots__ = ("session_id", "result_id", "sql", "key", "stored", "used_at")
+
+    def __init__(self, session_id: str, result_id: str, sql: str, key: Optional[str], stored: _StoredTable) -> None:
+        self.session_id = session_id
+        self.result_id = result_id
+        self.sql = sql
+        self.key = key
+        self.stored = stored
+        self.used_at = time.time()
+
+
+class ResultSetStore:
+    """Full `sql_execute` results kept per chat session so follow-up questions run locally.
+
+    - Result ids (`r1`, `r2`, ...) are per session; a session keeps its RESULT_SETS_MAX_PER_SESSION
+      (default 20) most recent results and drops them after RESULT_SETS_TTL_SECONDS (default 3600) idle
+    - Tables in memory are bounded by RESULT_SETS_MAX_MEMORY_BYTES (default 256 MiB); the least recently
+      used are spilled to RESULT_SETS_SPILL_DIR (default backend/.cache/result_sets) and loaded back on
+      access; spilled files beyond RESULT_SETS_MAX_DISK_BYTES (default 1 GiB) are deleted
+    - Each process spills into its own `<pid>-<random>` subdirectory, so workers sharing the spill dir never
+      read each other's files; `remove_stale_spills` clears what dead processes left behind
+    - Tables are immutable once stored, so a cached query answered for the same caller reuses its table;
+      a table shared by several result sets is held, counted and spilled once
+    - Pickling, unpickling and file removal run in worker threads, never on the event loop
+    """
+
+    def __init__(
+        self,
+        max_memory_bytes: Optional[int] = None,
+        max_disk_bytes: Optional[int] = None,
+        max_per_session: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+        spill_dir: Optional[str] = None,
+    ) -> None:
+        self.max_memory_bytes = int(max_memory_bytes if max_memory_bytes is not None else os.getenv("RESULT_SETS_MAX_MEMORY_BYTES", str(256 * 1024 * 1024)))
+        self.max_disk_bytes = int(max_disk_bytes if max_disk_bytes is not None else os.getenv("RESULT_SETS_MAX_DISK_BYTES", str(1024 * 1024 * 1024)))
+        self.max_per_session = int(max_per_session if max_per_session is not None else os.getenv("RESULT_SETS_MAX_PER_SESSION", "20"))
+        self.ttl_seconds = float(ttl_seconds if ttl_seconds is not None else os.getenv("RESULT_SETS_TTL_SECONDS", "3600"))
+        self.spill_dir = spill_dir if spill_dir is not None else os.getenv("RESULT_SETS_SPILL_DIR", default_result_spill_dir())
+        self._process_dir = os.path.join(self.spill_dir, f"{os.getpid()}-{uuid.uuid4().hex[:8]}") if self.spill_dir else ""
+        self._sessions: Dict[str, "OrderedDict[str, _ResultSet]"] = {}
+        self._counters: Dict[str, int] = {}
+        self._serials = itertools.count(1)
+        self._by_object: Dict[int, _StoredTable] = {}  # id(table) -> its entry, while the table is in memory
+        self._resident: "OrderedDict[int, _StoredTable]" = OrderedDict()  # LRU of in-memory tables
+        self._spilled: "OrderedDict[int, _StoredTable]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = 0
+
+    @property
+    def memory_bytes(self) -> int:
+        return self._memory_bytes
+
+    @property
+    def disk_bytes(self) -> int:
+        return self._disk_bytes
+
+    async def add(self, session_id: str, table: Any, sql: str, key: Optional[str] = None) -> str:
+        """Store `table` (a ColumnarResult) for the session and return its result id."""
+        await self._expire()
+        stored = self._by_object.get(id(table))
+        if stored is None or stored.table is not table:
+            stored = _StoredTable(next(self._serials), table, int(table.nbytes()))
+            self._by_object[id(table)] = stored
+            self._resident[stored.serial] = stored
+            self._memory_bytes += stored.nbytes
+        else:
+            self._touch(stored)
+        n = self._counters.get(session_id, 0) + 1
+        self._counters[session_id] = n
+        result_id = f"r{n}"
+        entry = _ResultSet(session_id, result_id, sql, key, stored)
+        stored.entries.add(entry)
+        sets = self._sessions.setdefault(session_id, OrderedDict())
+        sets[result_id] = entry
+        while len(sets) > self.max_per_session:
+            await self._drop(next(iter(sets.values())))
+        await self._enforce_memory(keep=stored.serial)
+        return result_id
+
+    async def get(self, session_id: str, result_id: str) -> Optional[Tuple[Any, str]]:
+        """Return (table, sql) or None; spilled tables are loaded back into memory."""
+        await self._expire()
+        entry = (self._sessions.get(session_id) or {}).get(result_id)
+        if entry is None:
+            return None
+        table = await self._load(entry.stored)
+        if table is None:
+            return None
+        entry.used_at = time.time()
+        sets = self._sessions.get(session_id)
+        if sets is not None and sets.get(result_id) is entry:
+            sets.move_to_end(result_id)
+        return table, entry.sql
+
+    async def find_by_key(self, key: str) -> Optional[Any]:
+        """Any stored table for this result-cache key (same normalised SQL and caller)."""
+        for entries in list(self._sessions.values()):
+            for entry in list(entries.values()):
+                if entry.key == key:
+                    return await self._load(entry.stored)
+        return None
+
+    async def remove_stale_spills(self) -> int:
+        """Delete spill files left by earlier or dead processes (app startup)."""
+        if not self.spill_dir:
+            return 0
+        return await asyncio.to_thread(_remove_stale_spills, self.spill_dir, self._process_dir)
+
+    async def drop_session(self, session_id: str) -> None:
+        for entry in list((self._sessions.get(session_id) or {}).values()):
+            await self._drop(entry)
+        self._sessions.pop(session_id, None)
+        self._counters.pop(session_id, None)
+
+    # --- internals ---------------------------------------------------------------------------
+
+    def _touch(self, stored: _StoredTable) -> None:
+        if stored.serial in self._resident:
+            self._resident.move_to_end(stored.serial)
+        elif stored.table is not None:
+            # Used again while its spill file is still being written: keep it in memory
+            self._resident[stored.serial] = stored
+            self._memory_bytes += stored.nbytes
+
+    async def _load(self, stored: _StoredTable) -> Optional[Any]:
+        if stored.table is not None:
+            self._touch(stored)
+            return stored.table
+        if stored.path is None:
+            return None
+        if stored.loading is None:
+            stored.loading = asyncio.ensure_future(self._reload(stored))
+        # Shielded: a cancelled caller must not abort a reload other callers are waiting on
+        return await asyncio.shield(stored.loading)
+
+    async def _reload(self, stored: _StoredTable) -> Optional[Any]:
+        path = stored.path
+        try:
+            table = await asyncio.to_thread(_read_table, path)
+        except Exception as e:
+            print(f"[Fathom] Result set table {stored.serial} could not be reloaded: {e}")
+            await self._evict(stored)
+            return None
+        finally:
+            stored.loading = None
+        if not stored.entries or stored.path != path:
+            return None  # dropped while reading
+        self._spilled.pop(stored.serial, None)
+        self._disk_bytes -= stored.nbytes
+        stored.path = None
+        stored.table = table
+        self._by_object[id(table)] = stored
+        self._resident[stored.serial] = stored
+        self._memory_bytes += stored.nbytes
+        await asyncio.to_thread(_remove_file, path)
+        await self._enforce_memory(keep=stored.serial)
+        return table
+
+    async def _enforce_memory(self, keep: Optional[int] = None) -> None:
+        while self._memory_bytes > self.max_memory_bytes and self._resident:
+            serial, stored = next(iter(self._resident.items()))
+            if serial == keep:
+                if len(self._resident) == 1:
+                    return
+                self._resident.move_to_end(serial)
+                continue
+            await self._spill(stored)
+
+    async def _spill(self, stored: _StoredTable) -> None:
+        self._resident.pop(stored.serial, None)
+        self._memory_bytes -= stored.nbytes
+        if stored.spilling:
+            return  # an earlier spill of this table is still writing and will finish the job
+        table = stored.table
+        if table is None or not self.spill_dir or stored.nbytes > self.max_disk_bytes:
+            await self._evict(stored)
+            return
+        path = os.path.join(self._process_dir, f"{stored.serial}.pkl")
+        stored.spilling = True
+        try:
+            await asyncio.to_thread(_write_table, path, table)
+        except Exception as e:
+            print(f"[Fathom] Result set spill failed: {e}")
+            await asyncio.to_thread(_remove_file, path)
+            if stored.serial not in self._resident:
+                await self._evict(stored)
+            return
+        finally:
+            stored.spilling = False
+        if not stored.entries or stored.serial in self._resident:
+            # Dropped, or used again, while the file was being written
+            await asyncio.to_thread(_remove_file, path)
+            return
+        if self._by_object.get(id(table)) is stored:
+            del self._by_object[id(table)]
+        stored.table = None
+        stored.path = path
+        self._spilled[stored.serial] = stored
+        self._disk_bytes += stored.nbytes
+        while self._disk_bytes > self.max_disk_bytes and self._spilled:
+            await self._evict(next(iter(self._spilled.values())))
+
+    def _forget(self, entry: _ResultSet) -> None:
+        sets = self._sessions.get(entry.session_id)
+        if sets is not None and sets.get(entry.result_id) is entry:
+            del sets[entry.result_id]
+        entry.stored.entries.discard(entry)
+
+    async def _drop(self, entry: _ResultSet) -> None:
+        self._forget(entry)
+        if not entry.stored.entries:
+            await self._release(entry.stored)
+
+    async def _evict(self, stored: _StoredTable) -> None:
+        """Forget a table and every result set that refers to it."""
+        for entry in list(stored.entries):
+            self._forget(entry)
+        await self._release(stored)
+
+    async def _release(self, stored: _StoredTable) -> None:
+        if self._resident.pop(stored.serial, None) is not None:
+            self._memory_bytes -= stored.nbytes
+        if stored.table is not None and self._by_object.get(id(stored.table)) is stored:
+            del self._by_object[id(stored.table)]
+        stored.table = None
+        path, stored.path = stored.path, None
+        if path is not None:
+            if self._spilled.pop(stored.serial, None) is not None:
+                self._disk_bytes -= stored.nbytes
+            await asyncio.to_thread(_remove_file, path)
+
+    async def _expire(self) -> None:
+        cutoff = time.time() - self.ttl_seconds
+        for session_id, sets in list(self._sessions.items()):
+            if sets and max(e.used_at for e in sets.values()) < cutoff:
+                await self.drop_session(session_id)
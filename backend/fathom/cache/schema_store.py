@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def default_schema_store_path() -> str:
+    return os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", ".cache", "schema_catalog.sqlite3"))
+
+
+class SchemaStore:
+    """On-disk Luminesce catalog store (SQLite in WAL mode) shared by all workers on the host.
+
+    Rows hold the raw catalog fields per table plus the time they were fetched, so every worker agrees
+    on staleness. Survives restarts and deploys; safe for concurrent readers and writers.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = os.path.abspath(path)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS schema_fields ("
+            " table_key TEXT PRIMARY KEY,"
+            " table_name TEXT NOT NULL,"
+            " fields TEXT NOT NULL,"
+            " fetched_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS table_usage ("
+            " table_key TEXT PRIMARY KEY,"
+            " table_name TEXT NOT NULL,"
+            " hits INTEGER NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+    def get(self, table_key: str) -> Optional[Tuple[str, List[Dict[str, Any]], float]]:
+        """Return (table_name, fields, fetched_at) or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT table_name, fields, fetched_at FROM schema_fields WHERE table_key = ?", (table_key,)
+            ).fetchone()
+        if row is None:
+            return None
+        try:
+            return row[0], json.loads(row[1]), float(row[2])
+        except ValueError:
+            return None
+
+    def fetched_at(self, table_key: str) -> Optional[float]:
+        with self._lock:
+            row = self._conn.execute("SELECT fetched_at FROM schema_fields WHERE table_key = ?", (table_key,)).fetchone()
+        return float(row[0]) if row else None
+
+    def put(self, table_key: str, table_name: str, fields: List[Dict[str, Any]], fetched_at: Optional[float] = None) -> None:
+        payload = json.dumps(fields, default=str)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO schema_fields (table_key, table_name, fields, fetched_at) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT(table_key) DO UPDATE SET table_name = excluded.table_name,"
+                " fields = excluded.fields, fetched_at = excluded.fetched_at",
+                (table_key, table_name, payload, fetched_at if fetched_at is not None else time.time()),
+            )
+
+    def put_many(self, tables: List[Tuple[str, str, List[Dict[str, Any]]]], fetched_at: Optional[float] = None) -> None:
+        """Write many (table_key, table_name, fields) rows in one transaction (bulk catalog loads)."""
+        ts = fetched_at if fetched_at is not None else time.time()
+        rows = [(key, name, json.dumps(fields, default=str), ts) for key, name, fields in tables]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO schema_fields (table_key, table_name, fields, fetched_at) VALUES (?, ?, ?, ?)"
+                    " ON CONFLICT(table_key) DO UPDATE SET table_name = excluded.table_name,"
+                    " fields = excluded.fields, fetched_at = excluded.fetched_at",
+                    rows,
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def all_tables(self, since: float = 0.0) -> List[Tuple[str, List[Dict[str, Any]], float]]:
+        """Every stored table fetched after `since` as (table_name, fields, fetched_at)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT table_name, fields, fetched_at FROM schema_fields WHERE fetched_at > ?", (since,)
+            ).fetchall()
+        out: List[Tuple[str, List[Dict[str, Any]], float]] = []
+        for name, fields, fetched_at in rows:
+            try:
+                out.append((name, json.loads(fields), float(fetched_at)))
+            except ValueError:
+                continue
+        return out
+
+    def get_meta(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, value),
+            )
+
+    def table_keys(self) -> List[str]:
+        with self._lock:
+            return [r[0] for r in self._conn.execute("SELECT table_key FROM schema_fields")]
+
+    def record_usage(self, usage: Dict[str, Tuple[str, int, float]]) -> None:
+        """Add batched use counts ({table_key: (table_name, hits, last_used)}) in one transaction."""
+        rows = [(key, name, hits, used) for key, (name, hits, used) in usage.items()]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO table_usage (table_key, table_name, hits, last_used) VALUES (?, ?, ?, ?)"
+                    " ON CONFLICT(table_key) DO UPDATE SET hits = hits + excluded.hits,"
+                    " last_used = MAX(last_used, excluded.last_used), table_name = excluded.table_name",
+                    rows,
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def most_used(self, limit: int, since: float) -> List[str]:
+        """Table names used since `since`, most used first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT table_name FROM table_usage WHERE last_used >= ? ORDER BY hits DESC, last_used DESC LIMIT ?",
+                (since, limit),
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
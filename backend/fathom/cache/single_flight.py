@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+Notify = Callable[[Any], None]
+
+
+class _Flight:
+    def __init__(self) -> None:
+        self.task: Optional[asyncio.Task] = None
+        self.waiters = 0
+        self.listeners: List[Notify] = []
+
+    def notify(self, payload: Any) -> None:
+        for listener in list(self.listeners):
+            try:
+                listener(payload)
+            except Exception:
+                pass
+
+
+class SingleFlight:
+    """Collapse concurrent identical calls into one upstream call.
+
+    - `await do(key, fn)` runs `fn(notify)` once per key while it is in flight; callers arriving meanwhile
+      await the same task and receive its result (or exception)
+    - `notify(payload)` fans intermediate updates out to every caller's `listener`
+    - A caller being cancelled only detaches it; the shared call is cancelled once no callers remain
+    """
+
+    def __init__(self) -> None:
+        self._flights: Dict[str, _Flight] = {}
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    def in_flight(self, key: str) -> bool:
+        return key in self._flights
+
+    async def do(
+        self,
+        key: str,
+        fn: Callable[[Notify], Awaitable[Any]],
+        listener: Optional[Notify] = None,
+    ) -> Any:
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight()
+            self._flights[key] = flight
+            flight.task = asyncio.create_task(fn(flight.notify))
+            flight.task.add_done_callback(lambda _t, k=key, f=flight: self._flights.pop(k, None) if self._flights.get(k) is f else None)
+        if listener is not None:
+            flight.listeners.append(listener)
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)  # type: ignore[arg-type]
+        except asyncio.CancelledError:
+            if flight.waiters == 1 and flight.task is not None and not flight.task.done():
+                flight.task.cancel()
+                if self._flights.get(key) is flight:
+                    del self._flights[key]  # later callers start afresh instead of joining a cancelled call
+            raise
+        finally:
+            flight.waiters -= 1
+            if listener is not None and listener in flight.listeners:
+                flight.listeners.remove(listener)
@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import fnmatch
+import hashlib
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+
+_TOKEN_RE = re.compile(
+    r"""
+    (?P<comment>--[^\n]*|/\*.*?\*/)
+    | (?P<string>'(?:[^']|'')*')
+    | (?P<quoted>"(?:[^"]|"")*"|\[[^\]]*\]|`[^`]*`)
+    | (?P<number>\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)
+    | (?P<word>[A-Za-z_@#][A-Za-z0-9_.@#$]*)
+    | (?P<space>\s+)
+    | (?P<other>.)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+_TABLE_RE = re.compile(r"\b(?:from|join)\s+([A-Za-z0-9_.\[\]\"]+)", re.IGNORECASE)
+_VOLATILE_FUNCTIONS = ("getdate", "now", "random", "randomblob", "newid")
+# Statement keywords that change state; as a function name (`replace(...)`) they are still read-only
+_WRITE_KEYWORDS = ("insert", "update", "delete", "replace", "upsert", "merge", "create", "drop", "alter", "attach", "detach", "pragma")
+# Providers that write or have side effects whatever SQL_CACHE_EXCLUDE says
+_WRITE_PROVIDERS = ("*.writer", "*.saveas", "sys.admin.*")
+
+
+def _sql_tokens(sql: str) -> List[Tuple[str, str]]:
+    out: List[Tuple[str, str]] = []
+    for m in _TOKEN_RE.finditer(sql or ""):
+        kind = m.lastgroup or "other"
+        if kind in ("comment", "space"):
+            continue
+        text = m.group()
+        # Identifiers and keywords are case-insensitive in Luminesce; string literals are not
+        out.append((kind, text.lower() if kind == "word" else text))
+    return out
+
+
+def normalise_sql(sql: str) -> str:
+    """Canonical form of a query: comments dropped, whitespace collapsed, identifiers/keywords lowercased
+    and literal-only `IN (...)` lists sorted, so trivially different probes share a fingerprint."""
+    tokens = _sql_tokens(sql)
+    out: List[str] = []
+    i = 0
+    while i < len(tokens):
+        kind, text = tokens[i]
+        if kind == "word" and text == "in" and i + 1 < len(tokens) and tokens[i + 1][1] == "(":
+            j = i + 2
+            items: List[str] = []
+            literal_list = True
+            while j < len(tokens) and tokens[j][1] != ")":
+                if tokens[j][0] in ("string", "number"):
+                    items.append(tokens[j][1])
+                elif tokens[j][1] != ",":
+                    literal_list = False
+                    break
+                j += 1
+            if literal_list and j < len(tokens) and items:
+                out.append("in (" + ", ".join(sorted(set(items))) + ")")
+                i = j + 1
+                continue
+        out.append(text)
+        i += 1
+    text = " ".join(out)
+    return text.rstrip("; ")
+
+
+def sql_fingerprint(sql: str) -> str:
+    return hashlib.sha256(normalise_sql(sql).encode("utf-8")).hexdigest()
+
+
+def referenced_tables(sql: str) -> List[str]:
+    return [m.group(1).strip('[]"') for m in _TABLE_RE.finditer(sql or "")]
+
+
+class SqlResultCache:
+    """In-process cache of `sql_execute` results keyed by normalised SQL fingerprint + caller identity.
+
+    - Entries expire after SQL_CACHE_TTL_SECONDS (default 300); 0 disables the cache
+    - LRU eviction keeps the total (JSON-encoded) size under SQL_CACHE_MAX_BYTES (default 64 MiB)
+    - Only single plain `SELECT` / `WITH` statements are cached: `@` scripts, multiple statements and
+      write keywords (insert, update, delete, ...) are not
+    - Queries touching writer/side-effecting providers (`*.Writer`, `*.SaveAs`, `Sys.Admin.*`), tables
+      matching SQL_CACHE_EXCLUDE (comma-separated globs, default `Scheduler.*,*.Writer,Sys.Logs.*`) or
+      calling volatile functions (getdate, now, random, ...) are never cached
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+        exclude: Optional[List[str]] = None,
+    ) -> None:
+        self.ttl_seconds = float(ttl_seconds if ttl_seconds is not None else os.getenv("SQL_CACHE_TTL_SECONDS", "300"))
+        self.max_bytes = int(max_bytes if max_bytes is not None else os.getenv("SQL_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+        patterns = exclude if exclude is not None else os.getenv("SQL_CACHE_EXCLUDE", "Scheduler.*,*.Writer,Sys.Logs.*").split(",")
+        self.exclude = [p.strip().lower() for p in patterns if p.strip()]
+        self._entries: "OrderedDict[str, Tuple[float, int, Dict[str, Any]]]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def cacheable(self, sql: str) -> bool:
+        if self.ttl_seconds <= 0 or self.max_bytes <= 0:
+            return False
+        tokens = _sql_tokens(sql)
+        while tokens and tokens[-1][1] == ";":
+            tokens.pop()
+        if not tokens or tokens[0][1] not in ("select", "with"):
+            return False
+        for i, (kind, text) in enumerate(tokens):
+            if text == ";" or (kind == "word" and text.startswith("@")):
+                return False
+            if kind == "word" and text in _WRITE_KEYWORDS and not (i + 1 < len(tokens) and tokens[i + 1][1] == "("):
+                return False
+            if kind == "word" and text in _VOLATILE_FUNCTIONS and i + 1 < len(tokens) and tokens[i + 1][1] == "(":
+                return False
+            if kind == "word" and text in ("current_timestamp", "current_date"):
+                return False
+        for table in referenced_tables(sql):
+            name = table.lower()
+            if any(fnmatch.fnmatchcase(name, pattern) for pattern in (*_WRITE_PROVIDERS, *self.exclude)):
+                return False
+        return True
+
+    def key(self, sql: str, identity: str, variant: str = "") -> str:
+        return f"{identity}:{sql_fingerprint(sql)}:{variant}"
+
+    def get(self, key: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        """Return (result, age_seconds) or None."""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        stored_at, size, result = entry
+        age = time.time() - stored_at
+        if age > self.ttl_seconds:
+            self._evict(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return result, age
+
+    def set(self, key: str, result: Dict[str, Any]) -> None:
+        try:
+            size = len(json.dumps(result, default=str))
+        except Exception:
+            return
+        if size > self.max_bytes // 4:
+            return  # a single result may not crowd out the rest of the cache
+        self._evict(key)
+        self._entries[key] = (time.time(), size, result)
+        self._bytes += size
+        while self._bytes > self.max_bytes and self._entries:
+            self._evict(next(iter(self._entries)))
+
+    def _evict(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Set
+
+from fathom.models.tasks import WorkflowTask
+
+
+@dataclass
+class TaskNode:
+    id: str
+    task: Optional[WorkflowTask] = None  # None while the task is only known as someone's parent
+    parent_id: Optional[str] = None
+    children: List["TaskNode"] = field(default_factory=list)
+    # Aggregates over the whole subtree (including this node)
+    size: int = 0
+    state_counts: Dict[str, int] = field(default_factory=dict)
+    latest_transition: str = ""
+
+
+class TaskHierarchy:
+    """Workflow task tree built from `parentTask` links in a single pass over an id -> node map.
+
+    Parents referenced but not supplied become placeholder nodes; `missing_ids()` lists them (and any
+    absent ultimate parents) so callers can fetch them in one batch and `add()` them.
+    """
+
+    def __init__(self, tasks: Iterable[WorkflowTask] = ()) -> None:
+        self.nodes: Dict[str, TaskNode] = {}
+        self._ultimate_refs: Set[str] = set()
+        self._dirty = True
+        self.add(tasks)
+
+    def _node(self, task_id: str) -> TaskNode:
+        node = self.nodes.get(task_id)
+        if node is None:
+            node = TaskNode(id=task_id)
+            self.nodes[task_id] = node
+        return node
+
+    def add(self, tasks: Iterable[WorkflowTask]) -> None:
+        for task in tasks:
+            node = self._node(task.id)
+            if node.task is not None:
+                continue
+            node.task = task
+            parent_id = task.parentTask.id if task.parentTask and task.parentTask.id != task.id else None
+            if parent_id:
+                node.parent_id = parent_id
+                self._node(parent_id).children.append(node)
+            if task.ultimateParentTask and task.ultimateParentTask.id != task.id:
+                self._ultimate_refs.add(task.ultimateParentTask.id)
+            self._dirty = True
+
+    def missing_ids(self) -> Set[str]:
+        missing = {node_id for node_id, node in self.nodes.items() if node.task is None}
+        missing |= {ref for ref in self._ultimate_refs if ref not in self.nodes or self.nodes[ref].task is None}
+        return missing
+
+    def roots(self) -> List[TaskNode]:
+        return [n for n in self.nodes.values() if n.parent_id is None or n.parent_id not in self.nodes]
+
+    def root_of(self, task_id: str) -> Optional[TaskNode]:
+        node = self.nodes.get(task_id)
+        seen: Set[str] = set()
+        while node is not None and node.parent_id and node.parent_id in self.nodes and node.id not in seen:
+            seen.add(node.id)
+            node = self.nodes[node.parent_id]
+        return node
+
+    def aggregate(self) -> None:
+        """Compute per-subtree size, state counts and latest transition (iterative post-order)."""
+        if not self._dirty:
+            return
+        for root in self.roots():
+            stack: List[tuple] = [(root, False)]
+            while stack:
+                node, expanded = stack.pop()
+                if not expanded:
+                    stack.append((node, True))
+                    stack.extend((child, False) for child in node.children)
+                    continue
+                counts: Dict[str, int] = {}
+                size = 0
+                latest = ""
+                if node.task is not None:
+                    counts[node.task.state] = 1
+                    size = 1
+                    latest = node.task.asAtLastTransition or ""
+                for child in node.children:
+                    size += child.size
+                    for state, n in child.state_counts.items():
+                        counts[state] = counts.get(state, 0) + n
+                    if child.latest_transition > latest:
+                        latest = child.latest_transition
+                node.size = size
+                node.state_counts = counts
+                node.latest_transition = latest
+        self._dirty = False
+
+    def group(self, matched: Iterable[WorkflowTask]) -> List[Dict[str, Any]]:
+        """Group matched tasks under their ultimate parent, keeping the ancestors that connect them.
+
+        Returns TaskGroup-shaped dicts (ultimateParent, children in tree order, totalCount) plus the root's
+        subtree aggregates (stateCounts, latestTransition) and a compact id `tree`, newest parent first.
+        """
+        return list(self.iter_groups(matched))
+
+    def iter_groups(self, matched: Iterable[WorkflowTask]) -> Iterator[Dict[str, Any]]:
+        """Same groups and order as `group`, built one at a time (only node ids are held up front)."""
+        self.aggregate()
+        include: Set[str] = set()
+        roots: Dict[str, TaskNode] = {}
+        for task in matched:
+            node = self.nodes.get(task.id)
+            while node is not None and node.id not in include:
+                include.add(node.id)
+                if not node.parent_id or node.parent_id not in self.nodes:
+                    break
+                node = self.nodes[node.parent_id]
+            root = self.root_of(task.id)
+            if root is not None:
+                roots[root.id] = root
+
+        heads: List[TaskNode] = []
+        for root in roots.values():
+            # Placeholder roots (ancestor could not be fetched) promote their first known child
+            top = root
+            while top.task is None and len(top.children) == 1:
+                top = top.children[0]
+            if top.task is None:
+                heads.extend(c for c in top.children if c.id in include and c.task is not None)
+            else:
+                heads.append(top)
+        heads.sort(key=lambda h: h.task.version.asAtCreated, reverse=True)
+        for head in heads:
+            yield self._group_of(head, include)
+
+    @staticmethod
+    def _group_of(head: TaskNode, include: Set[str]) -> Dict[str, Any]:
+        children: List[WorkflowTask] = []
+        stack = [(head, None)]
+        tree: Dict[str, Any] = {}
+        while stack:
+            node, parent_entry = stack.pop()
+            entry = {"id": node.id, "children": []}
+            if parent_entry is None:
+                tree = entry
+            else:
+                parent_entry["children"].append(entry)
+                if node.task is not None:
+                    children.append(node.task)
+            for child in reversed(node.children):
+                if child.id in include:
+                    stack.append((child, entry))
+        return {
+            "ultimateParent": head.task,
+            "children": children,
+            "totalCount": len(children) + 1,
+            "stateCounts": dict(head.state_counts),
+            "latestTransition": head.latest_transition,
+            "tree": tree,
+        }
+
+
+async def build_hierarchy(
+    tasks: Iterable[WorkflowTask],
+    fetch_missing: Optional[Callable[[Set[str]], Awaitable[List[WorkflowTask]]]] = None,
+    max_rounds: int = 4,
+) -> TaskHierarchy:
+    """Build a hierarchy and complete it by fetching missing ancestors in batches (one batch per level)."""
+    hierarchy = TaskHierarchy(tasks)
+    attempted: Set[str] = set()
+    for _ in range(max_rounds):
+        if fetch_missing is None:
+            break
+        missing = hierarchy.missing_ids() - attempted
+        if not missing:
+            break
+        attempted |= missing
+        hierarchy.add(await fetch_missing(missing))
+    return hierarchy
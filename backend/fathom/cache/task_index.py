@@ -0,0 +1,290 @@
+from __future__ import annotations
+
+import asyncio
+import bisect
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import aiohttp
+
+from fathom.cache.task_hierarchy import TaskHierarchy
+from fathom.cache.task_search import TaskSearchIndex
+from fathom.clients.workflow_filters import date_bounds, normalise_iso
+from fathom.models.tasks import TaskFilter, WorkflowTask
+
+
+def _created_key(task: WorkflowTask) -> Tuple[str, str]:
+    return normalise_iso(task.version.asAtCreated), task.id
+
+
+def _modified_mark(task: WorkflowTask) -> str:
+    return max(normalise_iso(task.version.asAtModified), normalise_iso(task.asAtLastTransition or ""))
+
+
+class TaskIndex:
+    """Process-wide in-memory index of LUSID workflow tasks keyed by task id.
+
+    - Secondary indexes: state (case-insensitive), correlation id, ultimate parent id, created date (sorted)
+      and a TaskSearchIndex for searchQuery, all maintained on every upsert/remove
+    - First use performs a full, uncapped load; later refreshes only pull tasks modified or transitioned since
+      the watermark (max of version.asAtModified / asAtLastTransition seen so far). If LUSID rejects the
+      watermark filter, delta pulls are skipped until the next full reload rather than re-listing everything
+    - Refreshes run at most every TASK_INDEX_REFRESH_SECONDS (default 10); once loaded, a stale index is
+      served immediately while the delta refresh runs in the background
+    - A full reload every TASK_INDEX_FULL_RELOAD_SECONDS (default 900) drops tasks deleted upstream
+    - `version` increments on every change so derived caches can tell when to rebuild; the task
+      hierarchy (parentTask tree with subtree aggregates) is cached per version
+    """
+
+    def __init__(self, refresh_seconds: Optional[float] = None, full_reload_seconds: Optional[float] = None) -> None:
+        self.refresh_seconds = float(refresh_seconds if refresh_seconds is not None else os.getenv("TASK_INDEX_REFRESH_SECONDS", "10"))
+        self.full_reload_seconds = float(
+            full_reload_seconds if full_reload_seconds is not None else os.getenv("TASK_INDEX_FULL_RELOAD_SECONDS", "900")
+        )
+        self._tasks: Dict[str, WorkflowTask] = {}
+        self._by_state: Dict[str, Set[str]] = {}
+        self._by_correlation: Dict[str, Set[str]] = {}
+        self._by_ultimate_parent: Dict[str, Set[str]] = {}
+        self._created: List[Tuple[str, str]] = []
+        self._search = TaskSearchIndex()
+        self._watermark: Optional[str] = None
+        self._loaded_at: Optional[float] = None
+        self._refreshed_at: float = 0.0
+        self._lock = asyncio.Lock()
+        self._background: Optional[asyncio.Task] = None
+        self._hierarchy: Optional[TaskHierarchy] = None
+        self._hierarchy_version = -1
+        self._complete_version = -1
+        self._unresolvable: Set[str] = set()
+        self._delta_supported = True
+        self.version = 0
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded_at is not None
+
+    def get(self, task_id: str) -> Optional[WorkflowTask]:
+        return self._tasks.get(task_id)
+
+    def all_tasks(self) -> List[WorkflowTask]:
+        return list(self._tasks.values())
+
+    def children_of(self, ultimate_parent_id: str) -> List[WorkflowTask]:
+        return [self._tasks[i] for i in self._by_ultimate_parent.get(ultimate_parent_id, ()) if i in self._tasks]
+
+    # --- maintenance -------------------------------------------------------------------------
+
+    def _add_secondary(self, task: WorkflowTask, keep_sorted: bool = True, advance_watermark: bool = True) -> None:
+        self._by_state.setdefault(task.state.lower(), set()).add(task.id)
+        for corr_id in task.correlationIds:
+            self._by_correlation.setdefault(corr_id, set()).add(task.id)
+        parent_id = task.ultimateParentTask.id if task.ultimateParentTask else task.id
+        self._by_ultimate_parent.setdefault(parent_id, set()).add(task.id)
+        if keep_sorted:
+            bisect.insort(self._created, _created_key(task))
+        else:
+            self._created.append(_created_key(task))
+        self._search.add(task)
+        mark = _modified_mark(task)
+        if advance_watermark and (self._watermark is None or mark > self._watermark):
+            self._watermark = mark
+
+    def _remove_secondary(self, task: WorkflowTask) -> None:
+        for bucket, key in [(self._by_state, task.state.lower())] + [(self._by_correlation, c) for c in task.correlationIds]:
+            ids = bucket.get(key)
+            if ids is not None:
+                ids.discard(task.id)
+                if not ids:
+                    bucket.pop(key, None)
+        parent_id = task.ultimateParentTask.id if task.ultimateParentTask else task.id
+        ids = self._by_ultimate_parent.get(parent_id)
+        if ids is not None:
+            ids.discard(task.id)
+            if not ids:
+                self._by_ultimate_parent.pop(parent_id, None)
+        key = _created_key(task)
+        pos = bisect.bisect_left(self._created, key)
+        if pos < len(self._created) and self._created[pos] == key:
+            self._created.pop(pos)
+        self._search.remove(task.id)
+
+    def upsert(self, task: WorkflowTask, advance_watermark: bool = True) -> None:
+        """Insert or replace a task. Tasks fetched outside a listing refresh (ancestors, batch lookups)
+        must not advance the watermark, or the next delta pull could skip earlier modifications."""
+        existing = self._tasks.get(task.id)
+        if existing is not None:
+            self._remove_secondary(existing)
+        self._tasks[task.id] = task
+        self._add_secondary(task, advance_watermark=advance_watermark)
+        self.version += 1
+
+    def remove(self, task_id: str) -> None:
+        existing = self._tasks.pop(task_id, None)
+        if existing is not None:
+            self._remove_secondary(existing)
+            self.version += 1
+
+    def replace_all(self, tasks: Iterable[WorkflowTask]) -> None:
+        """Swap in a freshly loaded task set, rebuilding every secondary index."""
+        self._tasks = {}
+        self._by_state = {}
+        self._by_correlation = {}
+        self._by_ultimate_parent = {}
+        self._created = []
+        self._search = TaskSearchIndex()
+        self._watermark = None
+        for task in tasks:
+            self._tasks[task.id] = task
+        for task in self._tasks.values():
+            self._add_secondary(task, keep_sorted=False)
+        self._created.sort()
+        self._unresolvable = set()
+        self.version += 1
+
+    # --- refresh -----------------------------------------------------------------------------
+
+    async def _load_full(self, client) -> None:
+        tasks: List[WorkflowTask] = []
+        # Uncapped: LUSID_TASKS_MAX_ITEMS bounds one-off listings, but the index must hold every task
+        async for page in client.iter_workflow_task_pages(max_items=0):
+            tasks.extend(page.values)
+        self.replace_all(tasks)
+        self._loaded_at = time.time()
+        self._delta_supported = True
+
+    async def _load_delta(self, client) -> None:
+        watermark = self._watermark
+        if not watermark:
+            await self._load_full(client)
+            return
+        if not self._delta_supported:
+            return
+        expression = f"version.asAtModified gte {watermark}Z or asAtLastTransition gte {watermark}Z"
+        try:
+            async for page in client.iter_workflow_task_pages(filter_expression=expression, max_items=0, local_fallback=False):
+                for task in page.values:
+                    existing = self._tasks.get(task.id)
+                    if existing is None or _modified_mark(existing) != _modified_mark(task):
+                        self.upsert(task)
+        except aiohttp.ClientResponseError as e:
+            if e.status != 400:
+                raise
+            # Unfiltered, every delta would re-list all tasks: wait for the next full reload instead
+            print("[Fathom] LUSID rejected the task watermark filter; delta refreshes paused until the next full reload")
+            self._delta_supported = False
+
+    async def refresh(self, client, force: bool = False) -> None:
+        """Bring the index up to date (full load on first use or when due, otherwise a delta pull)."""
+        async with self._lock:
+            now = time.time()
+            if not force and self.loaded and now - self._refreshed_at < self.refresh_seconds:
+                return
+            if not self.loaded or now - (self._loaded_at or 0.0) >= self.full_reload_seconds:
+                await self._load_full(client)
+            else:
+                await self._load_delta(client)
+            self._refreshed_at = time.time()
+
+    async def ensure_fresh(self, client) -> None:
+        """Load synchronously on first use; afterwards refresh stale data in the background."""
+        if not self.loaded:
+            await self.refresh(client)
+            return
+        if time.time() - self._refreshed_at < self.refresh_seconds:
+            return
+        if self._background is None or self._background.done():
+            self._background = asyncio.create_task(self._refresh_quietly(client))
+
+    async def _refresh_quietly(self, client) -> None:
+        try:
+            await self.refresh(client)
+        except Exception as e:
+            print(f"[Fathom] Task index refresh failed: {e}")
+
+    # --- hierarchy ---------------------------------------------------------------------------
+
+    def hierarchy(self) -> TaskHierarchy:
+        """Return the task tree for the current index version (rebuilt only after changes)."""
+        if self._hierarchy is None or self._hierarchy_version != self.version:
+            hierarchy = TaskHierarchy(self._tasks.values())
+            hierarchy.aggregate()
+            self._hierarchy = hierarchy
+            self._hierarchy_version = self.version
+        return self._hierarchy
+
+    async def complete_hierarchy(self, client) -> TaskHierarchy:
+        """Fetch ancestors referenced by indexed tasks but missing from the index, in one batch per level."""
+        if self._complete_version == self.version:
+            return self.hierarchy()
+        try:
+            for _ in range(4):
+                missing = self.hierarchy().missing_ids() - self._unresolvable
+                if not missing:
+                    break
+                fetched = await client.get_tasks_by_ids(missing)
+                for task in fetched:
+                    self.upsert(task, advance_watermark=False)
+                self._unresolvable |= missing - {t.id for t in fetched}
+            self._complete_version = self.version
+        except Exception as e:
+            print(f"[Fathom] Failed to fetch missing ancestor tasks: {e}")
+        return self.hierarchy()
+
+    # --- queries -----------------------------------------------------------------------------
+
+    def _ids_in_created_window(self, task_filter: TaskFilter) -> Optional[Set[str]]:
+        lower, upper, upper_inclusive = date_bounds(task_filter)
+        if not lower and not upper:
+            return None
+        lo = bisect.bisect_left(self._created, (normalise_iso(lower), "")) if lower else 0
+        if upper:
+            bound = normalise_iso(upper)
+            if upper_inclusive:
+                # Anything sharing the bound as a prefix (e.g. fractional seconds) is still <= bound
+                hi = bisect.bisect_right(self._created, (bound + "\uffff", ""))
+            else:
+                hi = bisect.bisect_left(self._created, (bound, ""))
+        else:
+            hi = len(self._created)
+        return {task_id for _, task_id in self._created[lo:hi]}
+
+    def candidate_ids(self, task_filter: TaskFilter) -> Set[str]:
+        """Resolve state / correlation / date / search predicates through the secondary indexes."""
+        candidates: List[Set[str]] = []
+        if task_filter.states:
+            ids: Set[str] = set()
+            for state in task_filter.states:
+                ids |= self._by_state.get(state.lower(), set())
+            candidates.append(ids)
+        if task_filter.correlationIds:
+            ids = set()
+            for corr_id in task_filter.correlationIds:
+                ids |= self._by_correlation.get(corr_id, set())
+            candidates.append(ids)
+        window = self._ids_in_created_window(task_filter)
+        if window is not None:
+            candidates.append(window)
+        if task_filter.searchQuery:
+            candidates.append(self._search.search(task_filter.searchQuery, prefix=task_filter.searchMode == "prefix"))
+        if not candidates:
+            return set(self._tasks.keys())
+        candidates.sort(key=len)
+        result = set(candidates[0])
+        for other in candidates[1:]:
+            result &= other
+        return result
+
+    def query(self, task_filter: Optional[TaskFilter] = None) -> List[WorkflowTask]:
+        """Return tasks matching the filter, newest first."""
+        task_filter = task_filter or TaskFilter()
+        ids = self.candidate_ids(task_filter)
+        if len(ids) * 8 >= len(self._created):
+            # Large result: walk the date index instead of sorting
+            return [self._tasks[i] for _, i in reversed(self._created) if i in ids]
+        tasks = [self._tasks[i] for i in ids if i in self._tasks]
+        tasks.sort(key=_created_key, reverse=True)
+        return tasks
@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import bisect
+import re
+from typing import Dict, Iterable, List, Optional, Set
+
+from fathom.models.tasks import WorkflowTask
+
+
+_TOKEN_RE = re.compile(r"[0-9a-z]+")
+
+
+def searchable_strings(task: WorkflowTask) -> List[str]:
+    """Lowercased strings a task can be found by: display name, state, field names and values."""
+    out = [task.taskDefinitionDisplayName.lower(), task.state.lower()]
+    for field in task.fields:
+        out.append(field.name.lower())
+        if field.value:
+            out.append(str(field.value).lower())
+    return out
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+def _grams(text: str) -> Set[str]:
+    grams: Set[str] = set()
+    for n in (2, 3):
+        for i in range(len(text) - n + 1):
+            grams.add(text[i:i + n])
+    return grams
+
+
+class TaskSearchIndex:
+    """Inverted index for task `searchQuery` lookups.
+
+    Every distinct searchable string is stored once and mapped to the tasks containing it, so memory
+    scales with distinct names/values rather than tasks x fields.
+
+    - substring search (default): 2/3-gram postings over distinct strings, candidates verified with `in`
+      (same per-field semantics as the previous linear scan); 1-character queries scan distinct strings
+    - prefix search: every query token must prefix a word token of the task (sorted token list + bisect)
+    """
+
+    def __init__(self) -> None:
+        self._string_ids: Dict[str, int] = {}
+        self._strings: List[Optional[str]] = []
+        self._free: List[int] = []
+        self._string_tasks: Dict[int, Set[str]] = {}
+        self._task_strings: Dict[str, Set[int]] = {}
+        self._grams: Dict[str, Set[int]] = {}
+        self._tokens: Dict[str, Set[int]] = {}
+        self._sorted_tokens: Optional[List[str]] = None
+
+    def __len__(self) -> int:
+        return len(self._task_strings)
+
+    def _intern(self, text: str) -> int:
+        sid = self._string_ids.get(text)
+        if sid is not None:
+            return sid
+        if self._free:
+            sid = self._free.pop()
+            self._strings[sid] = text
+        else:
+            sid = len(self._strings)
+            self._strings.append(text)
+        self._string_ids[text] = sid
+        self._string_tasks[sid] = set()
+        for gram in _grams(text):
+            self._grams.setdefault(gram, set()).add(sid)
+        for token in set(tokenize(text)):
+            if token not in self._tokens:
+                self._sorted_tokens = None
+            self._tokens.setdefault(token, set()).add(sid)
+        return sid
+
+    def _release(self, sid: int) -> None:
+        text = self._strings[sid]
+        if text is None:
+            return
+        for gram in _grams(text):
+            bucket = self._grams.get(gram)
+            if bucket is not None:
+                bucket.discard(sid)
+                if not bucket:
+                    del self._grams[gram]
+        for token in set(tokenize(text)):
+            bucket = self._tokens.get(token)
+            if bucket is not None:
+                bucket.discard(sid)
+                if not bucket:
+                    del self._tokens[token]
+                    self._sorted_tokens = None
+        del self._string_ids[text]
+        del self._string_tasks[sid]
+        self._strings[sid] = None
+        self._free.append(sid)
+
+    def add(self, task: WorkflowTask) -> None:
+        """Index (or re-index) a task."""
+        self.remove(task.id)
+        sids: Set[int] = set()
+        for text in searchable_strings(task):
+            sid = self._intern(text)
+            self._string_tasks[sid].add(task.id)
+            sids.add(sid)
+        self._task_strings[task.id] = sids
+
+    def remove(self, task_id: str) -> None:
+        sids = self._task_strings.pop(task_id, None)
+        if not sids:
+            return
+        for sid in sids:
+            tasks = self._string_tasks.get(sid)
+            if tasks is None:
+                continue
+            tasks.discard(task_id)
+            if not tasks:
+                self._release(sid)
+
+    def _tasks_for(self, sids: Iterable[int]) -> Set[str]:
+        out: Set[str] = set()
+        for sid in sids:
+            out |= self._string_tasks.get(sid, set())
+        return out
+
+    def _substring_sids(self, query: str) -> Set[int]:
+        if len(query) < 2:
+            return {sid for sid, text in enumerate(self._strings) if text is not None and query in text}
+        n = min(3, len(query))
+        postings = []
+        for i in range(len(query) - n + 1):
+            bucket = self._grams.get(query[i:i + n])
+            if not bucket:
+                return set()
+            postings.append(bucket)
+        postings.sort(key=len)
+        sids = set(postings[0])
+        for bucket in postings[1:]:
+            sids &= bucket
+            if not sids:
+                return sids
+        if len(query) > n:
+            sids = {sid for sid in sids if query in (self._strings[sid] or "")}
+        return sids
+
+    def _prefix_sids(self, token: str) -> Set[int]:
+        if self._sorted_tokens is None:
+            self._sorted_tokens = sorted(self._tokens)
+        tokens = self._sorted_tokens
+        sids: Set[int] = set()
+        i = bisect.bisect_left(tokens, token)
+        while i < len(tokens) and tokens[i].startswith(token):
+            sids |= self._tokens[tokens[i]]
+            i += 1
+        return sids
+
+    def search(self, query: str, prefix: bool = False) -> Set[str]:
+        """Return ids of tasks matching the query (substring by default, word-prefix when prefix=True)."""
+        query = (query or "").lower()
+        if not query:
+            return set(self._task_strings.keys())
+        if not prefix:
+            return self._tasks_for(self._substring_sids(query))
+        tokens = tokenize(query)
+        if not tokens:
+            # Nothing to match on (e.g. only punctuation): every task passes, as in task_matches
+            return set(self._task_strings.keys())
+        result: Optional[Set[str]] = None
+        for token in tokens:
+            ids = self._tasks_for(self._prefix_sids(token))
+            result = ids if result is None else (result & ids)
+            if not result:
+                return set()
+        return result or set()
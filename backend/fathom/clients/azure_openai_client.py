@@ -105,14 +105,6 @@ class AzureOpenAIClient:
 
     def __init__(self, config: AzureOpenAIConfig, session: Optional[aiohttp.ClientSession] = None):
         self._config = config
-        # Prefer shared session from app.state if not provided
-        if session is None:
-            try:
-                from main import app  # local import to avoid circulars at import time
-                shared = getattr(app.state, "http_session", None)
-                session = shared
-            except Exception:
-                pass
         self._session = session
         self._credential = DefaultAzureCredential()
         # Token provider callable that returns a fresh Bearer token string
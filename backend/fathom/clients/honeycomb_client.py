@@ -1,83 +1,201 @@
 import os
 import uuid
-import json
-from typing import Any, Dict, Optional
+from contextlib import asynccontextmanager
+from typing import Any, AsyncGenerator, AsyncIterator, Dict, Optional
 
-import requests
-import lusid
+import aiohttp
+from fathom.clients.json_stream import JsonArrayParser
+from fathom.clients.token_provider import LusidTokenProvider
+
+
+class SqlRowStream:
+    """Rows of a Luminesce JSON result response, parsed incrementally as the body arrives.
+
+    Iterate once with `async for`. When the body is not a top-level JSON array no rows are yielded and
+    `document` holds the parsed body instead. `bytes_read` counts the raw body size.
+    """
+
+    def __init__(
+        self,
+        client: "HoneycombClient",
+        method: str,
+        path: str,
+        params: Dict[str, str],
+        data: Optional[bytes] = None,
+    ) -> None:
+        self._client = client
+        self._method = method
+        self._path = path
+        self._params = params
+        self._data = data
+        self.document: Any = None
+        self.bytes_read = 0
+
+    def __aiter__(self) -> AsyncIterator[Any]:
+        return self._rows()
+
+    async def _rows(self) -> AsyncGenerator[Any, None]:
+        parser = JsonArrayParser()
+        async with self._client._request(
+            self._method,
+            self._path,
+            params=self._params,
+            data=self._data,
+            content_type="text/plain; charset=utf-8" if self._data is not None else None,
+        ) as resp:
+            async for chunk in resp.content.iter_chunked(self._client.chunk_size):
+                self.bytes_read += len(chunk)
+                for row in parser.feed(chunk):
+                    yield row
+        self.document = parser.finish()
 
 
 class HoneycombClient:
-    """Thin client for Honeycomb Luminesce endpoints using LUSID bearer.
+    """Async client for Honeycomb Luminesce endpoints using LUSID bearer.
 
     - Base URL from env HONEYCOMB_BASE (default: https://simpleflow.lusid.com/honeycomb)
-    - Reuses access token from a provided lusid.ApiClientFactory
-    - Uses requests under the hood; callers may run in executor for async contexts
+    - Bearer token from the shared LusidTokenProvider (passed in; see `create_honeycomb_client`)
+    - Reuses the shared aiohttp session (keep-alive pool) when one is passed in
+    - Per-request timeout from env HONEYCOMB_HTTP_TIMEOUT_SECONDS (default 300)
+    - SQL results can be streamed row by row (`stream_sql_json`) without buffering the whole body
+    - Background queries (`/api/SqlBackground`): start, poll progress, fetch result pages, cancel
     """
 
-    def __init__(self, api_factory: Optional[lusid.ApiClientFactory] = None, base_url: Optional[str] = None):
-        self._api_factory = api_factory
+    def __init__(
+        self,
+        token_provider: Optional[LusidTokenProvider],
+        session: Optional[aiohttp.ClientSession] = None,
+        base_url: Optional[str] = None,
+    ):
+        self._token_provider = token_provider
         self.base_url = (base_url or os.getenv("HONEYCOMB_BASE") or "https://simpleflow.lusid.com/honeycomb").rstrip("/")
-        self._timeout = int(os.getenv("HONEYCOMB_HTTP_TIMEOUT_SECONDS", "300"))
-
-    def _get_access_token(self) -> str:
-        if self._api_factory is None:
-            raise RuntimeError("LUSID ApiClientFactory not initialised")
-        api = self._api_factory.build(lusid.ApplicationMetadataApi)
-        cfg = api.api_client.configuration
-        token = getattr(cfg, "access_token", None)
-        if not token:
-            try:
-                _ = api.get_lusid_versions()
-                token = getattr(api.api_client.configuration, "access_token", None)
-            except Exception:
-                token = getattr(api.api_client.configuration, "access_token", None)
-        if not token:
-            raise RuntimeError("Empty LUSID access token")
-        return str(token)
-
-    def _headers(self) -> Dict[str, str]:
+        self._session = session
+        self._timeout = aiohttp.ClientTimeout(total=float(os.getenv("HONEYCOMB_HTTP_TIMEOUT_SECONDS", "300")))
+        self.chunk_size = 64 * 1024
+
+    async def _get_access_token(self) -> str:
+        if self._token_provider is None:
+            raise RuntimeError("LUSID token provider missing (app.state.token_provider not initialised)")
+        return await self._token_provider.get_token()
+
+    async def caller_identity(self) -> str:
+        """Identity of the user behind the bearer token (keys per-user result caches)."""
+        await self._get_access_token()
+        return self._token_provider.identity() if self._token_provider is not None else ""
+
+    async def _headers(self) -> Dict[str, str]:
         return {
-            "Authorization": f"Bearer {self._get_access_token()}",
+            "Authorization": f"Bearer {await self._get_access_token()}",
             "Content-Type": "application/json",
         }
 
-    def execute_sql_json(
+    @asynccontextmanager
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        params: Optional[Dict[str, str]] = None,
+        data: Optional[bytes] = None,
+        content_type: Optional[str] = None,
+    ) -> AsyncIterator[aiohttp.ClientResponse]:
+        headers = await self._headers()
+        headers["Accept"] = "application/json, text/plain, text/json"
+        if content_type:
+            headers["Content-Type"] = content_type
+        close_session = False
+        session = self._session
+        if session is None or session.closed:
+            session = aiohttp.ClientSession()
+            close_session = True
+        try:
+            async with session.request(
+                method, f"{self.base_url}{path}", params=params, data=data, headers=headers, timeout=self._timeout
+            ) as resp:
+                resp.raise_for_status()
+                yield resp
+        finally:
+            if close_session:
+                await session.close()
+
+    def _sql_params(self, query_name: Optional[str], json_proper: bool) -> Dict[str, str]:
+        return {
+            "jsonProper": str(json_proper).lower(),
+            "queryName": query_name or f"Fathom.Query.{str(uuid.uuid4())[:8]}",
+        }
+
+    def stream_sql_json(
+        self,
+        sql: str,
+        query_name: Optional[str] = None,
+        json_proper: bool = True,
+    ) -> SqlRowStream:
+        """PUT /api/Sql/json and yield result rows as they are parsed from the response body."""
+        # Honeycomb expects raw SQL in the body (text/plain) for PutByQueryJson
+        # Many Honeycomb deployments require PUT for Sql/json (POST can 405)
+        return SqlRowStream(self, "PUT", "/api/Sql/json", self._sql_params(query_name, json_proper), sql.encode("utf-8"))
+
+    async def execute_sql_json(
         self,
         sql: str,
         scalar_parameters: Optional[Dict[str, Any]] = None,
         query_name: Optional[str] = None,
         json_proper: bool = True,
-    ) -> Dict[str, Any]:
-        """POST /api/Sql/json with provided SQL and parameters.
+    ) -> Any:
+        """PUT /api/Sql/json with provided SQL and return the parsed body.
 
         According to Honeycomb docs, jsonProper is a query parameter; set true by default.
-        scalarParameters are accepted; some tenants also accept Parameters; we send both.
+        We purposefully do NOT send scalarParameters; inline values directly in SQL body for reliability.
         """
-        url = f"{self.base_url}/api/Sql/json"
-        params = {"jsonProper": str(json_proper).lower()}
-        if query_name:
-            params["queryName"] = query_name
-        else:
-            params["queryName"] = f"Fathom.Query.{str(uuid.uuid4())[:8]}"
-        # We purposefully do NOT send scalarParameters; inline values directly in SQL body for reliability.
+        stream = self.stream_sql_json(sql, query_name=query_name, json_proper=json_proper)
+        rows = [row async for row in stream]
+        return stream.document if stream.document is not None else rows
 
-        # Honeycomb expects raw SQL in the body (text/plain) for PutByQueryJson
-        headers = self._headers()
-        headers["Content-Type"] = "text/plain; charset=utf-8"
-        headers["Accept"] = "application/json, text/plain, text/json"
+    async def get_catalog_fields(self, table_like: str) -> Any:
+        """GET /api/Catalog/fields?tableLike=... returns JSON with table/field metadata."""
+        async with self._request("GET", "/api/Catalog/fields", params={"tableLike": table_like}) as resp:
+            return await resp.json(content_type=None)
 
-        # Many Honeycomb deployments require PUT for Sql/json (POST can 405)
-        resp = requests.put(url, params=params, headers=headers, data=sql.encode("utf-8"), timeout=self._timeout)
-        resp.raise_for_status()
-        return resp.json()
+    # --- background queries --------------------------------------------------------------------
 
-    def get_catalog_fields(self, table_like: str) -> Dict[str, Any]:
-        """GET /api/Catalog/fields?tableLike=... returns JSON with table/field metadata."""
-        url = f"{self.base_url}/api/Catalog/fields"
-        params = {"tableLike": table_like}
-        resp = requests.get(url, params=params, headers=self._headers(), timeout=self._timeout)
-        resp.raise_for_status()
-        return resp.json()
+    async def start_background_query(self, sql: str, query_name: Optional[str] = None) -> str:
+        """PUT /api/SqlBackground; returns the execution id."""
+        async with self._request(
+            "PUT",
+            "/api/SqlBackground",
+            params={"queryName": query_name or f"Fathom.Query.{str(uuid.uuid4())[:8]}"},
+            data=sql.encode("utf-8"),
+            content_type="text/plain; charset=utf-8",
+        ) as resp:
+            body = await resp.json(content_type=None)
+        execution_id = body.get("executionId") if isinstance(body, dict) else None
+        if not execution_id:
+            raise RuntimeError(f"Unexpected SqlBackground response: {body}")
+        return str(execution_id)
+
+    async def get_background_progress(self, execution_id: str) -> Dict[str, Any]:
+        """GET /api/SqlBackground/{executionId} (status, state, rowCount, progress text)."""
+        async with self._request("GET", f"/api/SqlBackground/{execution_id}") as resp:
+            body = await resp.json(content_type=None)
+        return body if isinstance(body, dict) else {}
+
+    def stream_background_page(self, execution_id: str, page: int, limit: int) -> SqlRowStream:
+        """GET /api/SqlBackground/{executionId}/jsonProper for one page of rows (0-based)."""
+        return SqlRowStream(
+            self,
+            "GET",
+            f"/api/SqlBackground/{execution_id}/jsonProper",
+            {"page": str(page), "limit": str(limit)},
+        )
+
+    async def cancel_background_query(self, execution_id: str) -> None:
+        """DELETE /api/SqlBackground/{executionId} (cancels a running query / drops its results)."""
+        async with self._request("DELETE", f"/api/SqlBackground/{execution_id}"):
+            pass
 
 
+def create_honeycomb_client(app) -> HoneycombClient:
+    """Create a Honeycomb client using the shared token provider and aiohttp session from app.state"""
+    return HoneycombClient(
+        getattr(app.state, "token_provider", None),
+        session=getattr(app.state, "http_session", None),
+    )
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import codecs
+import json
+from typing import Any, List, Optional
+
+
+_WHITESPACE = " \t\n\r"
+
+
+class JsonArrayParser:
+    """Incremental parser for a top-level JSON array, fed raw body chunks as they arrive.
+
+    - `feed(chunk)` returns the array elements completed by that chunk
+    - Elements are decoded one at a time with the C scanner (`raw_decode`); only the element currently
+      being received is buffered, so memory is bounded by the largest row, not the response
+    - Bodies that are not a top-level array are buffered whole; `finish()` returns them parsed
+    """
+
+    def __init__(self) -> None:
+        self._decoder = json.JSONDecoder()
+        self._utf8 = codecs.getincrementaldecoder("utf-8-sig")()
+        self._buf = ""
+        self._mode: Optional[str] = None  # None (undecided) | "array" | "document"
+        self._expect_value = True  # after "[" or ",": a value (or "]" for an empty array) must follow
+        self._done = False
+
+    def feed(self, data: bytes) -> List[Any]:
+        return self._consume(self._utf8.decode(data), final=False)
+
+    def finish(self) -> Any:
+        """Validate end of input; returns the parsed body when it was not a top-level array."""
+        tail = self._consume(self._utf8.decode(b"", final=True), final=True)
+        if self._mode == "document":
+            return json.loads(self._buf)
+        if self._mode == "array" and (tail or not self._done):
+            raise ValueError("Truncated JSON array in response body")
+        return None
+
+    def _consume(self, text: str, final: bool) -> List[Any]:
+        if self._done:
+            return []
+        self._buf += text
+        if self._mode is None:
+            body = self._buf.lstrip(_WHITESPACE)
+            if not body:
+                return []
+            if body[0] != "[":
+                self._mode = "document"
+                return []
+            self._mode = "array"
+            self._buf = body[1:]
+        if self._mode == "document":
+            return []
+
+        buf = self._buf
+        size = len(buf)
+        pos = 0
+        out: List[Any] = []
+        decode = self._decoder.raw_decode
+        while True:
+            while pos < size and buf[pos] in _WHITESPACE:
+                pos += 1
+            if pos >= size:
+                break
+            char = buf[pos]
+            if char == "]":
+                self._done = True
+                pos += 1
+                break
+            if char == ",":
+                if self._expect_value:
+                    raise ValueError("Malformed JSON array in response body")
+                self._expect_value = True
+                pos += 1
+                continue
+            try:
+                value, end = decode(buf, pos)
+            except json.JSONDecodeError:
+                if final:
+                    raise
+                break  # element still arriving
+            if end >= size and not final and not isinstance(value, (dict, list, str)):
+                break  # a number/literal may continue in the next chunk
+            out.append(value)
+            self._expect_value = False
+            pos = end
+        self._buf = buf[pos:]
+        return out
@@ -1,89 +1,219 @@
+import asyncio
 import os
-import requests
-from typing import List, Optional, Dict, Any
-import lusid
-from lusid.extensions.configuration_loaders import SecretsFileConfigurationLoader
+from typing import AsyncGenerator, Iterable, List, Optional, Dict, Any
+
+import aiohttp
+from fathom.clients.paging import iter_pages
+from fathom.clients.token_provider import LusidTokenProvider
+from fathom.clients.workflow_filters import build_filter_expression, filter_tasks, quote_literal, residual_filter
 from fathom.models.tasks import WorkflowTask, TaskListResponse, TaskFilter
 
 
 class LUSIDClient:
-    def __init__(self, api_factory: lusid.ApiClientFactory, secrets_path: str):
-        """Initialize LUSID client with an already-initialised ApiClientFactory"""
-        self.workflow_base_url = "https://simpleflow.lusid.com/workflow/api"
-        self._api_factory = api_factory
-        self.secrets_path = os.path.abspath(secrets_path)
-
-    def _get_access_token(self) -> str:
-        """Get or refresh access token from the factory configuration"""
-        if self._api_factory is None:
-            raise RuntimeError("LUSID ApiClientFactory not initialised")
-
-        # Build a lightweight API to hydrate api_client
-        api = self._api_factory.build(lusid.ApplicationMetadataApi)
-        cfg = api.api_client.configuration
-        token = getattr(cfg, "access_token", None)
-        if not token:
-            # Try to force a call to hydrate token (versions may vary)
-            try:
-                _ = api.get_lusid_versions()
-                token = getattr(api.api_client.configuration, "access_token", None)
-            except Exception:
-                token = getattr(api.api_client.configuration, "access_token", None)
-        if not token:
-            raise RuntimeError("Empty LUSID access token")
-        return str(token)
-    
-    def _make_request(self, endpoint: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Async client for the LUSID Workflow API.
+
+    - Base URL from env LUSID_WORKFLOW_BASE (default: https://simpleflow.lusid.com/workflow/api)
+    - Reuses the shared aiohttp session (keep-alive pool) when one is passed in
+    - Bearer token from the shared LusidTokenProvider passed in (no per-request token lookup)
+    - Per-request timeout from env LUSID_HTTP_TIMEOUT_SECONDS (default 60)
+    - Task listing follows `nextPage` tokens: page size from LUSID_TASKS_PAGE_SIZE (default 1000),
+      cap from LUSID_TASKS_MAX_ITEMS (default 50000), read-ahead from LUSID_TASKS_PREFETCH_PAGES (default 2)
+    - TaskFilter dates/states/correlation IDs are pushed down as a LUSID `filter` expression
+      (disable with LUSID_TASKS_FILTER_PUSHDOWN=false); searchQuery is always evaluated locally
+    - Batch lookups by id use `id in (...)` filters in chunks, LUSID_BATCH_CONCURRENCY (default 8) at a time
+    """
+
+    def __init__(
+        self,
+        session: Optional[aiohttp.ClientSession] = None,
+        base_url: Optional[str] = None,
+        token_provider: Optional[LusidTokenProvider] = None,
+    ):
+        """Initialize LUSID client over the shared token provider and aiohttp session"""
+        self.workflow_base_url = (
+            base_url or os.getenv("LUSID_WORKFLOW_BASE") or "https://simpleflow.lusid.com/workflow/api"
+        ).rstrip("/")
+        self._session = session
+        self._token_provider = token_provider
+        self._timeout = aiohttp.ClientTimeout(total=float(os.getenv("LUSID_HTTP_TIMEOUT_SECONDS", "60")))
+        self.page_size = int(os.getenv("LUSID_TASKS_PAGE_SIZE", "1000"))
+        self.max_items = int(os.getenv("LUSID_TASKS_MAX_ITEMS", "50000"))
+        self.prefetch_pages = int(os.getenv("LUSID_TASKS_PREFETCH_PAGES", "2"))
+        self.batch_concurrency = int(os.getenv("LUSID_BATCH_CONCURRENCY", "8"))
+        self.filter_pushdown = os.getenv("LUSID_TASKS_FILTER_PUSHDOWN", "true").strip().lower() not in ("0", "false", "no")
+
+    async def _get_access_token(self) -> str:
+        """Bearer token from the shared token provider (cached, refreshed in the background)"""
+        if self._token_provider is None:
+            raise RuntimeError("LUSID token provider missing (app.state.token_provider not initialised)")
+        return await self._token_provider.get_token()
+
+    async def _make_request(self, endpoint: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """Make authenticated request to LUSID API"""
-        token = self._get_access_token()
+        token = await self._get_access_token()
         headers = {
             "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json"
+            "Content-Type": "application/json",
         }
-        
+
         url = f"{self.workflow_base_url}{endpoint}"
-        response = requests.get(url, headers=headers, params=params)
-        response.raise_for_status()
-        return response.json()
-    
-    async def get_workflow_tasks(self, task_filter: Optional[TaskFilter] = None) -> TaskListResponse:
-        """Fetch workflow tasks from LUSID. We avoid server-side filters for stability and filter locally."""
-        params: Dict[str, Any] = {}
+        close_session = False
+        session = self._session
+        if session is None or session.closed:
+            session = aiohttp.ClientSession()
+            close_session = True
         try:
-            data = self._make_request("/tasks", params)
-            return TaskListResponse(**data)
+            async with session.get(url, headers=headers, params=params, timeout=self._timeout) as resp:
+                resp.raise_for_status()
+                return await resp.json()
+        finally:
+            if close_session:
+                await session.close()
+
+    async def iter_workflow_task_pages(
+        self,
+        task_filter: Optional[TaskFilter] = None,
+        page_size: Optional[int] = None,
+        max_items: Optional[int] = None,
+        filter_expression: Optional[str] = None,
+        local_fallback: bool = True,
+    ) -> AsyncGenerator[TaskListResponse, None]:
+        """Yield parsed pages of workflow tasks, following `nextPage` until exhausted or max_items is reached.
+
+        The next page is prefetched while the current one is parsed. When the cap truncates the listing,
+        the last yielded page keeps its `nextPage` token so callers can tell the result is incomplete.
+        Yielded tasks satisfy the pushable filter predicates; if LUSID rejects the filter expression
+        (HTTP 400) the listing is retried unfiltered and those predicates are applied locally instead.
+        Callers only need to apply residual_filter(task_filter) afterwards. An explicit
+        `filter_expression` (e.g. a modification watermark) is ANDed with the translated filter;
+        on fallback it is dropped, so callers must tolerate a superset. With `local_fallback=False` the
+        rejection is raised instead (the aiohttp.ClientResponseError with status 400).
+        """
+        limit = max(1, page_size or self.page_size)
+        cap = max_items if max_items is not None else self.max_items
+        params: Dict[str, Any] = {"limit": limit}
+        pushed = build_filter_expression(task_filter) if self.filter_pushdown else None
+        local_filter: Optional[TaskFilter] = None
+        if not pushed and task_filter is not None:
+            local_filter = task_filter.copy(update={"searchQuery": None})
+        expression = pushed
+        if filter_expression:
+            expression = f"({filter_expression}) and ({pushed})" if pushed else filter_expression
+        if expression:
+            params["filter"] = expression
+
+        first_page: Optional[Dict[str, Any]] = None
+
+        async def _fetch(token: Optional[str]) -> Dict[str, Any]:
+            if token is None and first_page is not None:
+                return first_page
+            page_params = dict(params)
+            if token:
+                page_params["page"] = token
+            return await self._make_request("/tasks", page_params)
+
+        if expression:
+            # Probe the first page so a filter LUSID can't parse degrades to local filtering
+            try:
+                first_page = await _fetch(None)
+            except aiohttp.ClientResponseError as e:
+                if e.status != 400 or not local_fallback:
+                    raise
+                print(f"[Fathom] LUSID rejected task filter '{expression}'; filtering locally")
+                params.pop("filter", None)
+                local_filter = task_filter.copy(update={"searchQuery": None}) if task_filter else None
+
+        seen = 0
+        pages = iter_pages(_fetch, prefetch=self.prefetch_pages)
+        try:
+            async for data in pages:
+                page = TaskListResponse(**data)
+                if local_filter is not None:
+                    page.values = filter_tasks(page.values, local_filter)
+                if cap and seen + len(page.values) >= cap:
+                    page.values = page.values[: cap - seen]
+                    yield page
+                    break
+                seen += len(page.values)
+                yield page
+        finally:
+            await pages.aclose()
+
+    async def get_workflow_tasks(
+        self,
+        task_filter: Optional[TaskFilter] = None,
+        page_size: Optional[int] = None,
+        max_items: Optional[int] = None,
+    ) -> TaskListResponse:
+        """Fetch all workflow tasks from LUSID across pages, pushing supported filter predicates to the server."""
+        try:
+            values: List[WorkflowTask] = []
+            first: Optional[TaskListResponse] = None
+            last: Optional[TaskListResponse] = None
+            async for page in self.iter_workflow_task_pages(task_filter, page_size=page_size, max_items=max_items):
+                first = first or page
+                last = page
+                values.extend(page.values)
+            if first is None or last is None:
+                return TaskListResponse(values=[], href="")
+            return TaskListResponse(
+                values=values,
+                href=first.href,
+                links=first.links,
+                nextPage=last.nextPage,
+                previousPage=first.previousPage,
+            )
         except Exception as e:
             raise Exception(f"Failed to fetch LUSID tasks: {str(e)}")
-    
+
     async def get_task_details(self, task_id: str) -> WorkflowTask:
         """Fetch detailed information for a specific task"""
         try:
-            data = self._make_request(f"/tasks/{task_id}")
+            data = await self._make_request(f"/tasks/{task_id}")
             return WorkflowTask(**data)
         except Exception as e:
             raise Exception(f"Failed to fetch task {task_id}: {str(e)}")
-    
+
+    async def get_tasks_by_ids(self, task_ids: Iterable[str], chunk_size: int = 100) -> List[WorkflowTask]:
+        """Fetch many tasks by id in batches; ids that don't exist are simply absent from the result.
+
+        Each chunk is one filtered /tasks request; if LUSID rejects the `id in` filter the chunk falls back
+        to individual GET /tasks/{id} calls. Chunks/calls run concurrently under a bounded semaphore.
+        """
+        ids = list(dict.fromkeys(i for i in task_ids if i))
+        if not ids:
+            return []
+        semaphore = asyncio.Semaphore(max(1, self.batch_concurrency))
+
+        async def _one(task_id: str) -> Optional[WorkflowTask]:
+            async with semaphore:
+                try:
+                    return WorkflowTask(**await self._make_request(f"/tasks/{task_id}"))
+                except aiohttp.ClientResponseError as e:
+                    if e.status == 404:
+                        return None
+                    raise
+
+        async def _chunk(chunk: List[str]) -> List[WorkflowTask]:
+            params = {"limit": len(chunk), "filter": "id in " + ", ".join(quote_literal(i) for i in chunk)}
+            async with semaphore:
+                try:
+                    data = await self._make_request("/tasks", params)
+                    return TaskListResponse(**data).values
+                except aiohttp.ClientResponseError as e:
+                    if e.status != 400:
+                        raise
+            found = await asyncio.gather(*[_one(i) for i in chunk])
+            return [t for t in found if t is not None]
+
+        chunks = [ids[i:i + chunk_size] for i in range(0, len(ids), chunk_size)]
+        results = await asyncio.gather(*[_chunk(c) for c in chunks])
+        return [task for chunk_tasks in results for task in chunk_tasks]
+
+    def residual_filter(self, task_filter: TaskFilter) -> TaskFilter:
+        """Return the predicates still to be applied locally after get_workflow_tasks/iter_workflow_task_pages"""
+        return residual_filter(task_filter)
+
     def filter_tasks_locally(self, tasks: List[WorkflowTask], task_filter: TaskFilter) -> List[WorkflowTask]:
         """Apply client-side filtering for fields not supported by LUSID API"""
-        filtered_tasks = tasks
-        
-        # Search filtering
-        if task_filter.searchQuery:
-            query = task_filter.searchQuery.lower()
-            filtered_tasks = [
-                task for task in filtered_tasks
-                if (query in task.taskDefinitionDisplayName.lower() or 
-                    query in task.state.lower() or
-                    any(query in field.name.lower() or 
-                        (field.value and query in str(field.value).lower()) 
-                        for field in task.fields))
-            ]
-        
-        # Correlation ID filtering (batch filtering)
-        if task_filter.correlationIds:
-            filtered_tasks = [
-                task for task in filtered_tasks
-                if any(corr_id in task.correlationIds for corr_id in task_filter.correlationIds)
-            ]
-        
-        return filtered_tasks
+        return filter_tasks(tasks, task_filter)
@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, Optional
+
+
+_DONE = object()
+
+
+def _next_page_token(data: Dict[str, Any]) -> Optional[str]:
+    token = data.get("nextPage") if isinstance(data, dict) else None
+    return str(token) if token else None
+
+
+async def iter_pages(
+    fetch_page: Callable[[Optional[str]], Awaitable[Dict[str, Any]]],
+    prefetch: int = 1,
+    next_token: Callable[[Dict[str, Any]], Optional[str]] = _next_page_token,
+) -> AsyncGenerator[Dict[str, Any], None]:
+    """Walk `nextPage` tokens and yield raw page payloads in order.
+
+    - fetch_page(token) returns the raw JSON for one page (token is None for the first page)
+    - A background producer fetches ahead while the caller processes the current page;
+      at most `prefetch` pages are buffered (plus one in flight), so memory stays bounded
+    - Closing the generator early (break / cancellation) cancels any in-flight fetch
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, prefetch))
+
+    async def _produce() -> None:
+        token: Optional[str] = None
+        try:
+            while True:
+                data = await fetch_page(token)
+                await queue.put(data)
+                token = next_token(data)
+                if not token:
+                    break
+            await queue.put(_DONE)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await queue.put(e)
+
+    producer = asyncio.create_task(_produce())
+    try:
+        while True:
+            item = await queue.get()
+            if item is _DONE:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        if not producer.done():
+            producer.cancel()
+            try:
+                await producer
+            except (asyncio.CancelledError, Exception):
+                pass
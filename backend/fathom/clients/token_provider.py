@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from lusid.extensions.configuration_loaders import ConfigurationLoader, get_api_configuration
+
+
+def decode_jwt_claims(token: str) -> Dict[str, Any]:
+    """Return the (unverified) payload of a JWT, or {} for opaque tokens."""
+    parts = (token or "").split(".")
+    if len(parts) != 3:
+        return {}
+    payload = parts[1] + "=" * (-len(parts[1]) % 4)
+    try:
+        claims = json.loads(base64.urlsafe_b64decode(payload.encode("ascii")))
+    except Exception:
+        return {}
+    return claims if isinstance(claims, dict) else {}
+
+
+class LusidTokenProvider:
+    """Process-wide LUSID bearer token cache shared by the Workflow and Honeycomb clients.
+
+    - The token and its expiry (JWT `exp`, else LUSID_TOKEN_TTL_SECONDS, default 3300) are cached in memory
+    - A background task refreshes the token LUSID_TOKEN_REFRESH_MARGIN_SECONDS (default 120) before it
+      expires, so requests never wait on the identity provider in the steady state
+    - Concurrent refreshes are deduplicated: callers that find the token expired await one shared refresh
+    - Each refresh reads the SDK configuration (the same loaders as the ApiClientFactory) and asks the
+      identity provider for a new token through the SDK's public API; it runs in a worker thread
+      (blocking `requests`)
+    """
+
+    def __init__(
+        self,
+        config_loaders: Optional[Iterable[ConfigurationLoader]],
+        refresh_margin_seconds: Optional[float] = None,
+        fallback_ttl_seconds: Optional[float] = None,
+    ) -> None:
+        self._config_loaders = list(config_loaders) if config_loaders is not None else None
+        self.refresh_margin = float(
+            refresh_margin_seconds if refresh_margin_seconds is not None else os.getenv("LUSID_TOKEN_REFRESH_MARGIN_SECONDS", "120")
+        )
+        self.fallback_ttl = float(
+            fallback_ttl_seconds if fallback_ttl_seconds is not None else os.getenv("LUSID_TOKEN_TTL_SECONDS", "3300")
+        )
+        self._token: Optional[str] = None
+        self._expires_at: float = 0.0
+        self._claims: Dict[str, Any] = {}
+        self._refreshing: Optional[asyncio.Task] = None
+        self._background: Optional[asyncio.Task] = None
+
+    @property
+    def claims(self) -> Dict[str, Any]:
+        """Claims of the current token (empty for opaque personal access tokens)."""
+        return self._claims
+
+    def identity(self) -> str:
+        """Stable caller identity for per-user caches: issuer + subject claims, else a hash of the token."""
+        sub = self._claims.get("sub") or self._claims.get("uid") or self._claims.get("client_id")
+        if sub:
+            return f"{self._claims.get('iss', '')}|{sub}"
+        return hashlib.sha256((self._token or "").encode("utf-8")).hexdigest()[:32]
+
+    @property
+    def expires_at(self) -> float:
+        return self._expires_at
+
+    def _valid(self) -> bool:
+        # Still usable for a request, even if the background refresh is due
+        return self._token is not None and time.time() < self._expires_at - 5
+
+    def _due(self) -> bool:
+        return self._token is None or time.time() >= self._expires_at - self.refresh_margin
+
+    def _acquire(self) -> Tuple[str, float]:
+        """Blocking: fetch a new bearer token (personal access token, or a fresh OIDC login)."""
+        if not self._config_loaders:
+            raise RuntimeError("LUSID credentials not configured (secrets file could not be loaded)")
+        # A new RefreshingToken per refresh always goes to the identity provider, whatever the previous one cached
+        raw = get_api_configuration(self._config_loaders).get_access_token()
+        token = str(raw) if raw is not None else ""
+        if not token:
+            raise RuntimeError("Empty LUSID access token")
+        claims = decode_jwt_claims(token)
+        expires_at = float(claims["exp"]) if isinstance(claims.get("exp"), (int, float)) else time.time() + self.fallback_ttl
+        return token, expires_at
+
+    def _store(self, token: str, expires_at: float) -> str:
+        self._token = token
+        self._expires_at = expires_at
+        self._claims = decode_jwt_claims(token)
+        return token
+
+    async def _refresh(self) -> str:
+        token, expires_at = await asyncio.to_thread(self._acquire)
+        return self._store(token, expires_at)
+
+    async def refresh(self) -> str:
+        """Fetch a new token; concurrent callers share a single in-flight refresh."""
+        if self._refreshing is None or self._refreshing.done():
+            self._refreshing = asyncio.create_task(self._refresh())
+        return await asyncio.shield(self._refreshing)
+
+    async def get_token(self) -> str:
+        if self._valid():
+            return self._token  # type: ignore[return-value]
+        return await self.refresh()
+
+    # --- background refresh ------------------------------------------------------------------
+
+    def start(self) -> None:
+        if not self._config_loaders:
+            return
+        if self._background is None or self._background.done():
+            self._background = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self) -> None:
+        task, self._background = self._background, None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+
+    async def _refresh_loop(self) -> None:
+        backoff = 1.0
+        while True:
+            if self._due():
+                try:
+                    await self.refresh()
+                    backoff = 1.0
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    print(f"[Fathom] LUSID token refresh failed: {e}")
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, 60.0)
+                    continue
+            await asyncio.sleep(max(1.0, self._expires_at - self.refresh_margin - time.time()))
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+from datetime import date, timedelta
+from typing import Iterable, List, Optional, Tuple
+
+from fathom.cache.task_search import searchable_strings, tokenize
+from fathom.models.tasks import TaskFilter, WorkflowTask
+
+
+def quote_literal(value: str) -> str:
+    """Quote a string literal for a LUSID filter expression."""
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def date_bounds(task_filter: TaskFilter) -> Tuple[Optional[str], Optional[str], bool]:
+    """Return (lower, upper, upper_inclusive) ISO bounds for version.asAtCreated.
+
+    Date-only values (YYYY-MM-DD) cover whole days: dateTo becomes an exclusive bound on the next day.
+    """
+    lower = (task_filter.dateFrom or "").strip() or None
+    upper = (task_filter.dateTo or "").strip() or None
+    upper_inclusive = True
+    if lower and len(lower) == 10:
+        lower = f"{lower}T00:00:00Z"
+    if upper and len(upper) == 10:
+        try:
+            upper = f"{(date.fromisoformat(upper) + timedelta(days=1)).isoformat()}T00:00:00Z"
+            upper_inclusive = False
+        except ValueError:
+            pass
+    return lower, upper, upper_inclusive
+
+
+def build_filter_expression(task_filter: Optional[TaskFilter]) -> Optional[str]:
+    """Translate the server-side part of a TaskFilter into a LUSID filter expression.
+
+    Pushed down: creation date window (version.asAtCreated), state membership and correlation IDs.
+    searchQuery is never pushed down (substring search over fields is local only).
+    """
+    if task_filter is None:
+        return None
+    clauses: List[str] = []
+    lower, upper, upper_inclusive = date_bounds(task_filter)
+    if lower:
+        clauses.append(f"version.asAtCreated gte {lower}")
+    if upper:
+        clauses.append(f"version.asAtCreated {'lte' if upper_inclusive else 'lt'} {upper}")
+    states = [s for s in (task_filter.states or []) if s]
+    if states:
+        clauses.append("state in " + ", ".join(quote_literal(s) for s in states))
+    corr_ids = [c for c in (task_filter.correlationIds or []) if c]
+    if corr_ids:
+        clauses.append("correlationIds any (~ in " + ", ".join(quote_literal(c) for c in corr_ids) + ")")
+    return " and ".join(clauses) if clauses else None
+
+
+def residual_filter(task_filter: TaskFilter) -> TaskFilter:
+    """Return the part of the filter that LUSID cannot evaluate and must be applied locally."""
+    return TaskFilter(searchQuery=task_filter.searchQuery, searchMode=task_filter.searchMode)
+
+
+def normalise_iso(value: str) -> str:
+    # LUSID timestamps are UTC ('+00:00' or 'Z'); drop the suffix so ISO strings compare lexicographically.
+    for suffix in ("+00:00", "Z"):
+        if value.endswith(suffix):
+            return value[: -len(suffix)]
+    return value
+
+
+def task_matches(task: WorkflowTask, task_filter: TaskFilter) -> bool:
+    """Evaluate every TaskFilter predicate against a task (used for residual and fallback filtering)."""
+    lower, upper, upper_inclusive = date_bounds(task_filter)
+    if lower or upper:
+        created = normalise_iso(task.version.asAtCreated)
+        if lower and created < normalise_iso(lower):
+            return False
+        if upper:
+            bound = normalise_iso(upper)
+            if created > bound or (not upper_inclusive and created >= bound):
+                return False
+    if task_filter.states:
+        wanted = {s.lower() for s in task_filter.states if s}
+        if wanted and task.state.lower() not in wanted:
+            return False
+    if task_filter.correlationIds:
+        if not any(corr_id in task.correlationIds for corr_id in task_filter.correlationIds):
+            return False
+    if task_filter.searchQuery:
+        query = task_filter.searchQuery.lower()
+        texts = searchable_strings(task)
+        if task_filter.searchMode == "prefix":
+            words = [w for text in texts for w in tokenize(text)]
+            if not all(any(w.startswith(q) for w in words) for q in tokenize(query)):
+                return False
+        elif not any(query in text for text in texts):
+            return False
+    return True
+
+
+def filter_tasks(tasks: Iterable[WorkflowTask], task_filter: TaskFilter) -> List[WorkflowTask]:
+    return [task for task in tasks if task_matches(task, task_filter)]
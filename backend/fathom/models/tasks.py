@@ -66,5 +66,11 @@ class TaskFilter(BaseModel):
     dateFrom: Optional[str] = None
     dateTo: Optional[str] = None
     searchQuery: Optional[str] = None
+    searchMode: Optional[str] = None  # "substring" (default) or "prefix" (word prefixes)
     states: Optional[List[str]] = None
     correlationIds: Optional[List[str]] = None
+
+
+class TaskBatchGetRequest(BaseModel):
+    ids: List[str]
+    refresh: bool = False  # bypass the task index and fetch every id from LUSID
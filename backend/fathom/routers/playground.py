@@ -1,8 +1,11 @@
 from __future__ import annotations
 
 import asyncio
+import contextlib
+import os
 import time
 import uuid
+import weakref
 from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple
 import json
 
@@ -13,10 +16,12 @@ from fathom.clients.azure_openai_client import (
     AzureOpenAIClient,
     load_azure_openai_config,
 )
-from fathom.tools.registry import get_tool_definitions, execute_tool_call, build_tool_cheat_sheet
+from fathom.clients.honeycomb_client import HoneycombClient, create_honeycomb_client
+from fathom.tools.registry import get_tool_definitions, get_tool_spec, execute_tool_call, build_tool_cheat_sheet
+from fathom.routers.streaming import JsonArgumentsTracker, stream_flush_bytes, stream_flush_ms, with_flush_ticks
 from fathom.tools.compact import build_prompt_context
+from fathom.tools.sql import drop_session_results
 from fathom.tools.tasks_compact import build_compact_task_context
-import lusid
 from fathom.storage.azure_storage import AzureStorage
 try:
     import tiktoken  # type: ignore
@@ -117,8 +122,361 @@ def _approx_token_count(model: str, messages: List[Dict[str, Any]]) -> int:
     return max(1, (len(combined) // 4))
 
 
-async def _stream_run_from_azure(messages: List[Dict[str, Any]]) -> AsyncGenerator[bytes, None]:
-    """Streams UI-compatible JSON event objects based on Azure OpenAI streaming."""
+async def _run_tool_with_progress(
+    honeycomb: HoneycombClient,
+    name: str,
+    args: Dict[str, Any],
+    tool_call_id: str,
+    session_id: Optional[str] = None,
+    started: Optional[_Speculation] = None,
+) -> AsyncGenerator[Tuple[str, Any], None]:
+    """Run one tool call, yielding ("progress", ToolCallProgress event) while it runs, then ("result", result).
+
+    `started` adopts a call already running speculatively (see _SpeculativeToolCalls) instead of starting one.
+    Tool errors propagate to the caller. If the stream is closed early (client disconnect) the tool call is
+    cancelled, which also cancels any background Luminesce query it started.
+    """
+    if started is not None:
+        queue, started_at, task = started.queue, started.started_at, started.task
+    else:
+        queue = asyncio.Queue()
+        started_at = time.time()
+        task = asyncio.create_task(
+            execute_tool_call(honeycomb, name=name, arguments=args, progress=queue.put_nowait, session_id=session_id)
+        )
+
+    def _progress_event(payload: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "event": "ToolCallProgress",
+            "tool_name": name,
+            "tool_call_id": tool_call_id,
+            "created_at": _now_epoch(),
+            "progress": payload,
+            "tool": {
+                "role": "assistant",
+                "content": None,
+                "tool_call_id": tool_call_id,
+                "tool_name": name,
+                "tool_args": {k: str(v) for k, v in (args or {}).items()},
+                "tool_call_error": False,
+                "metrics": {"time": int((time.time() - started_at) * 1000)},
+                "created_at": _now_epoch(),
+            },
+        }
+
+    getter: Optional[asyncio.Future] = None
+    try:
+        while not task.done():
+            getter = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait({task, getter}, return_when=asyncio.FIRST_COMPLETED)
+            if getter in done:
+                yield "progress", _progress_event(getter.result())
+            else:
+                getter.cancel()
+        while not queue.empty():
+            yield "progress", _progress_event(queue.get_nowait())
+        yield "result", task.result()
+    finally:
+        if getter is not None and not getter.done():
+            getter.cancel()
+        if not task.done():
+            task.cancel()
+
+
+class _Speculation:
+    __slots__ = ("args", "task", "queue", "started_at")
+
+    def __init__(self, args: Dict[str, Any], task: asyncio.Task, queue: asyncio.Queue, started_at: float) -> None:
+        self.args = args
+        self.task = task
+        self.queue = queue
+        self.started_at = started_at
+
+
+class _SpeculativeToolCalls:
+    """Starts read-only tool calls while the model is still streaming the rest of its turn.
+
+    Argument fragments are fed per tool call; once a call's arguments form a complete JSON object and the
+    tool is registered `read_only`, it starts right away under the same _tool_semaphores slots as a normal
+    call; when either limit is already full it is not speculated. When the turn ends, `take` hands the
+    running call (and its slots) over if the final arguments are the same, otherwise it is cancelled and the
+    call runs normally. TOOL_SPECULATIVE_EXECUTION=false turns this off.
+    """
+
+    def __init__(self, honeycomb: HoneycombClient, session_id: Optional[str]) -> None:
+        self.honeycomb = honeycomb
+        self.session_id = session_id
+        self.enabled = os.getenv("TOOL_SPECULATIVE_EXECUTION", "true").strip().lower() in ("1", "true", "yes")
+        self._trackers: Dict[str, JsonArgumentsTracker] = {}
+        self._started: Dict[str, _Speculation] = {}
+
+    def feed(self, tool_call_id: str, name: Optional[str], fragment: str) -> None:
+        if not self.enabled or not fragment:
+            return
+        tracker = self._trackers.get(tool_call_id)
+        if tracker is None:
+            tracker = self._trackers[tool_call_id] = JsonArgumentsTracker()
+        if tracker.complete or not tracker.feed(fragment):
+            return
+        spec = get_tool_spec(name or "")
+        if spec is None or not spec.read_only:
+            return
+        args = tracker.value()
+        if args is None:
+            return
+        global_sem, session_sem = _tool_semaphores(self.session_id)
+        if session_sem.locked() or global_sem.locked():
+            return  # no free slot; the call runs normally after the turn
+        queue: asyncio.Queue = asyncio.Queue()
+        task = asyncio.create_task(self._run(spec.name, args, queue, session_sem, global_sem))
+        self._started[tool_call_id] = _Speculation(args, task, queue, time.time())
+
+    async def _run(
+        self,
+        name: str,
+        args: Dict[str, Any],
+        queue: asyncio.Queue,
+        session_sem: asyncio.Semaphore,
+        global_sem: asyncio.Semaphore,
+    ) -> Dict[str, Any]:
+        async with session_sem, global_sem:
+            return await execute_tool_call(self.honeycomb, name=name, arguments=args, progress=queue.put_nowait, session_id=self.session_id)
+
+    def take(self, tool_call_id: str, args: Dict[str, Any]) -> Optional[_Speculation]:
+        started = self._started.pop(tool_call_id, None)
+        if started is None:
+            return None
+        if started.args != args:
+            self._discard(started)
+            return None
+        return started
+
+    def cancel(self) -> None:
+        """Drop calls that were never taken (end of turn, run error or client disconnect)."""
+        for started in self._started.values():
+            self._discard(started)
+        self._started.clear()
+        self._trackers.clear()
+
+    @staticmethod
+    def _discard(started: _Speculation) -> None:
+        if not started.task.done():
+            started.task.cancel()
+        elif not started.task.cancelled():
+            started.task.exception()  # retrieved, so a failed speculative call is not logged as unhandled
+
+
+_TOOL_SEMAPHORE: Optional[asyncio.Semaphore] = None
+_SESSION_TOOL_SEMAPHORES: "weakref.WeakValueDictionary[str, asyncio.Semaphore]" = weakref.WeakValueDictionary()
+
+
+def _tool_semaphores(session_id: Optional[str]) -> Tuple[asyncio.Semaphore, asyncio.Semaphore]:
+    """(global, per-session) limits on concurrently running tool calls.
+
+    TOOL_CALLS_MAX_CONCURRENCY (default 8) bounds the whole process, TOOL_CALLS_MAX_PER_SESSION (default 4)
+    one chat session; a session's semaphore lives as long as one of its batches holds it.
+    """
+    global _TOOL_SEMAPHORE
+    if _TOOL_SEMAPHORE is None:
+        _TOOL_SEMAPHORE = asyncio.Semaphore(max(1, int(os.getenv("TOOL_CALLS_MAX_CONCURRENCY", "8"))))
+    key = session_id or ""
+    session_sem = _SESSION_TOOL_SEMAPHORES.get(key)
+    if session_sem is None:
+        session_sem = asyncio.Semaphore(max(1, int(os.getenv("TOOL_CALLS_MAX_PER_SESSION", "4"))))
+        _SESSION_TOOL_SEMAPHORES[key] = session_sem
+    return _TOOL_SEMAPHORE, session_sem
+
+
+async def _run_tool_calls(
+    honeycomb: HoneycombClient,
+    tool_calls: List[Dict[str, Any]],
+    session_id: Optional[str] = None,
+    compact: bool = False,
+    speculation: Optional[_SpeculativeToolCalls] = None,
+) -> AsyncGenerator[Tuple[str, Any], None]:
+    """Run one assistant turn's tool calls concurrently (bounded by _tool_semaphores).
+
+    Calls `speculation` already started with the same arguments are adopted rather than run again.
+
+    Yields ("event", dict) for ToolCallStarted / ToolCallProgress / ToolCallCompleted as each call starts,
+    reports and finishes, then ("outcomes", list) once all are done. Outcomes keep the model's original
+    call order: dicts with tool_call_id, name, args, result, error (bool) and, with `compact`, the
+    compact prompt context. Closing the generator early cancels calls still running.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    outcomes: List[Optional[Dict[str, Any]]] = [None] * len(tool_calls)
+    global_sem, session_sem = _tool_semaphores(session_id)
+    finished = object()
+
+    async def _one(i: int, call: Dict[str, Any]) -> None:
+        tool_call_id = call.get("id") or str(uuid.uuid4())
+        name = (call.get("function") or {}).get("name")
+        raw_args = (call.get("function") or {}).get("arguments") or "{}"
+        try:
+            args = json.loads(raw_args) if isinstance(raw_args, str) else (raw_args or {})
+        except Exception:
+            args = {}
+        tool_args = {k: str(v) for k, v in (args or {}).items()}
+        try:
+            started = speculation.take(tool_call_id, args) if speculation is not None else None
+            async with contextlib.AsyncExitStack() as slots:
+                if started is None:
+                    # Session slot first: waiting on its own session limit must not hold a global slot.
+                    # An adopted speculative call already holds (or is queued for) its own slots.
+                    await slots.enter_async_context(session_sem)
+                    await slots.enter_async_context(global_sem)
+                queue.put_nowait({
+                    "event": "ToolCallStarted",
+                    "tool_name": name,
+                    "tool_call_id": tool_call_id,
+                    "created_at": _now_epoch(),
+                    "tool": {
+                        "role": "assistant",
+                        "content": None,
+                        "tool_call_id": tool_call_id,
+                        "tool_name": name,
+                        "tool_args": tool_args,
+                        "tool_call_error": False,
+                        "metrics": {"time": 0},
+                        "created_at": _now_epoch(),
+                    },
+                })
+                try:
+                    t0 = time.time()
+                    result: Dict[str, Any] = {}
+                    async for kind, payload in _run_tool_with_progress(honeycomb, name, args, tool_call_id, session_id, started):
+                        if kind == "progress":
+                            queue.put_nowait(payload)
+                        else:
+                            result = payload
+                    elapsed = int((time.time() - t0) * 1000)
+                    error = False
+                except Exception as te:
+                    result, elapsed, error = {"error": str(te)}, 0, True
+            outcome: Dict[str, Any] = {
+                "tool_call_id": tool_call_id,
+                "name": name,
+                "args": args,
+                "result": result,
+                "error": error,
+            }
+            done_evt = {
+                "event": "ToolCallCompleted",
+                "tool_name": name,
+                "tool_call_id": tool_call_id,
+                "created_at": _now_epoch(),
+                "content": result,
+                "tool": {
+                    "role": "tool",
+                    "content": json.dumps(result),
+                    "tool_call_id": tool_call_id,
+                    "tool_name": name,
+                    "tool_args": tool_args,
+                    "tool_call_error": error,
+                    "metrics": {"time": elapsed},
+                    "created_at": _now_epoch(),
+                },
+            }
+            if compact and not error:
+                outcome["compact"] = build_prompt_context(name, result, args)
+                done_evt["tool"]["compact_context"] = outcome["compact"]
+            outcomes[i] = outcome
+            queue.put_nowait(done_evt)
+        finally:
+            queue.put_nowait(finished)
+
+    workers = [asyncio.create_task(_one(i, call)) for i, call in enumerate(tool_calls)]
+    try:
+        remaining = len(workers)
+        while remaining:
+            item = await queue.get()
+            if item is finished:
+                remaining -= 1
+            else:
+                yield "event", item
+        for worker in workers:
+            worker.result()  # surface unexpected failures (tool errors are already outcomes)
+        yield "outcomes", outcomes
+    finally:
+        pending = [worker for worker in workers if not worker.done()]
+        for worker in pending:
+            worker.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
+class _ContentEvents:
+    """Builds the RunResponseContent events of one run.
+
+    - "full" (default): every event carries the whole accumulated answer
+    - "delta": events carry only the new text with `delta: true`, a `seq` number and `offset` (where the text
+      starts in the answer). Whenever the answer has doubled since the last checkpoint (and grown by at least
+      STREAM_CHECKPOINT_MIN_CHARS, default 2048) the event is a checkpoint instead, carrying the whole answer
+      with `checkpoint: true`, so a client that missed a seq can resync while total bytes stay linear
+    - Tokens are coalesced: `append` only returns an event once STREAM_FLUSH_MS have passed since the last
+      one or STREAM_FLUSH_BYTES of text are pending; `flush_due_in` tells the streamer when pending text must
+      go out without waiting for another token, and `flush` returns whatever is left
+    """
+
+    def __init__(self, model_alias: str, mode: Optional[str] = None) -> None:
+        self.model_alias = model_alias
+        self.delta = (mode or "").strip().lower() == "delta"
+        self.text = ""
+        self.seq = 0
+        self._checkpoint_len = 0
+        self._checkpoint_min = max(1, int(os.getenv("STREAM_CHECKPOINT_MIN_CHARS", "2048")))
+        self._flush_window = stream_flush_ms() / 1000.0
+        self._flush_chars = stream_flush_bytes()
+        self._emitted_len = 0
+        self._emitted_at = 0.0
+
+    def append(self, token: str) -> Optional[Dict[str, Any]]:
+        self.text += token
+        if (
+            time.monotonic() - self._emitted_at < self._flush_window
+            and len(self.text) - self._emitted_len < self._flush_chars
+        ):
+            return None
+        return self.flush()
+
+    def flush_due_in(self) -> Optional[float]:
+        """Seconds until pending text is due (<= 0: now), or None when nothing is pending."""
+        if len(self.text) == self._emitted_len:
+            return None
+        return self._emitted_at + self._flush_window - time.monotonic()
+
+    def flush(self) -> Optional[Dict[str, Any]]:
+        if len(self.text) == self._emitted_len:
+            return None
+        offset, self._emitted_len = self._emitted_len, len(self.text)
+        self._emitted_at = time.monotonic()
+        event: Dict[str, Any] = {
+            "event": "RunResponseContent",
+            "content_type": "text/markdown",
+            "content": self.text,
+            "model": self.model_alias,
+            "created_at": _now_epoch(),
+        }
+        if not self.delta:
+            return event
+        self.seq += 1
+        event["seq"] = self.seq
+        if len(self.text) - self._checkpoint_len >= max(self._checkpoint_min, self._checkpoint_len):
+            self._checkpoint_len = len(self.text)
+            event["checkpoint"] = True
+        else:
+            event.update(content=self.text[offset:], delta=True, offset=offset)
+        return event
+
+    def completed(self, event: Dict[str, Any]) -> Dict[str, Any]:
+        """Tag the RunCompleted event (always full content) with the last seq in delta mode."""
+        if self.delta:
+            event["seq"] = self.seq
+        return event
+
+
+async def _stream_run_from_azure(messages: List[Dict[str, Any]], stream_mode: Optional[str] = None) -> AsyncGenerator[bytes, None]:
+    """Streams UI-compatible JSON event objects based on Azure OpenAI streaming (`stream_mode`: see _ContentEvents)."""
     # Initialise run metadata early so we can emit a clean error if config is missing
     run_id = str(uuid.uuid4())
     session_id = str(uuid.uuid4())
@@ -136,9 +494,10 @@ async def _stream_run_from_azure(messages: List[Dict[str, Any]]) -> AsyncGenerat
     yield json.dumps(start_obj).encode() + b"\n"
 
     # Resolve Azure OpenAI config; if missing, emit RunError and exit gracefully
+    from main import app
     try:
         cfg = load_azure_openai_config()
-        client = AzureOpenAIClient(cfg)
+        client = AzureOpenAIClient(cfg, session=getattr(app.state, "http_session", None))
     except Exception as e:
         err_obj = {
             "event": "RunError",
@@ -157,6 +516,9 @@ async def _stream_run_from_azure(messages: List[Dict[str, Any]]) -> AsyncGenerat
     convo: List[Dict[str, Any]] = [system_msg] + messages
 
     accumulated = ""
+    content_events = _ContentEvents(model_alias, stream_mode)
+    honeycomb = create_honeycomb_client(app)
+    speculation = _SpeculativeToolCalls(honeycomb, session_id)
     try:
         # Stream with mid-turn tool-call support (up to 4 iterations)
         iterations = 0
@@ -164,7 +526,14 @@ async def _stream_run_from_azure(messages: List[Dict[str, Any]]) -> AsyncGenerat
             iterations += 1
             pending_calls: Dict[int, Dict[str, Any]] = {}
             # Stream one assistant turn
-            async for chunk in client.stream_chat(messages=convo, temperature=0.2, tools=tools, tool_choice="auto"):
+            turn = client.stream_chat(messages=convo, temperature=0.2, tools=tools, tool_choice="auto")
+            async for chunk in with_flush_ticks(turn, content_events.flush_due_in):
+                if chunk is None:
+                    # The model paused with coalesced text pending: send it now
+                    content_evt = content_events.flush()
+                    if content_evt is not None:
+                        yield json.dumps(content_evt).encode() + b"\n"
+                    continue
                 try:
                     choices = chunk.get("choices", [])
                     if not choices:
@@ -182,24 +551,25 @@ async def _stream_run_from_azure(messages: List[Dict[str, Any]]) -> AsyncGenerat
                             existing["name"] = fn.get("name")
                         if "arguments" in fn and fn.get("arguments"):
                             existing["arguments"] += fn.get("arguments")
+                            speculation.feed(existing["id"], existing["name"], fn.get("arguments"))
                         pending_calls[idx] = existing
 
                     token = delta.get("content")
                     if token:
                         accumulated += token
-                        yield json.dumps({
-                            "event": "RunResponseContent",
-                            "content_type": "text/markdown",
-                            "content": accumulated,
-                            "model": model_alias,
-                            "created_at": _now_epoch(),
-                        }).encode() + b"\n"
+                        content_evt = content_events.append(token)
+                        if content_evt is not None:
+                            yield json.dumps(content_evt).encode() + b"\n"
 
                     if finish_reason == "tool_calls":
                         break
                 except Exception:
                     continue
 
+            content_evt = content_events.flush()
+            if content_evt is not None:
+                yield json.dumps(content_evt).encode() + b"\n"
+
             # If no tool calls requested during stream, we're done
             if not pending_calls:
                 break
@@ -215,81 +585,21 @@ async def _stream_run_from_azure(messages: List[Dict[str, Any]]) -> AsyncGenerat
                 })
             convo.append({"role": "assistant", "tool_calls": assistant_tool_calls})
 
-            from main import app
-            api_factory: lusid.ApiClientFactory | None = getattr(app.state, "lusid_factory", None)
-            for c in assistant_tool_calls:
-                tool_call_id = c.get("id") or str(uuid.uuid4())
-                name = (c.get("function") or {}).get("name")
-                raw_args = (c.get("function") or {}).get("arguments") or "{}"
-                try:
-                    args = json.loads(raw_args) if isinstance(raw_args, str) else (raw_args or {})
-                except Exception:
-                    args = {}
-
-                start_evt = {
-                    "event": "ToolCallStarted",
-                    "tool_name": name,
-                    "tool_call_id": tool_call_id,
-                    "created_at": _now_epoch(),
-                    "tool": {
-                        "role": "assistant",
-                        "content": None,
-                        "tool_call_id": tool_call_id,
-                        "tool_name": name,
-                        "tool_args": {k: str(v) for k, v in (args or {}).items()},
-                        "tool_call_error": False,
-                        "metrics": {"time": 0},
-                        "created_at": _now_epoch(),
-                    },
-                }
-                yield json.dumps(start_evt).encode() + b"\n"
-
-                try:
-                    t0 = time.time()
-                    result = execute_tool_call(api_factory, name=name, arguments=args)
-                    elapsed = int((time.time() - t0) * 1000)
-                    tool_msg = {"role": "tool", "tool_call_id": tool_call_id, "name": name, "content": json.dumps(result)}
-                    convo.append(tool_msg)
-                    done_evt = {
-                        "event": "ToolCallCompleted",
-                        "tool_name": name,
-                        "tool_call_id": tool_call_id,
-                        "created_at": _now_epoch(),
-                        "content": result,
-                        "tool": {
-                            "role": "tool",
-                            "content": json.dumps(result),
-                            "tool_call_id": tool_call_id,
-                            "tool_name": name,
-                            "tool_args": {k: str(v) for k, v in (args or {}).items()},
-                            "tool_call_error": False,
-                            "metrics": {"time": elapsed},
-                            "created_at": _now_epoch(),
-                        },
-                    }
-                    yield json.dumps(done_evt).encode() + b"\n"
-                except Exception as te:
-                    err_payload = {"error": str(te)}
-                    tool_msg = {"role": "tool", "tool_call_id": tool_call_id, "name": name, "content": json.dumps(err_payload)}
-                    convo.append(tool_msg)
-                    err_evt = {
-                        "event": "ToolCallCompleted",
-                        "tool_name": name,
-                        "tool_call_id": tool_call_id,
-                        "created_at": _now_epoch(),
-                        "content": err_payload,
-                        "tool": {
-                            "role": "tool",
-                            "content": json.dumps(err_payload),
-                            "tool_call_id": tool_call_id,
-                            "tool_name": name,
-                            "tool_args": {k: str(v) for k, v in (args or {}).items()},
-                            "tool_call_error": True,
-                            "metrics": {"time": 0},
-                            "created_at": _now_epoch(),
-                        },
-                    }
-                    yield json.dumps(err_evt).encode() + b"\n"
+            outcomes: List[Dict[str, Any]] = []
+            async for kind, payload in _run_tool_calls(honeycomb, assistant_tool_calls, session_id, speculation=speculation):
+                if kind == "event":
+                    yield json.dumps(payload).encode() + b"\n"
+                else:
+                    outcomes = payload
+            speculation.cancel()  # speculative calls this turn did not adopt
+            # Tool messages follow the model's call order, whatever order the calls finished in
+            for outcome in outcomes:
+                convo.append({
+                    "role": "tool",
+                    "tool_call_id": outcome["tool_call_id"],
+                    "name": outcome["name"],
+                    "content": json.dumps(outcome["result"]),
+                })
     except Exception as e:
         err_obj = {
             "event": "RunError",
@@ -300,6 +610,8 @@ async def _stream_run_from_azure(messages: List[Dict[str, Any]]) -> AsyncGenerat
         }
         yield json.dumps(err_obj).encode() + b"\n"
         return
+    finally:
+        speculation.cancel()
 
     # Fallback: if no streamed tokens, attempt non-stream call once
     if not accumulated:
@@ -312,14 +624,9 @@ async def _stream_run_from_azure(messages: List[Dict[str, Any]]) -> AsyncGenerat
             )
             if text:
                 accumulated = text
-                content_obj = {
-                    "event": "RunResponseContent",
-                    "content_type": "text/markdown",
-                    "content": accumulated,
-                    "model": model_alias,
-                    "created_at": _now_epoch(),
-                }
-                yield json.dumps(content_obj).encode() + b"\n"
+                content_evt = content_events.append(text) or content_events.flush()
+                if content_evt is not None:
+                    yield json.dumps(content_evt).encode() + b"\n"
         except Exception as e:
             err_obj = {
                 "event": "RunError",
@@ -339,7 +646,7 @@ async def _stream_run_from_azure(messages: List[Dict[str, Any]]) -> AsyncGenerat
         "model": model_alias,
         "created_at": _now_epoch(),
     }
-    yield json.dumps(end_obj).encode() + b"\n"
+    yield json.dumps(content_events.completed(end_obj)).encode() + b"\n"
 
 
 def _compact_transcript_for_prompt(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
@@ -375,9 +682,12 @@ async def _stream_run_with_storage(
     prompt_history_and_user: List[Dict[str, Any]],
     session_id: str,
     storage: AzureStorage,
+    stream_mode: Optional[str] = None,
 ) -> AsyncGenerator[bytes, None]:
     """Stream a run using full prior transcript + current user message and persist the new turn.
 
+    `stream_mode="delta"` sends answer text as deltas with periodic checkpoints (see _ContentEvents).
+
     Persists, in order for this turn:
     - user message
     - assistant tool_calls (if any)
@@ -408,9 +718,10 @@ async def _stream_run_with_storage(
     yield json.dumps(start_obj).encode() + b"\n"
 
     # Resolve Azure OpenAI config
+    from main import app
     try:
         cfg = load_azure_openai_config()
-        client = AzureOpenAIClient(cfg)
+        client = AzureOpenAIClient(cfg, session=getattr(app.state, "http_session", None))
     except Exception as e:
         err_obj = {
             "event": "RunError",
@@ -441,13 +752,23 @@ async def _stream_run_with_storage(
             persist_messages.append(last_msg)
 
     accumulated = ""
+    content_events = _ContentEvents(model_alias, stream_mode)
+    honeycomb = create_honeycomb_client(app)
+    speculation = _SpeculativeToolCalls(honeycomb, session_id)
     try:
         iterations = 0
         while iterations < 4:
             iterations += 1
             pending_calls: Dict[int, Dict[str, Any]] = {}
             # Stream one assistant turn
-            async for chunk in client.stream_chat(messages=convo, temperature=0.2, tools=tools, tool_choice="auto"):
+            turn = client.stream_chat(messages=convo, temperature=0.2, tools=tools, tool_choice="auto")
+            async for chunk in with_flush_ticks(turn, content_events.flush_due_in):
+                if chunk is None:
+                    # The model paused with coalesced text pending: send it now
+                    content_evt = content_events.flush()
+                    if content_evt is not None:
+                        yield json.dumps(content_evt).encode() + b"\n"
+                    continue
                 try:
                     choices = chunk.get("choices", [])
                     if not choices:
@@ -465,24 +786,25 @@ async def _stream_run_with_storage(
                             existing["name"] = fn.get("name")
                         if "arguments" in fn and fn.get("arguments"):
                             existing["arguments"] += fn.get("arguments")
+                            speculation.feed(existing["id"], existing["name"], fn.get("arguments"))
                         pending_calls[idx] = existing
 
                     token = delta.get("content")
                     if token:
                         accumulated += token
-                        yield json.dumps({
-                            "event": "RunResponseContent",
-                            "content_type": "text/markdown",
-                            "content": accumulated,
-                            "model": model_alias,
-                            "created_at": _now_epoch(),
-                        }).encode() + b"\n"
+                        content_evt = content_events.append(token)
+                        if content_evt is not None:
+                            yield json.dumps(content_evt).encode() + b"\n"
 
                     if finish_reason == "tool_calls":
                         break
                 except Exception:
                     continue
 
+            content_evt = content_events.flush()
+            if content_evt is not None:
+                yield json.dumps(content_evt).encode() + b"\n"
+
             # If no tool calls requested during stream, we're done
             if not pending_calls:
                 break
@@ -506,87 +828,24 @@ async def _stream_run_with_storage(
             convo.append(tool_calls_msg)
 
             # Execute the pending tool calls, append results, then loop to stream again
-            from main import app
-            api_factory: lusid.ApiClientFactory | None = getattr(app.state, "lusid_factory", None)
-            for c in assistant_tool_calls:
-                tool_call_id = c.get("id") or str(uuid.uuid4())
-                name = (c.get("function") or {}).get("name")
-                raw_args = (c.get("function") or {}).get("arguments") or "{}"
-                try:
-                    args = json.loads(raw_args) if isinstance(raw_args, str) else (raw_args or {})
-                except Exception:
-                    args = {}
-
-                start_evt = {
-                    "event": "ToolCallStarted",
-                    "tool_name": name,
-                    "tool_call_id": tool_call_id,
-                    "created_at": _now_epoch(),
-                    "tool": {
-                        "role": "assistant",
-                        "content": None,
-                        "tool_call_id": tool_call_id,
-                        "tool_name": name,
-                        "tool_args": {k: str(v) for k, v in (args or {}).items()},
-                        "tool_call_error": False,
-                        "metrics": {"time": 0},
-                        "created_at": _now_epoch(),
-                    },
-                }
-                yield json.dumps(start_evt).encode() + b"\n"
-
-                try:
-                    t0 = time.time()
-                    result = execute_tool_call(api_factory, name=name, arguments=args)
-                    elapsed = int((time.time() - t0) * 1000)
-                    # Persist full result for UI/history (do not add to convo)
-                    tool_msg = {"role": "tool", "tool_call_id": tool_call_id, "name": name, "content": json.dumps(result), "created_at": _now_epoch()}
-                    persist_messages.append(tool_msg)
-                    # Build compact prompt context for the model and stage it as a compact tool message
-                    compact_text = build_prompt_context(name, result, args)
-                    convo.append({"role": "tool", "tool_call_id": tool_call_id, "name": name, "content": compact_text, "is_compact": True})
-                    done_evt = {
-                        "event": "ToolCallCompleted",
-                        "tool_name": name,
-                        "tool_call_id": tool_call_id,
-                        "created_at": _now_epoch(),
-                        "content": result,
-                        "tool": {
-                            "role": "tool",
-                            "content": json.dumps(result),
-                            "tool_call_id": tool_call_id,
-                            "tool_name": name,
-                            "tool_args": {k: str(v) for k, v in (args or {}).items()},
-                            "tool_call_error": False,
-                            "metrics": {"time": elapsed},
-                            "created_at": _now_epoch(),
-                            "compact_context": compact_text,
-                        },
-                    }
-                    yield json.dumps(done_evt).encode() + b"\n"
-                except Exception as te:
-                    err_payload = {"error": str(te)}
-                    tool_msg = {"role": "tool", "tool_call_id": tool_call_id, "name": name, "content": json.dumps(err_payload), "created_at": _now_epoch()}
+            outcomes: List[Dict[str, Any]] = []
+            async for kind, payload in _run_tool_calls(honeycomb, assistant_tool_calls, session_id, compact=True, speculation=speculation):
+                if kind == "event":
+                    yield json.dumps(payload).encode() + b"\n"
+                else:
+                    outcomes = payload
+            speculation.cancel()  # speculative calls this turn did not adopt
+            # Tool messages follow the model's call order, whatever order the calls finished in
+            for outcome in outcomes:
+                tool_call_id, name = outcome["tool_call_id"], outcome["name"]
+                # Persist full result for UI/history (do not add to convo)
+                tool_msg = {"role": "tool", "tool_call_id": tool_call_id, "name": name, "content": json.dumps(outcome["result"]), "created_at": _now_epoch()}
+                persist_messages.append(tool_msg)
+                if outcome["error"]:
                     convo.append(tool_msg)
-                    persist_messages.append(tool_msg)
-                    err_evt = {
-                        "event": "ToolCallCompleted",
-                        "tool_name": name,
-                        "tool_call_id": tool_call_id,
-                        "created_at": _now_epoch(),
-                        "content": err_payload,
-                        "tool": {
-                            "role": "tool",
-                            "content": json.dumps(err_payload),
-                            "tool_call_id": tool_call_id,
-                            "tool_name": name,
-                            "tool_args": {k: str(v) for k, v in (args or {}).items()},
-                            "tool_call_error": True,
-                            "metrics": {"time": 0},
-                            "created_at": _now_epoch(),
-                        },
-                    }
-                    yield json.dumps(err_evt).encode() + b"\n"
+                else:
+                    # Stage the compact prompt context for the model
+                    convo.append({"role": "tool", "tool_call_id": tool_call_id, "name": name, "content": outcome["compact"], "is_compact": True})
     except Exception as e:
         err_obj = {
             "event": "RunError",
@@ -597,6 +856,8 @@ async def _stream_run_with_storage(
         }
         yield json.dumps(err_obj).encode() + b"\n"
         return
+    finally:
+        speculation.cancel()
 
     # Fallback: if no streamed tokens, attempt non-stream call once
     if not accumulated:
@@ -609,14 +870,9 @@ async def _stream_run_with_storage(
             )
             if text:
                 accumulated = text
-                content_obj = {
-                    "event": "RunResponseContent",
-                    "content_type": "text/markdown",
-                    "content": accumulated,
-                    "model": model_alias,
-                    "created_at": _now_epoch(),
-                }
-                yield json.dumps(content_obj).encode() + b"\n"
+                content_evt = content_events.append(text) or content_events.flush()
+                if content_evt is not None:
+                    yield json.dumps(content_evt).encode() + b"\n"
         except Exception as e:
             err_obj = {
                 "event": "RunError",
@@ -656,7 +912,7 @@ async def _stream_run_with_storage(
             "token_count": _approx_token_count(model_alias, compact_convo)
         }
     }
-    yield json.dumps(end_obj).encode() + b"\n"
+    yield json.dumps(content_events.completed(end_obj)).encode() + b"\n"
 
 @router.post("/agents/{agent_id}/runs")
 async def run_agent(
@@ -665,6 +921,7 @@ async def run_agent(
     stream: Optional[bool] = Form(default=True),
     session_id: Optional[str] = Form(default=None),
     selected_tasks: Optional[str] = Form(default=None),
+    stream_mode: Optional[str] = Form(default=None),
 ):
     if not message:
         raise HTTPException(status_code=400, detail="Missing message")
@@ -746,7 +1003,7 @@ async def run_agent(
     user_turns.append({"role": "user", "content": message, "created_at": _now_epoch()})
     prompt_history_and_user = mixed_history + user_turns
     return StreamingResponse(
-        _stream_run_with_storage(prompt_history_and_user, session_id_resolved, storage),
+        _stream_run_with_storage(prompt_history_and_user, session_id_resolved, storage, stream_mode),
         media_type="application/json",
     )
 
@@ -757,13 +1014,14 @@ async def run_team(
     message: str = Form(...),
     stream: Optional[bool] = Form(default=True),
     session_id: Optional[str] = Form(default=None),
+    stream_mode: Optional[str] = Form(default=None),
 ):
     if not message:
         raise HTTPException(status_code=400, detail="Missing message")
 
     messages = [{"role": "user", "content": message}]
     return StreamingResponse(
-        _stream_run_from_azure(messages),
+        _stream_run_from_azure(messages, stream_mode),
         media_type="application/json",
     )
 @router.get("/agents/{agent_id}/sessions")
@@ -847,5 +1105,6 @@ async def get_agent_session(agent_id: str = Path(...), session_id: str = Path(..
 async def delete_agent_session(agent_id: str = Path(...), session_id: str = Path(...)) -> JSONResponse:
     storage = AzureStorage()
     storage.delete_session(session_id=session_id)
+    await drop_session_results(session_id)
     return JSONResponse(status_code=204, content=None)
 
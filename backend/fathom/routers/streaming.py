@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+from typing import Any, AsyncGenerator, AsyncIterable, Callable, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class JsonArgumentsTracker:
+    """Follows a JSON object streamed in fragments (a tool call's `function.arguments`) to spot when it is complete.
+
+    String/escape state and bracket depth carry over between fragments, so every character is scanned once
+    and the text is only parsed when the top-level object has closed.
+    """
+
+    def __init__(self) -> None:
+        self.text = ""
+        self.complete = False
+        self._depth = 0
+        self._opened = False
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, fragment: str) -> bool:
+        """Append a fragment; True once the top-level object has closed."""
+        self.text += fragment
+        if self.complete:
+            return True
+        for ch in fragment:
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+                self._opened = True
+            elif ch in "}]":
+                self._depth -= 1
+                if self._opened and self._depth == 0:
+                    self.complete = True
+                    break
+        return self.complete
+
+    def value(self) -> Optional[Dict[str, Any]]:
+        """The parsed arguments once complete (None before, or if they are not a JSON object)."""
+        if not self.complete:
+            return None
+        try:
+            parsed = json.loads(self.text)
+        except ValueError:
+            return None
+        return parsed if isinstance(parsed, dict) else None
+
+
+def stream_flush_ms() -> float:
+    return max(0.0, float(os.getenv("STREAM_FLUSH_MS", "50")))
+
+
+def stream_flush_bytes() -> int:
+    return max(1, int(os.getenv("STREAM_FLUSH_BYTES", "16384")))
+
+
+async def with_flush_ticks(
+    source: AsyncIterable[T],
+    due: Callable[[], Optional[float]],
+) -> AsyncGenerator[Optional[T], None]:
+    """Yield the items of `source`, plus `None` whenever a buffered flush falls due before the next item.
+
+    `due()` gives the seconds until the caller's pending output should go out, or None when nothing is
+    pending, so text coalesced by time is written on schedule even if the source stalls. The source keeps
+    being read across ticks and is cancelled where it is if the consumer goes away.
+    """
+    iterator = source.__aiter__()
+    pending: Optional[asyncio.Future] = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+            wait = due()
+            done, _ = await asyncio.wait({pending}, timeout=None if wait is None else max(0.0, wait))
+            if pending not in done:
+                yield None
+                continue
+            finished, pending = pending, None
+            try:
+                item = finished.result()
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        if pending is not None and not pending.done():
+            # Consumer went away mid-read: stop the source where it is (cancels its in-flight work)
+            pending.cancel()
+            try:
+                await pending
+            except BaseException:
+                pass
+        aclose = getattr(iterator, "aclose", None)
+        if aclose is not None:
+            try:
+                await aclose()
+            except Exception:
+                pass
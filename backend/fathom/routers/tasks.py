@@ -1,61 +1,198 @@
-from typing import Optional, List
+from typing import Any, AsyncGenerator, Dict, Optional, List, Set, Tuple
 from fastapi import APIRouter, HTTPException, Query
-from fathom.models.tasks import WorkflowTask, TaskFilter
-import lusid
+from fastapi.responses import StreamingResponse
+from fathom.models.tasks import WorkflowTask, TaskFilter, TaskBatchGetRequest
+from fathom.cache.task_hierarchy import TaskHierarchy, build_hierarchy
+from fathom.cache.task_index import TaskIndex
+import aiohttp
+import base64
+import json
 import os
 
 router = APIRouter()
 
-# We'll initialize the LUSID client per request to avoid async issues
-
-
-def group_tasks_by_ultimate_parent(tasks: List[WorkflowTask]) -> List[dict]:
-    """Group tasks by ultimate parent, matching frontend TaskGroup structure"""
-    groups = {}
-    
-    # First pass: identify ultimate parents
-    for task in tasks:
-        if not task.ultimateParentTask or task.id == task.ultimateParentTask.id:
-            # This is an ultimate parent
-            if task.id not in groups:
-                groups[task.id] = {
-                    "ultimateParent": task,
-                    "children": [],
-                    "totalCount": 1
-                }
-    
-    # Second pass: assign children to their ultimate parents
-    for task in tasks:
-        if task.ultimateParentTask and task.id != task.ultimateParentTask.id:
-            parent_id = task.ultimateParentTask.id
-            if parent_id in groups:
-                groups[parent_id]["children"].append(task)
-                groups[parent_id]["totalCount"] = len(groups[parent_id]["children"]) + 1
-    
-    # Sort by creation date (newest first)
-    return sorted(
-        groups.values(), 
-        key=lambda g: g["ultimateParent"].version.asAtCreated, 
-        reverse=True
-    )
+# LUSID clients are cheap wrappers created per request over the shared app.state session
+
+
+def group_tasks_by_ultimate_parent(tasks: List[WorkflowTask], hierarchy: Optional[TaskHierarchy] = None) -> List[dict]:
+    """Group tasks by ultimate parent, matching frontend TaskGroup structure.
+
+    Uses the full parentTask tree: children whose ultimate parent isn't among `tasks` are still grouped
+    (under the parent from `hierarchy`), and groups carry stateCounts/latestTransition/tree aggregates.
+    """
+    if hierarchy is None:
+        hierarchy = TaskHierarchy(tasks)
+    return hierarchy.group(tasks)
 
 
 def create_lusid_client(app) -> "LUSIDClient":
-    """Create a LUSID client using the shared ApiClientFactory from app.state"""
+    """Create a LUSID client using the shared token provider and aiohttp session from app.state"""
     from fathom.clients.lusid_client import LUSIDClient
-    factory: lusid.ApiClientFactory | None = getattr(app.state, "lusid_factory", None)
-    secrets_path = os.path.abspath(os.getenv("FBN_SECRETS_PATH") or os.getenv("LUSID_SECRETS_PATH") or os.path.join(os.path.dirname(__file__), "..", "..", "..", "secrets.json"))
-    return LUSIDClient(factory, secrets_path)
+    from fathom.clients.token_provider import LusidTokenProvider
+    session: aiohttp.ClientSession | None = getattr(app.state, "http_session", None)
+    token_provider: LusidTokenProvider | None = getattr(app.state, "token_provider", None)
+    return LUSIDClient(session=session, token_provider=token_provider)
+
+
+def get_task_index(app) -> TaskIndex | None:
+    """Return the process-wide task index from app.state (None when disabled via TASK_INDEX_ENABLED=false)"""
+    if os.getenv("TASK_INDEX_ENABLED", "true").strip().lower() in ("0", "false", "no"):
+        return None
+    return getattr(app.state, "task_index", None)
+
+
+# Sort keys for task groups; prefix with '-' for descending (default: -created)
+GROUP_SORT_KEYS = {
+    "created": lambda g: g["ultimateParent"].version.asAtCreated,
+    "lastTransition": lambda g: g["latestTransition"],
+    "name": lambda g: g["ultimateParent"].taskDefinitionDisplayName.lower(),
+    "state": lambda g: g["ultimateParent"].state.lower(),
+    "size": lambda g: g["totalCount"],
+}
+
+GROUP_VIEWS = ("full", "summary")
+
+# Subtree aggregates of the full view, returned only when asked for via `include`
+GROUP_EXTRAS = ("tree", "stateCounts", "latestTransition")
+
+
+def sort_task_groups(groups: List[dict], sort: Optional[str]) -> List[dict]:
+    """Sort groups by a GROUP_SORT_KEYS key ('-key' for descending); groups already arrive newest first"""
+    if not sort or sort == "-created":
+        return groups
+    descending = sort.startswith("-")
+    key = GROUP_SORT_KEYS[sort.lstrip("-")]
+    return sorted(groups, key=key, reverse=descending)
+
+
+def encode_cursor(offset: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"o": offset}).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> int:
+    if not cursor:
+        return 0
+    padded = cursor + "=" * (-len(cursor) % 4)
+    offset = int(json.loads(base64.urlsafe_b64decode(padded.encode()).decode())["o"])
+    if offset < 0:
+        raise ValueError("negative offset")
+    return offset
+
+
+def paginate_groups(groups: List[dict], limit: Optional[int], cursor: Optional[str]) -> Tuple[List[dict], Optional[str]]:
+    """Slice groups by an opaque offset cursor; returns (page, nextCursor)"""
+    offset = decode_cursor(cursor)
+    if not limit:
+        return groups[offset:], None
+    page = groups[offset:offset + limit]
+    next_offset = offset + limit
+    return page, (encode_cursor(next_offset) if next_offset < len(groups) else None)
+
+
+def project_task(task: WorkflowTask, fields: Optional[List[str]]) -> Any:
+    """Return the task restricted to the requested top-level fields (id is always kept)"""
+    if not fields:
+        return task
+    return task.dict(include=set(fields) | {"id"})
+
+
+def summarize_group(group: dict) -> Dict[str, Any]:
+    """Lightweight group shape for list views: parent id/name/state plus child counts by state"""
+    parent: WorkflowTask = group["ultimateParent"]
+    counts: Dict[str, int] = {}
+    for child in group["children"]:
+        counts[child.state] = counts.get(child.state, 0) + 1
+    return {
+        "ultimateParent": {
+            "id": parent.id,
+            "taskDefinitionDisplayName": parent.taskDefinitionDisplayName,
+            "state": parent.state,
+            "asAtCreated": parent.version.asAtCreated,
+            "asAtLastTransition": parent.asAtLastTransition,
+        },
+        "childCountsByState": counts,
+        "totalCount": group["totalCount"],
+    }
+
+
+def shape_group(group: dict, view: str, fields: Optional[List[str]], include: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Apply the requested view ('full'/'summary'), GROUP_EXTRAS to include and field projection to one group"""
+    if view == "summary":
+        return summarize_group(group)
+    shaped = {k: v for k, v in group.items() if k not in GROUP_EXTRAS or (include and k in include)}
+    if fields:
+        shaped["ultimateParent"] = project_task(group["ultimateParent"], fields)
+        shaped["children"] = [project_task(c, fields) for c in group["children"]]
+    return shaped
+
+
+def parse_group_options(
+    sort: Optional[str], view: str, fields: Optional[str], include: Optional[str]
+) -> Tuple[Optional[List[str]], Optional[List[str]]]:
+    """Validate sort/view/fields/include for group listings; returns (field_list, include_list)"""
+    if sort and sort.lstrip("-") not in GROUP_SORT_KEYS:
+        raise HTTPException(status_code=400, detail=f"Unsupported sort '{sort}'. Use one of: {', '.join(GROUP_SORT_KEYS)}")
+    if view not in GROUP_VIEWS:
+        raise HTTPException(status_code=400, detail=f"Unsupported view '{view}'. Use one of: {', '.join(GROUP_VIEWS)}")
+    field_list = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    if field_list:
+        unknown = [f for f in field_list if f not in WorkflowTask.__fields__]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown task fields: {', '.join(unknown)}")
+    include_list = [i.strip() for i in include.split(",") if i.strip()] if include else None
+    if include_list:
+        unknown = [i for i in include_list if i not in GROUP_EXTRAS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown group extras: {', '.join(unknown)}. Use any of: {', '.join(GROUP_EXTRAS)}")
+    return field_list, include_list
+
+
+async def load_task_groups(app, lusid_client, task_filter: TaskFilter) -> Tuple[List[WorkflowTask], List[dict], bool]:
+    """Filter tasks (task index when enabled, else LUSID) and group them; returns (tasks, groups, truncated)"""
+    task_index = get_task_index(app)
+    if task_index is not None:
+        # Serve from the in-memory index; only deltas are pulled from LUSID
+        await task_index.ensure_fresh(lusid_client)
+        hierarchy = await task_index.complete_hierarchy(lusid_client)
+        filtered_tasks = task_index.query(task_filter)
+        truncated = False  # the index is loaded uncapped
+    else:
+        # Fetch tasks from LUSID (all pages, up to the configured cap)
+        response = await lusid_client.get_workflow_tasks(task_filter)
+        tasks = response.values
+
+        # Apply client-side filtering for predicates LUSID can't evaluate (e.g. searchQuery)
+        filtered_tasks = lusid_client.filter_tasks_locally(tasks, lusid_client.residual_filter(task_filter))
+        truncated = response.nextPage is not None
+
+        # Complete the tree with ancestors outside the filter result (batched per level)
+        hierarchy = await build_hierarchy(filtered_tasks, fetch_missing=lusid_client.get_tasks_by_ids)
+
+    # Group tasks by ultimate parent (matching frontend structure)
+    return filtered_tasks, group_tasks_by_ultimate_parent(filtered_tasks, hierarchy), truncated
+
 
 @router.get("/tasks")
 async def get_tasks(
     dateFrom: Optional[str] = Query(None, description="Filter tasks from this date (YYYY-MM-DD)"),
     dateTo: Optional[str] = Query(None, description="Filter tasks to this date (YYYY-MM-DD)"),
     searchQuery: Optional[str] = Query(None, description="Search across task names and fields"),
+    searchMode: Optional[str] = Query(None, description="'substring' (default) or 'prefix' (word prefixes)"),
     states: Optional[str] = Query(None, description="Comma-separated list of states to filter by"),
-    correlationIds: Optional[str] = Query(None, description="Comma-separated list of correlation IDs to filter by")
+    correlationIds: Optional[str] = Query(None, description="Comma-separated list of correlation IDs to filter by"),
+    limit: Optional[int] = Query(None, ge=1, le=5000, description="Max task groups to return (default: all)"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from a previous response's nextCursor"),
+    sort: Optional[str] = Query(None, description="Group sort: created, lastTransition, name, state, size; prefix '-' for descending (default -created)"),
+    fields: Optional[str] = Query(None, description="Comma-separated WorkflowTask fields to include per task (id always included)"),
+    view: str = Query("full", description="'full' (tasks with children) or 'summary' (parent plus child counts by state)"),
+    include: Optional[str] = Query(None, description="Comma-separated full-view group extras: tree, stateCounts, latestTransition"),
 ):
     """Fetch and filter LUSID workflow tasks"""
+    field_list, include_list = parse_group_options(sort, view, fields, include)
+    try:
+        decode_cursor(cursor)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
     try:
         # Create LUSID client per request (uses shared factory)
         # FastAPI passes request via dependency or we can reach app via router routes; simplest is to use
@@ -68,30 +205,157 @@ async def get_tasks(
             dateFrom=dateFrom,
             dateTo=dateTo,
             searchQuery=searchQuery,
+            searchMode=searchMode,
             states=states.split(",") if states else None,
             correlationIds=correlationIds.split(",") if correlationIds else None
         )
         
-        # Fetch tasks from LUSID
-        response = await lusid_client.get_workflow_tasks(task_filter)
-        tasks = response.values
-        
-        # Apply client-side filtering for unsupported LUSID filters
-        filtered_tasks = lusid_client.filter_tasks_locally(tasks, task_filter)
-        
-        # Group tasks by ultimate parent (matching frontend structure)
-        grouped_tasks = group_tasks_by_ultimate_parent(filtered_tasks)
-        
+        filtered_tasks, grouped_tasks, truncated = await load_task_groups(app, lusid_client, task_filter)
+
+        # Sort, page and shape only the groups being returned
+        page, next_cursor = paginate_groups(sort_task_groups(grouped_tasks, sort), limit, cursor)
+
         return {
-            "taskGroups": grouped_tasks,
+            "taskGroups": [shape_group(g, view, field_list, include_list) for g in page],
             "totalTasks": len(filtered_tasks),
-            "totalGroups": len(grouped_tasks)
+            "totalGroups": len(grouped_tasks),
+            "truncated": truncated,
+            "nextCursor": next_cursor
         }
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch tasks: {str(e)}")
 
 
+def _ndjson(obj: Dict[str, Any]) -> bytes:
+    return json.dumps(obj, default=str).encode() + b"\n"
+
+
+def _task_json(task: WorkflowTask, fields: Optional[List[str]]) -> Any:
+    shaped = project_task(task, fields)
+    return shaped.dict() if isinstance(shaped, WorkflowTask) else shaped
+
+
+async def _stream_task_groups(app, lusid_client, task_filter: TaskFilter, fields: Optional[List[str]]) -> AsyncGenerator[bytes, None]:
+    """Emit task groups as NDJSON while they are produced.
+
+    Every `TaskGroup` line carries `ultimateParentId`, `ultimateParent` (null until known), `children` and
+    `complete`. Clients merge lines by `ultimateParentId`: a `complete` line is the whole group (replace),
+    otherwise its children are appended. From the task index each group is built and sent whole, newest
+    first; without it lines are per-LUSID-page fragments, and ultimate parents that did not match the filter
+    are fetched at the end. Only node ids / parent ids are held beyond the line being written.
+    """
+    total_tasks = 0
+    total_groups = 0
+    truncated = False
+    try:
+        task_index = get_task_index(app)
+        if task_index is not None:
+            await task_index.ensure_fresh(lusid_client)
+            hierarchy = await task_index.complete_hierarchy(lusid_client)
+            matched = task_index.query(task_filter)
+            total_tasks = len(matched)
+            for group in hierarchy.iter_groups(matched):
+                parent: WorkflowTask = group["ultimateParent"]
+                total_groups += 1
+                yield _ndjson({
+                    "event": "TaskGroup",
+                    "ultimateParentId": parent.id,
+                    "ultimateParent": _task_json(parent, fields),
+                    "children": [_task_json(c, fields) for c in group["children"]],
+                    "complete": True,
+                })
+        else:
+            residual = lusid_client.residual_filter(task_filter)
+            seen_parents: Set[str] = set()
+            sent_parents: Set[str] = set()
+            async for page in lusid_client.iter_workflow_task_pages(task_filter):
+                tasks = lusid_client.filter_tasks_locally(page.values, residual)
+                truncated = page.nextPage is not None
+                fragments: Dict[str, Dict[str, Any]] = {}
+                for task in tasks:
+                    parent_id = task.ultimateParentTask.id if task.ultimateParentTask else task.id
+                    fragment = fragments.setdefault(parent_id, {"event": "TaskGroup", "ultimateParentId": parent_id, "ultimateParent": None, "children": [], "complete": False})
+                    if parent_id == task.id:
+                        fragment["ultimateParent"] = _task_json(task, fields)
+                        sent_parents.add(parent_id)
+                    else:
+                        fragment["children"].append(_task_json(task, fields))
+                total_tasks += len(tasks)
+                seen_parents.update(fragments.keys())
+                for fragment in fragments.values():
+                    yield _ndjson(fragment)
+            # Groups whose ultimate parent did not match the filter still need it (as in /tasks)
+            missing = seen_parents - sent_parents
+            if missing:
+                for parent in await lusid_client.get_tasks_by_ids(list(missing)):
+                    yield _ndjson({"event": "TaskGroup", "ultimateParentId": parent.id, "ultimateParent": _task_json(parent, fields), "children": [], "complete": False})
+            total_groups = len(seen_parents)
+    except Exception as e:
+        yield _ndjson({"event": "TasksError", "detail": f"Failed to fetch tasks: {str(e)}"})
+        return
+    yield _ndjson({"event": "TasksCompleted", "totalTasks": total_tasks, "totalGroups": total_groups, "truncated": truncated})
+
+
+@router.get("/tasks/stream")
+async def stream_tasks(
+    dateFrom: Optional[str] = Query(None, description="Filter tasks from this date (YYYY-MM-DD)"),
+    dateTo: Optional[str] = Query(None, description="Filter tasks to this date (YYYY-MM-DD)"),
+    searchQuery: Optional[str] = Query(None, description="Search across task names and fields"),
+    searchMode: Optional[str] = Query(None, description="'substring' (default) or 'prefix' (word prefixes)"),
+    states: Optional[str] = Query(None, description="Comma-separated list of states to filter by"),
+    correlationIds: Optional[str] = Query(None, description="Comma-separated list of correlation IDs to filter by"),
+    fields: Optional[str] = Query(None, description="Comma-separated WorkflowTask fields to include per task (id always included)"),
+):
+    """Stream LUSID workflow task groups as NDJSON while they are still being produced"""
+    field_list, _ = parse_group_options(None, "full", fields, None)
+    from main import app
+    lusid_client = create_lusid_client(app)
+    task_filter = TaskFilter(
+        dateFrom=dateFrom,
+        dateTo=dateTo,
+        searchQuery=searchQuery,
+        searchMode=searchMode,
+        states=states.split(",") if states else None,
+        correlationIds=correlationIds.split(",") if correlationIds else None
+    )
+    return StreamingResponse(
+        _stream_task_groups(app, lusid_client, task_filter, field_list),
+        media_type="application/x-ndjson",
+    )
+
+
+@router.post("/tasks:batchGet")
+async def batch_get_tasks(request: TaskBatchGetRequest):
+    """Fetch details for many tasks at once: index hits are served from memory, the rest in batched LUSID calls"""
+    ids = list(dict.fromkeys(i for i in request.ids if i))
+    max_ids = int(os.getenv("TASKS_BATCH_GET_MAX_IDS", "500"))
+    if len(ids) > max_ids:
+        raise HTTPException(status_code=400, detail=f"Too many ids ({len(ids)} > {max_ids})")
+    try:
+        from main import app
+        found: Dict[str, WorkflowTask] = {}
+        task_index = get_task_index(app)
+        if task_index is not None and not request.refresh:
+            for task_id in ids:
+                task = task_index.get(task_id)
+                if task is not None:
+                    found[task_id] = task
+        misses = [i for i in ids if i not in found]
+        if misses:
+            lusid_client = create_lusid_client(app)
+            for task in await lusid_client.get_tasks_by_ids(misses):
+                found[task.id] = task
+                if task_index is not None and task_index.loaded:
+                    task_index.upsert(task, advance_watermark=False)
+        return {
+            "tasks": [found[i] for i in ids if i in found],
+            "missing": [i for i in ids if i not in found],
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch tasks: {str(e)}")
+
+
 @router.get("/tasks/{task_id}")
 async def get_task(task_id: str):
     """Fetch detailed information for a specific task"""
@@ -0,0 +1,410 @@
+from __future__ import annotations
+
+from array import array
+from typing import Any, AsyncIterable, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+_INT64_MIN = -(2 ** 63)
+_INT64_MAX = 2 ** 63 - 1
+# Dictionary encoding stops paying off once most values are distinct (ids, free text)
+_DICTIONARY_MIN_ROWS = 1024
+_DICTIONARY_MAX_RATIO = 0.5
+
+
+_KINDS = {int: "int", float: "float", str: "str", bool: "bool"}
+
+FILTER_OPS = ("=", "!=", ">", ">=", "<", "<=", "in", "not_in", "contains", "startswith", "is_null", "not_null")
+AGGREGATES = ("count", "sum", "avg", "min", "max", "count_distinct")
+
+
+def _coerce(kind: str, operand: Any) -> Any:
+    """Bring a filter operand to the column's type ("10" against an int column compares as 10)."""
+    if isinstance(operand, list):
+        return [_coerce(kind, v) for v in operand]
+    try:
+        if kind in ("int", "float") and not isinstance(operand, (int, float)):
+            return float(operand)
+        if kind == "bool" and isinstance(operand, str):
+            return operand.strip().lower() in ("1", "true", "yes")
+        if kind == "str" and operand is not None and not isinstance(operand, str):
+            return str(operand)
+    except (TypeError, ValueError):
+        pass
+    return operand
+
+
+def _predicate(op: str, operand: Any) -> Callable[[Any], bool]:
+    if op == "=":
+        return lambda v: v == operand
+    if op == "!=":
+        return lambda v: v != operand
+    if op in ("in", "not_in"):
+        members = set(operand if isinstance(operand, list) else [operand])
+        return (lambda v: v in members) if op == "in" else (lambda v: v not in members)
+    if op in ("contains", "startswith"):
+        needle = str(operand).lower()
+        if op == "contains":
+            return lambda v: needle in str(v).lower()
+        return lambda v: str(v).lower().startswith(needle)
+    compare = {">": lambda v: v > operand, ">=": lambda v: v >= operand, "<": lambda v: v < operand, "<=": lambda v: v <= operand}[op]
+
+    def _ordered(v: Any) -> bool:
+        try:
+            return compare(v)
+        except TypeError:
+            return False
+
+    return _ordered
+
+
+class Column:
+    """One result column: typed array (`q` int64, `d` float64, `b` bool, dictionary-encoded str) plus a
+    validity bytemap for nulls. Mixed int/float promotes to float; any other mix falls back to a plain list.
+    """
+
+    __slots__ = ("name", "kind", "_values", "_valid", "_nulls", "_dictionary", "_lookup")
+
+    def __init__(self, name: str, length: int = 0) -> None:
+        self.name = name
+        self.kind = "null"  # no non-null value seen yet
+        self._values: Any = None
+        self._valid = bytearray(length)
+        self._nulls = length
+        self._dictionary: Optional[List[str]] = None
+        self._lookup: Optional[Dict[str, int]] = None
+
+    def __len__(self) -> int:
+        return len(self._valid)
+
+    @property
+    def null_count(self) -> int:
+        return self._nulls
+
+    @property
+    def dictionary_encoded(self) -> bool:
+        return self._lookup is not None
+
+    def _start(self, kind: str) -> None:
+        n = len(self._valid)
+        self.kind = kind
+        if kind == "int":
+            self._values = array("q", bytes(8 * n))
+        elif kind == "float":
+            self._values = array("d", bytes(8 * n))
+        elif kind == "bool":
+            self._values = array("b", bytes(n))
+        elif kind == "str":
+            self._values = array("l", bytes(array("l").itemsize * n))
+            self._dictionary, self._lookup = [], {}
+        else:
+            self._values = [None] * n
+
+    def _to_objects(self) -> None:
+        self._values = [self.value(i) for i in range(len(self._valid))]
+        self._dictionary = self._lookup = None
+        self.kind = "object"
+
+    def _undictionary(self) -> None:
+        dictionary = self._dictionary or []
+        self._values = [dictionary[c] if ok else None for c, ok in zip(self._values, self._valid)]
+        self._dictionary = self._lookup = None
+
+    def append(self, value: Any) -> None:
+        if value is None:
+            self._valid.append(0)
+            self._nulls += 1
+            if self._values is not None:
+                self._values.append(None if isinstance(self._values, list) else 0)
+            return
+        kind = _KINDS.get(type(value), "object")
+        if kind == "int" and not _INT64_MIN <= value <= _INT64_MAX:
+            kind = "object"
+        if kind != self.kind:
+            if self.kind == "null":
+                self._start(kind)
+            elif self.kind == "float" and kind == "int":
+                value = float(value)
+            elif self.kind == "int" and kind == "float":
+                self._values = array("d", self._values)
+                self.kind = "float"
+            elif self.kind != "object":
+                self._to_objects()
+        self._valid.append(1)
+        lookup = self._lookup
+        if lookup is None:
+            self._values.append(value)
+            return
+        code = lookup.get(value)
+        if code is None:
+            code = len(lookup)
+            lookup[value] = code
+            self._dictionary.append(value)  # type: ignore[union-attr]
+            n = len(self._valid)
+            if n >= _DICTIONARY_MIN_ROWS and code >= n * _DICTIONARY_MAX_RATIO:
+                self._values.append(code)
+                self._undictionary()
+                return
+        self._values.append(code)
+
+    def value(self, i: int) -> Any:
+        if not self._valid[i] or self.kind == "null":
+            return None
+        v = self._values[i]
+        if self.kind == "bool":
+            return bool(v)
+        if self._lookup is not None:
+            return self._dictionary[v]  # type: ignore[index]
+        return v
+
+    def __iter__(self) -> Iterator[Any]:
+        for i in range(len(self._valid)):
+            yield self.value(i)
+
+    def sort_key(self, descending: bool = False) -> Callable[[int], Tuple[bool, Any]]:
+        """Key function over row indices ordering by value with nulls last in either direction
+        (pair with `reverse=descending`); typed arrays are read directly."""
+        valid, values = self._valid, self._values
+        present, missing = (True, False) if descending else (False, True)
+        if self.kind in ("int", "float", "bool"):
+            return lambda i: (present, values[i]) if valid[i] else (missing, 0)
+        if self._lookup is not None:
+            dictionary = self._dictionary or []
+            return lambda i: (present, dictionary[values[i]]) if valid[i] else (missing, "")
+        value = self.value
+        return lambda i: (missing, "") if value(i) is None else (present, value(i))
+
+    def select(self, op: str, operand: Any, rows: Optional[Sequence[int]] = None) -> List[int]:
+        """Indices (within `rows`, default all) whose value satisfies `op operand`; nulls never match
+        except for `is_null`. Dictionary-encoded columns evaluate the predicate once per distinct value."""
+        if op not in FILTER_OPS:
+            raise ValueError(f"Unsupported filter op: {op}")
+        rows = range(len(self._valid)) if rows is None else rows
+        valid = self._valid
+        if op == "is_null":
+            return [i for i in rows if not valid[i]]
+        if op == "not_null" or self.kind == "null":
+            return [i for i in rows if valid[i]] if op == "not_null" else []
+        pred = _predicate(op, _coerce(self.kind, operand))
+        values = self._values
+        if self._lookup is not None:
+            codes = {code for code, text in enumerate(self._dictionary or []) if pred(text)}
+            return [i for i in rows if valid[i] and values[i] in codes]
+        if self.kind == "bool":
+            return [i for i in rows if valid[i] and pred(bool(values[i]))]
+        return [i for i in rows if valid[i] and pred(values[i])]
+
+    def nbytes(self) -> int:
+        """Approximate buffer size (excluding Python object headers of object/plain-string columns)."""
+        size = len(self._valid)
+        if isinstance(self._values, array):
+            size += self._values.itemsize * len(self._values)
+        elif isinstance(self._values, list):
+            size += 8 * len(self._values) + sum(len(v) for v in self._values if isinstance(v, str))
+        if self._dictionary is not None:
+            size += sum(len(s) for s in self._dictionary)
+        return size
+
+    def stats(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"type": self.kind, "nulls": self._nulls}
+        if self.kind in ("int", "float"):
+            present = [v for v, ok in zip(self._values, self._valid) if ok]
+            if present:
+                out.update(min=min(present), max=max(present), mean=sum(present) / len(present))
+        elif self.kind == "str":
+            if self._dictionary is not None:
+                out["distinct"] = len(self._dictionary)
+                if self._dictionary:
+                    out.update(min=min(self._dictionary), max=max(self._dictionary))
+            else:
+                present = [v for v in self._values if v is not None]
+                out["distinct"] = len(set(present))
+                if present:
+                    out.update(min=min(present), max=max(present))
+        elif self.kind == "bool":
+            out["true"] = sum(1 for v, ok in zip(self._values, self._valid) if ok and v)
+        return out
+
+
+class ColumnarResult:
+    """SQL result held column by column instead of one dict per row.
+
+    - Columns appear in first-seen order; a column first seen mid-result is back-filled with nulls
+    - Rows beyond `max_rows` are counted (`total_rows`) but not stored (`truncated`)
+    - `head`/`row` rebuild dict rows on demand; `stats` summarises every stored value per column
+    """
+
+    def __init__(self, max_rows: Optional[int] = None) -> None:
+        self._columns: Dict[str, Column] = {}
+        self._length = 0
+        self.total_rows = 0
+        self.max_rows = max_rows
+
+    def __len__(self) -> int:
+        return self._length
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self._columns.keys())
+
+    @property
+    def truncated(self) -> bool:
+        return self.total_rows > self._length
+
+    def column(self, name: str) -> Column:
+        return self._columns[name]
+
+    def _column(self, name: str) -> Column:
+        col = self._columns.get(name)
+        if col is None:
+            col = Column(name, self._length)
+            self._columns[name] = col
+        return col
+
+    def append(self, row: Any, names: Optional[List[str]] = None) -> None:
+        """Add one row: a dict, or a list (named by `names`, else col_0..), or a scalar (column `value`)."""
+        self.total_rows += 1
+        if self.max_rows is not None and self._length >= self.max_rows:
+            return
+        columns = self._columns
+        if isinstance(row, dict):
+            for name, value in row.items():
+                col = columns.get(name)
+                if col is None:
+                    col = self._column(str(name))
+                col.append(value)
+            present = len(row)
+        else:
+            if isinstance(row, list):
+                items: Iterable = ((names[i] if names and i < len(names) else f"col_{i}", v) for i, v in enumerate(row))
+            else:
+                items = (("value", row),)
+            present = 0
+            for name, value in items:
+                col = self._column(str(name))
+                if len(col) == self._length:  # first occurrence of a repeated name wins
+                    col.append(value)
+                    present += 1
+        if present < len(columns):
+            for col in columns.values():
+                if len(col) == self._length:
+                    col.append(None)
+        self._length += 1
+
+    def row(self, i: int) -> Dict[str, Any]:
+        return {name: col.value(i) for name, col in self._columns.items()}
+
+    def head(self, n: int) -> List[Dict[str, Any]]:
+        return [self.row(i) for i in range(min(n, self._length))]
+
+    def iter_rows(self) -> Iterator[Dict[str, Any]]:
+        for i in range(self._length):
+            yield self.row(i)
+
+    def nbytes(self) -> int:
+        return sum(col.nbytes() for col in self._columns.values())
+
+    def _require(self, name: str) -> Column:
+        col = self._columns.get(name)
+        if col is None:
+            raise ValueError(f"Unknown column: {name}. Columns: {', '.join(self._columns)}")
+        return col
+
+    def filter(self, conditions: Sequence[Dict[str, Any]]) -> List[int]:
+        """Row indices matching every condition ({column, op, value}); each narrows the previous selection."""
+        rows: Optional[List[int]] = None
+        for cond in conditions:
+            col = self._require(str(cond.get("column")))
+            rows = col.select(str(cond.get("op") or "="), cond.get("value"), rows)
+            if not rows:
+                return []
+        return list(range(self._length)) if rows is None else rows
+
+    def aggregate(
+        self,
+        rows: Sequence[int],
+        group_by: Sequence[str],
+        aggregates: Sequence[Dict[str, Any]],
+    ) -> Tuple[List[str], List[Dict[str, Any]]]:
+        """Group `rows` by the `group_by` columns and compute `aggregates` ({fn, column?, as?}) per group.
+
+        Without aggregates each group gets a `count`. Returns (output columns, rows).
+        """
+        keys = [self._require(c) for c in group_by]
+        specs: List[Tuple[str, Optional[Column], str]] = []
+        for spec in aggregates or [{"fn": "count"}]:
+            fn = str(spec.get("fn") or "count").lower()
+            if fn not in AGGREGATES:
+                raise ValueError(f"Unsupported aggregate: {fn}")
+            column = spec.get("column")
+            col = self._require(str(column)) if column else None
+            if col is None and fn != "count":
+                raise ValueError(f"Aggregate {fn} needs a column")
+            specs.append((fn, col, str(spec.get("as") or (f"{fn}_{column}" if column else fn))))
+        groups: Dict[Tuple[Any, ...], List[int]] = {}
+        if keys:
+            for i in rows:
+                groups.setdefault(tuple(col.value(i) for col in keys), []).append(i)
+        else:
+            groups[()] = list(rows)
+        out_rows: List[Dict[str, Any]] = []
+        for key, members in groups.items():
+            out = {name: value for name, value in zip(group_by, key)}
+            for fn, col, alias in specs:
+                if col is None:
+                    out[alias] = len(members)
+                    continue
+                present = [v for v in (col.value(i) for i in members) if v is not None]
+                if fn == "count":
+                    out[alias] = len(present)
+                elif fn == "count_distinct":
+                    out[alias] = len(set(present))
+                elif not present:
+                    out[alias] = None
+                elif fn in ("min", "max"):
+                    try:
+                        out[alias] = min(present) if fn == "min" else max(present)
+                    except TypeError:
+                        out[alias] = None
+                else:
+                    numbers = [v for v in present if isinstance(v, (int, float)) and not isinstance(v, bool)]
+                    total = sum(numbers)
+                    out[alias] = (total / len(numbers) if numbers else None) if fn == "avg" else total
+            out_rows.append(out)
+        return list(group_by) + [alias for _, _, alias in specs], out_rows
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: col.stats() for name, col in self._columns.items()}
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Any], names: Optional[List[str]] = None, max_rows: Optional[int] = None) -> "ColumnarResult":
+        result = cls(max_rows=max_rows)
+        for name in names or []:
+            result._column(name)
+        for row in rows:
+            result.append(row, names)
+        return result
+
+    @classmethod
+    async def from_row_stream(cls, rows: AsyncIterable[Any], max_rows: Optional[int] = None) -> "ColumnarResult":
+        """Build while the response is still being parsed, so dict-per-row lists are never materialised."""
+        result = cls(max_rows=max_rows)
+        async for row in rows:
+            result.append(row)
+        return result
+
+    @classmethod
+    def from_document(cls, data: Any, max_rows: Optional[int] = None) -> "ColumnarResult":
+        """Build from a whole (non-array-streamed) Honeycomb JSON body.
+
+        Shapes: { "Tables": [ { "Columns": [...], "Rows": [...] } ] }, { "columns": [...], "rows": [...] },
+        or a list of rows; anything else yields an empty result.
+        """
+        if isinstance(data, dict) and isinstance(data.get("Tables"), list) and data["Tables"]:
+            table = data["Tables"][0]
+            names = [c.get("Name") if isinstance(c, dict) else str(c) for c in (table.get("Columns") or [])]
+            return cls.from_rows(table.get("Rows") or [], names=names, max_rows=max_rows)
+        if isinstance(data, dict) and "rows" in data:
+            names = [str(c) for c in (data.get("columns") or [])]
+            return cls.from_rows(data.get("rows") or [], names=names, max_rows=max_rows)
+        if isinstance(data, list):
+            return cls.from_rows(data, max_rows=max_rows)
+        return cls(max_rows=max_rows)
@@ -54,13 +54,15 @@ def compact_sql_execute(result: Dict[str, Any], args: Dict[str, Any]) -> str:
 
     row_count = int(result.get("row_count") or 0)
     lines.append(f"row_count:{row_count}")
+    if result.get("result_id"):
+        lines.append(f"result_id:{result['result_id']}")
 
     # Include ALL sample rows, without column names, as pipe-delimited values for compactness
     sample_rows = result.get("sample_rows") or []
-    # Determine a stable key order (sorted) if dict rows
-    key_order: List[str] = []
-    if sample_rows and isinstance(sample_rows[0], dict):
-        key_order = sorted(sample_rows[0].keys())
+    # Values follow the result's column order (columns first seen in later rows are included too)
+    key_order: List[str] = [str(c) for c in (result.get("columns") or [])]
+    if not key_order and sample_rows and isinstance(sample_rows[0], dict):
+        key_order = list(sample_rows[0].keys())
     lines.append("sample_rows:")
     for row in sample_rows:
         if isinstance(row, dict):
@@ -78,12 +80,32 @@ def compact_sql_execute(result: Dict[str, Any], args: Dict[str, Any]) -> str:
     return "\n".join(lines)
 
 
+def compact_result_query(result: Dict[str, Any], args: Dict[str, Any]) -> str:
+    lines: List[str] = [f"tool: result_query  result_id: {result.get('result_id') or args.get('resultId') or ''}"]
+    if result.get("error"):
+        lines.append(f"error:{json.dumps(result['error'], ensure_ascii=False)}")
+        return "\n".join(lines)
+    query = {k: args[k] for k in ("where", "columns", "groupBy", "aggregates", "orderBy", "limit") if args.get(k)}
+    if query:
+        lines.append("args:" + json.dumps(query, ensure_ascii=False))
+    lines.append(f"matched:{int(result.get('matched') or 0)}")
+    if result.get("source_truncated"):
+        lines.append(f"note: computed over the first {result.get('source_rows')} rows of the source result")
+    columns = [str(c) for c in (result.get("columns") or [])]
+    lines.append("columns: " + " | ".join(columns))
+    for row in result.get("rows") or []:
+        lines.append(" | ".join(str(row.get(c, "")) for c in columns))
+    return "\n".join(lines)
+
+
 def build_prompt_context(tool_name: str, result: Dict[str, Any], args: Dict[str, Any]) -> str:
     name = (tool_name or "").strip().lower()
     if name == "catalog_get_fields":
         return compact_catalog_get_fields(result, args)
     if name == "sql_execute":
         return compact_sql_execute(result, args)
+    if name == "result_query":
+        return compact_result_query(result, args)
     # Fallback: compact key info
     summary = {k: v for k, v in result.items() if isinstance(v, (int, float, str))}
     return f"tool: {tool_name}\n" + "\n".join(f"{k}:{summary[k]}" for k in summary)
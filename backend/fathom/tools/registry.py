@@ -1,106 +1,353 @@
 from __future__ import annotations
 
-import json
-from typing import Any, Dict, List, Optional
+import asyncio
+import os
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 
-import lusid
+from fathom.clients.honeycomb_client import HoneycombClient
+from fathom.tools.columnar import AGGREGATES, FILTER_OPS
+from fathom.tools.sql import ProgressCallback, most_used_tables, run_catalog_get_fields, run_result_query, run_sql_execute
 
-from fathom.tools.sql import run_catalog_get_fields, run_sql_execute
 
+# Tables described in the cheat sheet; also the default schema prewarm list
+COMMON_TABLES: List[Tuple[str, str]] = [
+    ("Lusid.Instrument", "Instrument master (IDs, DisplayName, Type, State, Scope, AsAt, EffectiveAt)."),
+    ("Lusid.Instrument.Quote", "Quotes by instrument/provider/date (Bid/Ask/Mid, Ccy, Source)."),
+    ("Lusid.Portfolio", "Portfolio entities (Scope, Code, Name, Type, created/modified timestamps)."),
+    ("Lusid.Portfolio.Holding", "Holdings/positions (Scope, Code, LusidInstrumentId, Quantity/Cost, Ccy, AsAt, EffectiveAt)."),
+    ("Lusid.Portfolio.Txn", "Transactions (Trade/Settle dates, Instrument, Quantity, Consideration, TxnType)."),
+    ("Scheduler.Schedule", "Scheduled SQL jobs (QueryName, Cron/NextRun, Enabled, Status)."),
+]
 
-def get_tool_definitions() -> List[Dict[str, Any]]:
-    """Return OpenAI/Azure-compatible tool (function) definitions."""
-    return [
-        {
+
+@dataclass
+class ToolContext:
+    """Per-call state handed to tool handlers."""
+
+    honeycomb: HoneycombClient
+    session_id: Optional[str] = None
+    progress: Optional[ProgressCallback] = None
+
+
+ToolHandler = Callable[[Dict[str, Any], ToolContext], Awaitable[Dict[str, Any]]]
+
+
+@dataclass
+class ToolSpec:
+    """A registered tool: its schema, cheat-sheet text and execution limits.
+
+    - `timeout`: seconds before the call is cancelled (env TOOL_TIMEOUT_SECONDS_<NAME> overrides)
+    - `max_concurrency`: calls of this tool running at once, process-wide (env TOOL_MAX_CONCURRENCY_<NAME>)
+    - `cost`: hint for the model ("local", "low", "high"), shown in the cheat sheet
+    - `read_only`: the call has no side effects, so it is safe to start early or run twice
+    """
+
+    name: str
+    description: str
+    parameters: Dict[str, Any]
+    handler: ToolHandler
+    summary: str = ""
+    examples: List[str] = field(default_factory=list)
+    timeout: float = 120.0
+    max_concurrency: int = 8
+    cost: str = "low"
+    read_only: bool = True
+    _semaphore: Optional[asyncio.Semaphore] = field(default=None, repr=False)
+
+    def __post_init__(self) -> None:
+        suffix = self.name.upper()
+        self.timeout = float(os.getenv(f"TOOL_TIMEOUT_SECONDS_{suffix}", str(self.timeout)))
+        self.max_concurrency = max(1, int(os.getenv(f"TOOL_MAX_CONCURRENCY_{suffix}", str(self.max_concurrency))))
+
+    def semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    def definition(self) -> Dict[str, Any]:
+        return {
             "type": "function",
-            "function": {
-                "name": "catalog_get_fields",
-                "description": (
-                    "Get Luminesce table fields (column metadata) for matching tables. "
-                    "Supports wildcards in tableLike (e.g., 'Lusid.Instrument', 'Lusid.Instrument%', 'Lusid.%')."
-                ),
-                "parameters": {
+            "function": {"name": self.name, "description": self.description, "parameters": self.parameters},
+        }
+
+    def signature(self) -> str:
+        required = set(self.parameters.get("required") or [])
+        names = list((self.parameters.get("properties") or {}).keys())
+        return ", ".join(n if n in required else f"{n}?" for n in names)
+
+
+_TOOLS: Dict[str, ToolSpec] = {}
+_DEFINITIONS: Optional[List[Dict[str, Any]]] = None
+_CHEAT_SHEET: Optional[str] = None
+
+
+def tool(
+    name: str,
+    description: str,
+    parameters: Dict[str, Any],
+    summary: str = "",
+    examples: Optional[List[str]] = None,
+    timeout: float = 120.0,
+    max_concurrency: int = 8,
+    cost: str = "low",
+    read_only: bool = True,
+) -> Callable[[ToolHandler], ToolHandler]:
+    """Register an async handler `(arguments, ctx) -> result` as a model-callable tool.
+
+    Tools appear in get_tool_definitions() and build_tool_cheat_sheet() in registration order.
+    """
+
+    def register(handler: ToolHandler) -> ToolHandler:
+        global _DEFINITIONS, _CHEAT_SHEET
+        _TOOLS[name] = ToolSpec(
+            name=name,
+            description=description,
+            parameters=parameters,
+            handler=handler,
+            summary=summary,
+            examples=list(examples or []),
+            timeout=timeout,
+            max_concurrency=max_concurrency,
+            cost=cost,
+            read_only=read_only,
+        )
+        _DEFINITIONS = None
+        _CHEAT_SHEET = None
+        return handler
+
+    return register
+
+
+def get_tool_spec(name: str) -> Optional[ToolSpec]:
+    return _TOOLS.get(name)
+
+
+def _required_str(arguments: Dict[str, Any], key: str) -> str:
+    value = str(arguments.get(key, "")).strip()
+    if not value:
+        raise ValueError(f"Missing required argument: {key}")
+    return value
+
+
+@tool(
+    "catalog_get_fields",
+    description=(
+        "Get Luminesce table fields (column metadata) for matching tables. "
+        "Supports wildcards in tableLike (e.g., 'Lusid.Instrument', 'Lusid.Instrument%', 'Lusid.%'). "
+        "Use fieldLike to find which tables have a column like X (e.g., tableLike '%', fieldLike 'Isin')."
+    ),
+    parameters={
+        "type": "object",
+        "properties": {
+            "tableLike": {
+                "type": "string",
+                "description": "A table name or pattern with wildcards to filter the catalog.",
+            },
+            "fieldLike": {
+                "type": "string",
+                "description": "Optional field name pattern (e.g., '%Isin%') or words matched against field names and descriptions.",
+            },
+        },
+        "required": ["tableLike"],
+        "additionalProperties": False,
+    },
+    summary="Return cached-or-fetched field lists with a compact summary; fieldLike finds tables with a matching column.",
+    examples=["catalog_get_fields('Lusid.Instrument')", "catalog_get_fields('%', fieldLike='Isin')"],
+    timeout=120.0,
+    max_concurrency=8,
+    cost="low",
+)
+async def _catalog_get_fields(arguments: Dict[str, Any], ctx: ToolContext) -> Dict[str, Any]:
+    table_like = _required_str(arguments, "tableLike")
+    field_like = str(arguments.get("fieldLike") or "").strip() or None
+    return await run_catalog_get_fields(ctx.honeycomb, table_like, field_like=field_like)
+
+
+@tool(
+    "sql_execute",
+    description=(
+        "Execute Luminesce SQL and return a compact result (columns, row_count, sample_rows ≤10). "
+        "Guidance: Prefer select * with a tight WHERE for the first probe, or call catalog_get_fields('Table') to project specific columns."
+    ),
+    parameters={
+        "type": "object",
+        "properties": {
+            "sql": {"type": "string", "description": "The Luminesce SQL to execute."},
+            "scalarParameters": {
+                "type": "object",
+                "description": "Optional scalar parameters (key-value). Inlined literals are preferred for MVP.",
+                "additionalProperties": {"type": ["string", "number", "boolean"]},
+            },
+            "queryName": {"type": "string", "description": "Optional query name for logs."}
+        },
+        "required": ["sql"],
+        "additionalProperties": False,
+    },
+    summary="Execute SQL (results are compact; the full result is kept as result_id).",
+    examples=["sql_execute('select * from Lusid.Instrument where LusidInstrumentId=\\'LUID_123\\'')"],
+    # Above HONEYCOMB_BACKGROUND_TIMEOUT_SECONDS (1800) so long background queries end on their own deadline
+    timeout=1860.0,
+    max_concurrency=4,
+    cost="high",
+    read_only=False,  # Luminesce SQL can write through providers
+)
+async def _sql_execute(arguments: Dict[str, Any], ctx: ToolContext) -> Dict[str, Any]:
+    return await run_sql_execute(
+        ctx.honeycomb,
+        sql=_required_str(arguments, "sql"),
+        scalar_parameters=arguments.get("scalarParameters") or {},
+        query_name=arguments.get("queryName"),
+        sample_limit=10,
+        progress=ctx.progress,
+        session_id=ctx.session_id,
+    )
+
+
+@tool(
+    "result_query",
+    description=(
+        "Filter, group, aggregate or take top-N rows of a previous sql_execute result (by its result_id) "
+        "locally, without re-running SQL. Use it for drill-downs, distinct counts and rankings of data already fetched."
+    ),
+    parameters={
+        "type": "object",
+        "properties": {
+            "resultId": {"type": "string", "description": "result_id returned by sql_execute (e.g., 'r1')."},
+            "where": {
+                "type": "array",
+                "description": "Conditions, all must match.",
+                "items": {
                     "type": "object",
                     "properties": {
-                        "tableLike": {
-                            "type": "string",
-                            "description": "A table name or pattern with wildcards to filter the catalog.",
-                        }
+                        "column": {"type": "string"},
+                        "op": {"type": "string", "enum": list(FILTER_OPS)},
+                        "value": {"description": "Operand; a list for in/not_in; omitted for is_null/not_null."},
                     },
-                    "required": ["tableLike"],
-                    "additionalProperties": False,
+                    "required": ["column", "op"],
                 },
             },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "sql_execute",
-                "description": (
-                    "Execute Luminesce SQL and return a compact result (columns, row_count, sample_rows ≤10). "
-                    "Guidance: Prefer select * with a tight WHERE for the first probe, or call catalog_get_fields('Table') to project specific columns."
-                ),
-                "parameters": {
+            "columns": {"type": "array", "items": {"type": "string"}, "description": "Columns to return (no grouping)."},
+            "groupBy": {"type": "array", "items": {"type": "string"}, "description": "Group by these columns."},
+            "aggregates": {
+                "type": "array",
+                "description": "Per-group aggregates; default count.",
+                "items": {
                     "type": "object",
                     "properties": {
-                        "sql": {"type": "string", "description": "The Luminesce SQL to execute."},
-                        "scalarParameters": {
-                            "type": "object",
-                            "description": "Optional scalar parameters (key-value). Inlined literals are preferred for MVP.",
-                            "additionalProperties": {"type": ["string", "number", "boolean"]},
-                        },
-                        "queryName": {"type": "string", "description": "Optional query name for logs."}
+                        "fn": {"type": "string", "enum": list(AGGREGATES)},
+                        "column": {"type": "string"},
+                        "as": {"type": "string"},
                     },
-                    "required": ["sql"],
-                    "additionalProperties": False,
+                    "required": ["fn"],
+                },
+            },
+            "orderBy": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {"column": {"type": "string"}, "desc": {"type": "boolean"}},
+                    "required": ["column"],
                 },
             },
+            "limit": {"type": "integer", "description": "Rows to return (default 20, max 200)."},
         },
-    ]
+        "required": ["resultId"],
+        "additionalProperties": False,
+    },
+    summary="Filter/group/top-N a kept result locally.",
+    examples=[
+        "result_query('r1', groupBy=['Currency'], aggregates=[{'fn': 'sum', 'column': 'Amount'}], orderBy=[{'column': 'sum_Amount', 'desc': true}])"
+    ],
+    timeout=30.0,
+    max_concurrency=4,
+    cost="local",
+)
+async def _result_query(arguments: Dict[str, Any], ctx: ToolContext) -> Dict[str, Any]:
+    # Runs on the loop: result sets are not thread-safe and a query over a kept result takes milliseconds
+    return await run_result_query(
+        ctx.session_id,
+        _required_str(arguments, "resultId"),
+        where=arguments.get("where") or [],
+        columns=arguments.get("columns") or None,
+        group_by=arguments.get("groupBy") or [],
+        aggregates=arguments.get("aggregates") or [],
+        order_by=arguments.get("orderBy") or [],
+        limit=int(arguments.get("limit") or 20),
+    )
+
+
+def get_tool_definitions() -> List[Dict[str, Any]]:
+    """Return OpenAI/Azure-compatible tool (function) definitions (built once per set of registered tools)."""
+    global _DEFINITIONS
+    if _DEFINITIONS is None:
+        _DEFINITIONS = [spec.definition() for spec in _TOOLS.values()]
+    return _DEFINITIONS
 
 
-def execute_tool_call(
-    api_factory: Optional[lusid.ApiClientFactory],
+async def execute_tool_call(
+    honeycomb: HoneycombClient,
     name: str,
     arguments: Dict[str, Any],
+    progress: Optional[ProgressCallback] = None,
+    session_id: Optional[str] = None,
 ) -> Dict[str, Any]:
-    """Execute a tool by name with arguments and return JSON serialisable result."""
-    if name == "catalog_get_fields":
-        table_like = str(arguments.get("tableLike", "")).strip()
-        if not table_like:
-            raise ValueError("Missing required argument: tableLike")
-        return run_catalog_get_fields(api_factory, table_like)
-
-    if name == "sql_execute":
-        sql = str(arguments.get("sql", "")).strip()
-        if not sql:
-            raise ValueError("Missing required argument: sql")
-        scalar_params = arguments.get("scalarParameters") or {}
-        query_name = arguments.get("queryName")
-        return run_sql_execute(api_factory, sql=sql, scalar_parameters=scalar_params, query_name=query_name, sample_limit=10)
+    """Execute a tool by name with arguments and return JSON serialisable result.
 
-    raise ValueError(f"Unknown tool: {name}")
+    `progress(payload)` receives intermediate status for long-running tools (sql_execute background queries).
+    `session_id` scopes stored sql_execute results for result_query. Calls wait for a free slot of the
+    tool's concurrency limit and are cancelled once its timeout expires (raised as TimeoutError).
+    """
+    spec = _TOOLS.get(name)
+    if spec is None:
+        raise ValueError(f"Unknown tool: {name}")
+    for key in spec.parameters.get("required") or []:
+        if arguments.get(key) in (None, ""):
+            raise ValueError(f"Missing required argument: {key}")
+    ctx = ToolContext(honeycomb=honeycomb, session_id=session_id, progress=progress)
+    async with spec.semaphore():
+        try:
+            return await asyncio.wait_for(spec.handler(arguments, ctx), timeout=spec.timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Tool {name} timed out after {spec.timeout:g}s") from None
 
 
 def build_tool_cheat_sheet() -> str:
-    """Compact system prompt describing tools and best practices (token-efficient)."""
-    return (
-        "Tools for exploring LUSID via Luminesce SQL:\n"
-        "- catalog_get_fields(tableLike): Return cached-or-fetched field lists with a compact summary.\n"
-        "- sql_execute(sql, scalarParameters?, queryName?): Execute SQL (results are compact).\n"
-        "Guidance: Prefer select * with a tight WHERE for the first probe, or call catalog_get_fields('Table') first to project specific columns.\n"
+    """Compact system prompt describing tools and best practices (token-efficient, built once)."""
+    global _CHEAT_SHEET
+    if _CHEAT_SHEET is not None:
+        return _CHEAT_SHEET
+    specs = list(_TOOLS.values())
+    _CHEAT_SHEET = (
+        "Tools for exploring LUSID via Luminesce SQL (cost: local < low < high):\n"
+        + "".join(f"- {s.name}({s.signature()}) [{s.cost}]: {s.summary or s.description}\n" for s in specs)
+        + "Guidance: Prefer select * with a tight WHERE for the first probe, or call catalog_get_fields('Table') first to project specific columns.\n"
         'Parameters: Prefer inlining literals directly in the SQL body for MVP reliability. scalarParameters may be ignored.\n'
         "Examples:\n"
-        "- sql_execute('select * from Lusid.Instrument where LusidInstrumentId=\\'LUID_123\\'')\n"
-        "- catalog_get_fields('Lusid.Instrument')\n"
-        "Common tables (quick context):\n"
-        "- Lusid.Instrument: Instrument master (IDs, DisplayName, Type, State, Scope, AsAt, EffectiveAt).\n"
-        "- Lusid.Instrument.Quote: Quotes by instrument/provider/date (Bid/Ask/Mid, Ccy, Source).\n"
-        "- Lusid.Portfolio: Portfolio entities (Scope, Code, Name, Type, created/modified timestamps).\n"
-        "- Lusid.Portfolio.Holding: Holdings/positions (Scope, Code, LusidInstrumentId, Quantity/Cost, Ccy, AsAt, EffectiveAt).\n"
-        "- Lusid.Portfolio.Txn: Transactions (Trade/Settle dates, Instrument, Quantity, Consideration, TxnType).\n"
-        "- Scheduler.Schedule: Scheduled SQL jobs (QueryName, Cron/NextRun, Enabled, Status).\n"
-        "Use catalog_get_fields before querying unfamiliar tables. Keep queries targeted."
+        + "".join(f"- {example}\n" for s in specs for example in s.examples)
+        + "Common tables (quick context):\n"
+        + "".join(f"- {table}: {description}\n" for table, description in COMMON_TABLES)
+        + "Use catalog_get_fields before querying unfamiliar tables. Keep queries targeted. "
+        "Answer follow-ups on data already fetched with result_query instead of new SQL."
     )
+    return _CHEAT_SHEET
+
+
+async def prewarm_table_list() -> List[str]:
+    """Tables whose schema is warmed on startup.
+
+    SCHEMA_PREWARM_TABLES (comma-separated) overrides the common tables above; the SCHEMA_PREWARM_TOP_USED
+    (default 20) most used tables of the last 14 days are added either way.
+    """
+    configured = [t.strip() for t in os.getenv("SCHEMA_PREWARM_TABLES", "").split(",") if t.strip()]
+    tables = configured or [table for table, _ in COMMON_TABLES]
+    tables += await most_used_tables(int(os.getenv("SCHEMA_PREWARM_TOP_USED", "20")))
+    seen = set()
+    ordered: List[str] = []
+    for t in tables:
+        if t.lower() not in seen:
+            seen.add(t.lower())
+            ordered.append(t)
+    return ordered
 
 
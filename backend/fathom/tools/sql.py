@@ -1,108 +1,275 @@
 from __future__ import annotations
 
+import asyncio
+import heapq
+import inspect
 import json
+import os
+import threading
 import time
-from typing import Any, Dict, List, Optional, Tuple
-import difflib
+from collections import OrderedDict
+from typing import Any, AsyncGenerator, Callable, Dict, List, Optional, Set, Tuple
 
-import lusid
+import aiohttp
 
+from fathom.cache.catalog_index import CatalogIndex
+from fathom.cache.result_sets import ResultSetStore
+from fathom.cache.schema_store import SchemaStore, default_schema_store_path
+from fathom.cache.single_flight import SingleFlight
+from fathom.cache.sql_results import SqlResultCache, referenced_tables
 from fathom.clients.honeycomb_client import HoneycombClient
+from fathom.tools.columnar import ColumnarResult
 
 
-def _get_honeycomb_client(api_factory: lusid.ApiClientFactory | None) -> HoneycombClient:
-    return HoneycombClient(api_factory=api_factory)
+def _result_max_rows() -> int:
+    """Rows of a result held in columnar form (SQL_RESULT_MAX_ROWS, default 200000); later rows are only counted."""
+    return max(1, int(os.getenv("SQL_RESULT_MAX_ROWS", "200000")))
 
 
-def _summarize_tabular_result(data: Any, sample_limit: int = 10) -> Tuple[List[str], List[Dict[str, Any]], int]:
-    """Try to infer columns, sample rows, and row count from Honeycomb JSON.
+ProgressCallback = Callable[[Dict[str, Any]], Any]
 
-    This is resilient to differing shapes by checking common patterns.
+_BACKGROUND_DONE = {"rantocompletion", "complete", "completed"}
+_BACKGROUND_FAILED = {"faulted", "canceled", "cancelled", "error", "failed"}
+_background_supported = True
+_pending_cancels: Set[asyncio.Task] = set()
+
+
+class BackgroundQueryUnavailable(Exception):
+    """The Honeycomb deployment does not expose /api/SqlBackground."""
+
+
+def _use_background_queries() -> bool:
+    flag = os.getenv("HONEYCOMB_SQL_BACKGROUND", "true").strip().lower() not in ("0", "false", "no")
+    return flag and _background_supported
+
+
+async def _emit_progress(progress: Optional[ProgressCallback], payload: Dict[str, Any]) -> None:
+    if progress is None:
+        return
+    try:
+        out = progress(payload)
+        if inspect.isawaitable(out):
+            await out
+    except Exception:
+        pass
+
+
+def _background_state(status: Dict[str, Any]) -> str:
+    """Map a SqlBackground progress response onto running / done / failed."""
+    values = {str(status.get(k) or "").replace(" ", "").lower() for k in ("status", "state")}
+    if values & _BACKGROUND_FAILED:
+        return "failed"
+    if values & _BACKGROUND_DONE:
+        return "done"
+    return "running"
+
+
+def _progress_message(status: Dict[str, Any]) -> str:
+    text = str(status.get("progress") or "").strip()
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    return lines[-1][:200] if lines else ""
+
+
+def _cancel_in_background(client: HoneycombClient, execution_id: str) -> None:
+    """Fire-and-forget DELETE so an abandoned query stops running upstream (survives our cancellation)."""
+
+    async def _cancel() -> None:
+        try:
+            await client.cancel_background_query(execution_id)
+        except Exception as e:
+            print(f"[Fathom] Failed to cancel Luminesce query {execution_id}: {e}")
+
+    task = asyncio.create_task(_cancel())
+    _pending_cancels.add(task)
+    task.add_done_callback(_pending_cancels.discard)
+
+
+async def _iter_background_rows(
+    client: HoneycombClient, execution_id: str, page_size: int, max_rows: int
+) -> AsyncGenerator[Any, None]:
+    """Page through a finished background query, stopping one row past `max_rows` (enough to mark truncation)."""
+    page = 0
+    remaining = max_rows + 1
+    while True:
+        received = 0
+        rows = aiter(client.stream_background_page(execution_id, page, page_size))
+        try:
+            async for row in rows:
+                received += 1
+                yield row
+                remaining -= 1
+                if remaining <= 0:
+                    return
+        finally:
+            await rows.aclose()
+        if received < page_size:
+            return
+        page += 1
+
+
+async def _run_background_query(
+    client: HoneycombClient,
+    sql: str,
+    query_name: Optional[str],
+    progress: Optional[ProgressCallback],
+) -> Tuple[str, ColumnarResult]:
+    """Submit via /api/SqlBackground, poll with backoff until finished, then page through the results.
+
+    Cancellation (e.g. the client disconnects from the run stream) or timeout cancels the query upstream.
     """
-    # Pattern 1: { "Tables": [ { "Columns": [...], "Rows": [...] } ] }
-    if isinstance(data, dict) and "Tables" in data and isinstance(data["Tables"], list) and data["Tables"]:
-        table = data["Tables"][0]
-        rows = table.get("Rows") or []
-        cols = table.get("Columns") or []
-        columns = [c.get("Name") if isinstance(c, dict) else str(c) for c in cols]
-        if rows and isinstance(rows[0], dict):
-            sample = rows[:sample_limit]
-            return columns, sample, len(rows)
-        if rows and isinstance(rows[0], list):
-            # Convert list rows to dicts using columns if available
-            sample = []
-            for r in rows[:sample_limit]:
-                row_dict = {columns[i] if i < len(columns) else f"col_{i}": r[i] for i in range(len(r))}
-                sample.append(row_dict)
-            return columns, sample, len(rows)
-
-    # Pattern 2: { "columns": [...], "rows": [...] }
-    if isinstance(data, dict) and "rows" in data:
-        rows = data.get("rows") or []
-        columns = data.get("columns") or []
-        if rows and isinstance(rows[0], dict):
-            sample = rows[:sample_limit]
-            return [str(c) for c in columns] if columns else list(sample[0].keys()), sample, len(rows)
-        if rows and isinstance(rows[0], list):
-            cols = [str(c) for c in columns]
-            sample = []
-            for r in rows[:sample_limit]:
-                row_dict = {cols[i] if i < len(cols) else f"col_{i}": r[i] for i in range(len(r))}
-                sample.append(row_dict)
-            return cols, sample, len(rows)
-
-    # Pattern 3: List[Dict]
-    if isinstance(data, list) and data and isinstance(data[0], dict):
-        sample = data[:sample_limit]
-        columns = list({k for row in sample for k in row.keys()})
-        return columns, sample, len(data)
-
-    # Fallback: unstructured
-    return [], [], 0
-
-
-def run_catalog_get_fields(api_factory: lusid.ApiClientFactory | None, table_like: str) -> Dict[str, Any]:
+    poll_initial = float(os.getenv("HONEYCOMB_POLL_INITIAL_SECONDS", "0.25"))
+    poll_max = float(os.getenv("HONEYCOMB_POLL_MAX_SECONDS", "2"))
+    deadline = float(os.getenv("HONEYCOMB_BACKGROUND_TIMEOUT_SECONDS", "1800"))
+    page_size = max(1, int(os.getenv("HONEYCOMB_RESULT_PAGE_SIZE", "10000")))
+
+    started_at = time.time()
+    try:
+        execution_id = await client.start_background_query(sql, query_name=query_name)
+    except aiohttp.ClientResponseError as e:
+        if e.status in (404, 405):
+            raise BackgroundQueryUnavailable(f"HTTP {e.status}") from e
+        raise
+    state = "running"
+    row_count: Any = None
+    try:
+        delay = poll_initial
+        while True:
+            status = await client.get_background_progress(execution_id)
+            state = _background_state(status)
+            row_count = status.get("rowCount", row_count)
+            await _emit_progress(progress, {
+                "execution_id": execution_id,
+                "status": status.get("status") or status.get("state") or "",
+                "row_count": status.get("rowCount"),
+                "elapsed_ms": int((time.time() - started_at) * 1000),
+                "message": _progress_message(status),
+            })
+            if state == "done":
+                break
+            if state == "failed":
+                raise RuntimeError(f"Luminesce query {status.get('status') or status.get('state')}: {_progress_message(status)}")
+            if time.time() - started_at > deadline:
+                raise TimeoutError(f"Luminesce query exceeded {int(deadline)}s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 1.5, poll_max)
+        max_rows = _result_max_rows()
+        table = await ColumnarResult.from_row_stream(
+            _iter_background_rows(client, execution_id, page_size, max_rows), max_rows=max_rows
+        )
+        # Pages past max_rows are never fetched; the execution's own rowCount is the total
+        if isinstance(row_count, int) and row_count > table.total_rows:
+            table.total_rows = row_count
+        return execution_id, table
+    except BaseException:
+        if state != "failed":
+            _cancel_in_background(client, execution_id)
+        raise
+
+
+async def _fetch_catalog(honeycomb: HoneycombClient, table_like: str) -> Any:
+    """GET /api/Catalog/fields, shared by concurrent callers asking for the same pattern."""
+    return await _INFLIGHT.do(
+        f"catalog:{table_like.strip().lower()}",
+        lambda _notify: honeycomb.get_catalog_fields(table_like),
+    )
+
+
+async def _cache_catalog_fields(fetched: List[Dict[str, Any]], default_table: str = "") -> None:
+    """Split a catalog response per TableName and store each table in the schema cache."""
+    by_table: Dict[str, List[Dict[str, Any]]] = {}
+    for item in fetched:
+        tname = item.get("TableName") or default_table
+        if tname:
+            by_table.setdefault(tname, []).append(item)
+    await _SCHEMA_CACHE.set_many(by_table)
+    index = await _catalog_index()
+    for t, fields in by_table.items():
+        index.add_table(t, fields)
+
+
+_revalidating: Set[str] = set()
+_revalidation_tasks: Set[asyncio.Task] = set()
+
+
+def _revalidate_in_background(honeycomb: HoneycombClient, table: str) -> None:
+    """Refresh one stale table's schema without blocking the caller (at most one refresh per table)."""
+    key = table.strip().lower()
+    if key in _revalidating:
+        return
+
+    async def _refresh() -> None:
+        try:
+            fetched = await _fetch_catalog(honeycomb, table)
+            if isinstance(fetched, list) and fetched:
+                await _cache_catalog_fields(fetched, default_table=table)
+        except Exception as e:
+            print(f"[Fathom] Schema revalidation failed for {table}: {e}")
+        finally:
+            _revalidating.discard(key)
+
+    _revalidating.add(key)
+    task = asyncio.create_task(_refresh())
+    _revalidation_tasks.add(task)
+    task.add_done_callback(_revalidation_tasks.discard)
+
+
+async def run_catalog_get_fields(
+    honeycomb: HoneycombClient,
+    table_like: str,
+    field_like: Optional[str] = None,
+) -> Dict[str, Any]:
     """Get Honeycomb Catalog fields with cache support and compact summary.
 
-    - If exact table cached, serve from cache (no network).
-    - On wildcard or cache miss, fetch from Honeycomb, cache per TableName, and return.
+    - If exact table cached, serve from cache (no network); stale entries are served and refreshed in the background.
+    - With SCHEMA_CATALOG_BULK_LOAD on, wildcard lookups and `field_like` searches are answered from the
+      local catalog index; otherwise fetch from Honeycomb, cache per TableName, and return.
+    - `field_like` keeps only fields whose name matches (LIKE pattern) or whose name/description contains its words.
     - Also include a compact per-table summary (pk, ids, name, status, dates, measures, other; top 12 only).
     """
     started_at = time.time()
     results: List[Dict[str, Any]] = []
     is_wildcard = any(ch in table_like for ch in ["%", "*"])
+    field_like = (field_like or "").strip() or None
+    source = "cache"
 
     if not is_wildcard:
-        cached = _SCHEMA_CACHE.get(table_like)
+        _SCHEMA_CACHE.record_usage([table_like])
+
+    index = await _full_catalog(honeycomb) if (is_wildcard or field_like) else None
+    if index is not None:
+        results = index.search_fields(field_like, table_like) if field_like else index.match_fields(table_like)
+        source = "index"
+    elif not is_wildcard:
+        cached = await _SCHEMA_CACHE.get(table_like)
         if cached:
+            if cached.get("stale"):
+                _revalidate_in_background(honeycomb, table_like)
             for f in cached.get("fields") or []:
                 item = dict(f)
                 item["TableName"] = table_like
                 results.append(item)
         else:
-            client = _get_honeycomb_client(api_factory)
-            fetched = client.get_catalog_fields(table_like)
+            fetched = await _fetch_catalog(honeycomb, table_like)
+            source = "catalog"
             if isinstance(fetched, list):
-                by_table: Dict[str, List[Dict[str, Any]]] = {}
-                for item in fetched:
-                    tname = item.get("TableName") or table_like
-                    by_table.setdefault(tname, []).append(item)
-                for t, fields in by_table.items():
-                    _SCHEMA_CACHE.set(t, fields)
+                await _cache_catalog_fields(fetched, default_table=table_like)
                 results = fetched
     else:
-        client = _get_honeycomb_client(api_factory)
-        fetched = client.get_catalog_fields(table_like)
+        fetched = await _fetch_catalog(honeycomb, table_like)
+        source = "catalog"
         if isinstance(fetched, list):
-            by_table: Dict[str, List[Dict[str, Any]]] = {}
-            for item in fetched:
-                tname = item.get("TableName") or ""
-                if tname:
-                    by_table.setdefault(tname, []).append(item)
-            for t, fields in by_table.items():
-                _SCHEMA_CACHE.set(t, fields)
+            await _cache_catalog_fields(fetched)
             results = fetched
 
+    if field_like and index is None:
+        scope = CatalogIndex()
+        grouped: Dict[str, List[Dict[str, Any]]] = {}
+        for item in results:
+            grouped.setdefault(item.get("TableName") or table_like, []).append(item)
+        for t, fields in grouped.items():
+            scope.add_table(t, fields)
+        results = scope.search_fields(field_like)
+
     duration_ms = int((time.time() - started_at) * 1000)
 
     # Build compact summary from cache
@@ -112,24 +279,59 @@ def run_catalog_get_fields(api_factory: lusid.ApiClientFactory | None, table_lik
         t = item.get("TableName") or table_like
         names_by_table.setdefault(t, []).append(item.get("FieldName") or "")
     for t in names_by_table:
-        entry = _SCHEMA_CACHE.get(t)
+        entry = await _SCHEMA_CACHE.get(t)
         if entry and entry.get("summary"):
             by_table_summary[t] = {k: (entry["summary"].get(k) or [])[:12] for k in entry["summary"]}
         else:
             by_table_summary[t] = {"all": names_by_table[t][:12]}
 
-    return {
+    out: Dict[str, Any] = {
         "table_like": table_like,
         "duration_ms": duration_ms,
+        "source": source,
         "catalog": results,
         "schema": {"by_table": by_table_summary, "has_more": {t: len(names_by_table.get(t, [])) > 12 for t in names_by_table}},
     }
+    if field_like:
+        out["field_like"] = field_like
+    return out
 
 
 class SchemaCache:
-    def __init__(self, ttl_seconds: int = 1800) -> None:
-        self._ttl_seconds = ttl_seconds
-        self._table_to_entry: Dict[str, Dict[str, Any]] = {}
+    """Tiered Luminesce schema cache: in-memory LRU in front of a shared on-disk SchemaStore (SQLite, WAL).
+
+    - Entries younger than SCHEMA_CACHE_TTL_SECONDS (default 1800) are fresh
+    - Older entries are still served for up to SCHEMA_CACHE_MAX_STALE_SECONDS (default 7 days) but flagged
+      `stale`, so callers revalidate in the background (stale-while-revalidate) instead of waiting
+    - Memory keeps the SCHEMA_CACHE_MAX_TABLES (default 5000) most recently used tables; misses and stale
+      entries fall through to disk, which may hold a fresher copy written by another worker
+    - Disk store at SCHEMA_CACHE_PATH (default backend/.cache/schema_catalog.sqlite3; empty disables)
+      survives restarts and is shared by all workers on the host
+    - Disk access runs in a worker thread (a busy SQLite lock never stalls the event loop); usage counts are
+      buffered in memory and written in one batch every SCHEMA_USAGE_FLUSH_SECONDS (default 5)
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: Optional[int] = None,
+        max_stale_seconds: Optional[int] = None,
+        max_tables: Optional[int] = None,
+        store_path: Optional[str] = None,
+    ) -> None:
+        self._ttl_seconds = float(ttl_seconds if ttl_seconds is not None else os.getenv("SCHEMA_CACHE_TTL_SECONDS", "1800"))
+        self._max_stale_seconds = float(
+            max_stale_seconds if max_stale_seconds is not None else os.getenv("SCHEMA_CACHE_MAX_STALE_SECONDS", str(7 * 24 * 3600))
+        )
+        self._max_tables = int(max_tables if max_tables is not None else os.getenv("SCHEMA_CACHE_MAX_TABLES", "5000"))
+        self._store_path = store_path if store_path is not None else os.getenv("SCHEMA_CACHE_PATH", default_schema_store_path())
+        self._store: Optional[SchemaStore] = None
+        self._store_failed = False
+        self._store_lock = threading.Lock()
+        self._table_to_entry: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._usage: Dict[str, Tuple[str, int, float]] = {}  # used when no disk store is configured
+        self._pending_usage: Dict[str, Tuple[str, int, float]] = {}  # not yet written to the disk store
+        self._usage_flush_seconds = float(os.getenv("SCHEMA_USAGE_FLUSH_SECONDS", "5"))
+        self._usage_writer: Optional[asyncio.Task] = None
 
     def now(self) -> float:
         return time.time()
@@ -137,24 +339,167 @@ class SchemaCache:
     def _key(self, table: str) -> str:
         return table.strip().lower()
 
-    def set(self, table: str, fields: List[Dict[str, Any]]) -> None:
-        entry = {
-            "fields": fields,
-            "summary": _summarize_fields(fields),
-            "ts": self.now(),
-        }
-        self._table_to_entry[self._key(table)] = entry
+    def store(self) -> Optional[SchemaStore]:
+        """The disk store, opened on first use (blocking: call from a worker thread)."""
+        with self._store_lock:
+            if self._store is None and self._store_path and not self._store_failed:
+                try:
+                    self._store = SchemaStore(self._store_path)
+                except Exception as e:
+                    print(f"[Fathom] Schema store unavailable at {self._store_path}: {e}")
+                    self._store_failed = True
+            return self._store
+
+    @property
+    def has_store(self) -> bool:
+        return bool(self._store_path) and not self._store_failed
+
+    async def _in_store(self, op: Callable[[SchemaStore], Any], what: str, default: Any = None) -> Any:
+        """Run `op(store)` in a worker thread; `default` when there is no store or the call fails."""
+        if not self.has_store:
+            return default
+
+        def _run() -> Any:
+            store = self.store()
+            return op(store) if store is not None else default
 
-    def get(self, table: str) -> Optional[Dict[str, Any]]:
-        entry = self._table_to_entry.get(self._key(table))
+        try:
+            return await asyncio.to_thread(_run)
+        except Exception as e:
+            print(f"[Fathom] Schema store {what} failed: {e}")
+            return default
+
+    def _remember(self, key: str, entry: Dict[str, Any]) -> None:
+        self._table_to_entry[key] = entry
+        self._table_to_entry.move_to_end(key)
+        while len(self._table_to_entry) > self._max_tables:
+            self._table_to_entry.popitem(last=False)
+
+    async def _from_store(self, key: str, newer_than: float = 0.0) -> Optional[Dict[str, Any]]:
+        def _read(store: SchemaStore) -> Optional[Dict[str, Any]]:
+            fetched_at = store.fetched_at(key)
+            if fetched_at is None or fetched_at <= newer_than:
+                return None
+            row = store.get(key)
+            if row is None:
+                return None
+            _, fields, fetched_at = row
+            return {"fields": fields, "summary": _summarize_fields(fields), "ts": fetched_at}
+
+        return await self._in_store(_read, "read")
+
+    async def set(self, table: str, fields: List[Dict[str, Any]]) -> None:
+        await self.set_many({table: fields})
+
+    async def set_many(self, tables: Dict[str, List[Dict[str, Any]]]) -> None:
+        """Store tables in memory now and on disk in one transaction (one per fetch, or per bulk catalog load)."""
+        now = self.now()
+        for table, fields in tables.items():
+            self._remember(self._key(table), {"fields": fields, "summary": _summarize_fields(fields), "ts": now})
+        rows = [(self._key(t), t.strip(), f) for t, f in tables.items()]
+        await self._in_store(lambda store: store.put_many(rows, fetched_at=now), "write")
+
+    async def stored_tables(self) -> List[Tuple[str, List[Dict[str, Any]]]]:
+        """Every table on disk that is still servable (younger than SCHEMA_CACHE_MAX_STALE_SECONDS)."""
+        if not self.has_store:
+            return [(key, entry["fields"]) for key, entry in self._table_to_entry.items()]
+        since = self.now() - self._max_stale_seconds
+        rows = await self._in_store(lambda store: store.all_tables(since=since), "read", default=[])
+        return [(name, fields) for name, fields, _ in rows]
+
+    async def catalog_loaded_at(self) -> Optional[float]:
+        """When the whole catalog was last bulk-loaded (by any worker), if within SCHEMA_CACHE_MAX_STALE_SECONDS."""
+        value = await self._in_store(lambda store: store.get_meta("catalog_loaded_at"), "read")
+        if value is None:
+            return None
+        loaded_at = float(value)
+        return loaded_at if self.now() - loaded_at <= self._max_stale_seconds else None
+
+    async def mark_catalog_loaded(self, loaded_at: float) -> None:
+        await self._in_store(lambda store: store.set_meta("catalog_loaded_at", repr(loaded_at)), "write")
+
+    async def get(self, table: str) -> Optional[Dict[str, Any]]:
+        """Return the cached entry (fields, summary, ts); `stale: True` marks one due for revalidation."""
+        key = self._key(table)
+        entry = self._table_to_entry.get(key)
+        now = self.now()
+        if entry is None or now - entry["ts"] > self._ttl_seconds:
+            disk = await self._from_store(key, newer_than=entry["ts"] if entry else 0.0)
+            if disk is not None:
+                entry = disk
+                self._remember(key, entry)
         if not entry:
             return None
-        if self.now() - entry["ts"] > self._ttl_seconds:
+        age = now - entry["ts"]
+        if age > self._max_stale_seconds:
             return None
+        if key in self._table_to_entry:
+            self._table_to_entry.move_to_end(key)
+        if age > self._ttl_seconds:
+            return dict(entry, stale=True)
         return entry
 
-    def list_tables(self) -> List[str]:
-        return list(self._table_to_entry.keys())
+    def record_usage(self, tables: List[str]) -> None:
+        """Count lookups/queries per table; the most used tables are prewarmed on startup.
+
+        Never touches disk: counts are buffered and written by a background task (see flush_usage).
+        """
+        named = {self._key(t): t.strip() for t in tables if t and t.strip() and not any(ch in t for ch in "%*")}
+        if not named:
+            return
+        now = self.now()
+        target = self._pending_usage if self.has_store else self._usage
+        for key, name in named.items():
+            _, hits, _ = target.get(key, (name, 0, now))
+            target[key] = (name, hits + 1, now)
+        if target is self._pending_usage and (self._usage_writer is None or self._usage_writer.done()):
+            try:
+                self._usage_writer = asyncio.get_running_loop().create_task(self._write_usage_periodically())
+            except RuntimeError:
+                pass  # no loop (scripts): flushed by the next flush_usage()
+
+    async def _write_usage_periodically(self) -> None:
+        while self._pending_usage:
+            await asyncio.sleep(self._usage_flush_seconds)
+            await self.flush_usage()
+
+    async def flush_usage(self) -> None:
+        """Write buffered usage counts to the disk store in one transaction."""
+        if not self._pending_usage:
+            return
+        pending, self._pending_usage = self._pending_usage, {}
+        ok = await self._in_store(lambda store: store.record_usage(pending) or True, "usage write", default=False)
+        if not ok:
+            for key, (name, hits, used) in pending.items():
+                _, old_hits, _ = self._usage.get(key, (name, 0, used))
+                self._usage[key] = (name, old_hits + hits, used)
+
+    async def close(self) -> None:
+        """Stop the usage writer, write what is buffered and close the disk store (app shutdown)."""
+        if self._usage_writer is not None and not self._usage_writer.done():
+            self._usage_writer.cancel()
+            try:
+                await self._usage_writer
+            except asyncio.CancelledError:
+                pass
+        await self.flush_usage()
+        await self._in_store(lambda store: store.close(), "close")
+        self._store = None
+
+    async def most_used(self, limit: int, within_seconds: float = 14 * 24 * 3600) -> List[str]:
+        since = self.now() - within_seconds
+        stored = await self._in_store(lambda store: store.most_used(limit, since), "read")
+        if stored is not None:
+            return stored
+        recent = [(hits, used, name) for name, hits, used in self._usage.values() if used >= since]
+        return [name for _, _, name in sorted(recent, reverse=True)[:limit]]
+
+    async def list_tables(self) -> List[str]:
+        tables = list(self._table_to_entry.keys())
+        known = set(tables)
+        stored = await self._in_store(lambda store: store.table_keys(), "read", default=[])
+        tables.extend(k for k in stored if k not in known)
+        return tables
 
 
 def _categorize_field(name: str, data_type: str, is_pk: int | bool, is_main: int | bool) -> str:
@@ -188,27 +533,200 @@ def _summarize_fields(fields: List[Dict[str, Any]]) -> Dict[str, List[str]]:
 
 
 _SCHEMA_CACHE = SchemaCache()
+_RESULT_CACHE = SqlResultCache()
+_INFLIGHT = SingleFlight()
+_RESULT_SETS = ResultSetStore()
 
 
-def prewarm_schema_cache(api_factory: lusid.ApiClientFactory | None, tables: List[str]) -> None:
-    client = _get_honeycomb_client(api_factory)
-    for t in tables:
+_CATALOG = CatalogIndex()
+_catalog_index_built = False
+_catalog_reload_task: Optional[asyncio.Task] = None
+_catalog_failed_at = 0.0
+_CATALOG_RETRY_SECONDS = 60.0
+
+
+def catalog_bulk_load_enabled() -> bool:
+    return os.getenv("SCHEMA_CATALOG_BULK_LOAD", "false").strip().lower() in ("1", "true", "yes")
+
+
+async def _catalog_index() -> CatalogIndex:
+    """The local catalog index; built from the disk store on first use, then kept current by every fetch."""
+    if _catalog_index_built:
+        return _CATALOG
+
+    async def _build(_notify: Any) -> CatalogIndex:
+        global _catalog_index_built
+        loaded_at = await _SCHEMA_CACHE.catalog_loaded_at()
+        _CATALOG.replace_all(await _SCHEMA_CACHE.stored_tables())
+        if loaded_at is not None:
+            _CATALOG.complete = True
+            _CATALOG.loaded_at = loaded_at
+        _catalog_index_built = True
+        return _CATALOG
+
+    return await _INFLIGHT.do("catalog-index", _build)
+
+
+async def load_full_catalog(honeycomb: HoneycombClient) -> Dict[str, Any]:
+    """Bulk-load the whole Luminesce catalog (`tableLike=%`) into the schema cache and the local index."""
+
+    async def _load(_notify: Any) -> Dict[str, Any]:
+        global _catalog_failed_at
+        started_at = time.time()
         try:
-            cat = client.get_catalog_fields(t)
-            # Expecting a list of field dicts; if API returns wrapper, unwrap best-effort
-            fields = cat if isinstance(cat, list) else cat.get("values") if isinstance(cat, dict) else []
-            _SCHEMA_CACHE.set(t, fields or [])
+            fetched = await _fetch_catalog(honeycomb, "%")
+            fields = fetched if isinstance(fetched, list) else fetched.get("values") if isinstance(fetched, dict) else []
+            by_table: Dict[str, List[Dict[str, Any]]] = {}
+            for item in fields or []:
+                if item.get("TableName"):
+                    by_table.setdefault(item["TableName"], []).append(item)
+            if not by_table:
+                raise RuntimeError("catalog response contained no tables")
         except Exception:
-            continue
+            _catalog_failed_at = time.time()
+            raise
+        await _SCHEMA_CACHE.set_many(by_table)
+        index = await _catalog_index()
+        index.replace_all(by_table.items())
+        index.complete = True
+        index.loaded_at = time.time()
+        await _SCHEMA_CACHE.mark_catalog_loaded(index.loaded_at)
+        duration_ms = int((time.time() - started_at) * 1000)
+        print(f"[Fathom] Catalog bulk load: {len(by_table)} tables, {len(fields)} fields in {duration_ms} ms")
+        return {"tables": len(by_table), "fields": len(fields), "duration_ms": duration_ms}
+
+    return await _INFLIGHT.do("catalog-bulk", _load)
+
+
+def _reload_catalog_in_background(honeycomb: HoneycombClient) -> None:
+    global _catalog_reload_task
+    if _catalog_reload_task is not None and not _catalog_reload_task.done():
+        return
+
+    async def _reload() -> None:
+        try:
+            await load_full_catalog(honeycomb)
+        except Exception as e:
+            print(f"[Fathom] Catalog bulk reload failed: {e}")
+
+    _catalog_reload_task = asyncio.create_task(_reload())
+
 
+async def _full_catalog(honeycomb: HoneycombClient) -> Optional[CatalogIndex]:
+    """The complete local index when bulk loading is on (loading it on first use), else None.
 
-def _schema_summary_for_tables(tables: List[str], top_n: int = 12, main_only: bool = True) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    An index older than SCHEMA_CATALOG_REFRESH_SECONDS (default 21600) is still served while a reload runs.
+    """
+    if not catalog_bulk_load_enabled():
+        return None
+    index = await _catalog_index()
+    retry_blocked = time.time() - _catalog_failed_at < _CATALOG_RETRY_SECONDS
+    if not index.complete:
+        if retry_blocked:
+            return None
+        try:
+            await load_full_catalog(honeycomb)
+        except Exception as e:
+            print(f"[Fathom] Catalog bulk load failed: {e}")
+            return None
+    elif time.time() - (index.loaded_at or 0.0) > float(os.getenv("SCHEMA_CATALOG_REFRESH_SECONDS", "21600")) and not retry_blocked:
+        _reload_catalog_in_background(honeycomb)
+    return index
+
+
+async def most_used_tables(limit: int) -> List[str]:
+    """Tables most often looked up or queried recently (recorded in the schema store)."""
+    return await _SCHEMA_CACHE.most_used(limit)
+
+
+async def remove_stale_result_spills() -> None:
+    """Clear result-set spill files left by earlier or dead processes (app startup)."""
+    removed = await _RESULT_SETS.remove_stale_spills()
+    if removed:
+        print(f"[Fathom] Removed {removed} stale result set spill entries")
+
+
+async def close_schema_cache() -> None:
+    """Write buffered table usage and close the schema store (app shutdown)."""
+    await _SCHEMA_CACHE.close()
+
+
+async def prewarm_schema_cache(
+    honeycomb: HoneycombClient,
+    tables: List[str],
+    concurrency: Optional[int] = None,
+    status: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """Fetch catalog fields for `tables` concurrently; tables already fresh in the cache are skipped.
+
+    Progress is written into `status` (state, total, completed, fetched, skipped, failed) as it goes.
+    """
+    limit = max(1, concurrency or int(os.getenv("SCHEMA_PREWARM_CONCURRENCY", "4")))
+    status = status if status is not None else {}
+    status.update({"state": "running", "total": len(tables), "completed": 0, "fetched": 0, "skipped": 0, "failed": 0})
+    started_at = time.time()
+    semaphore = asyncio.Semaphore(limit)
+
+    async def _warm(table: str) -> None:
+        try:
+            entry = await _SCHEMA_CACHE.get(table)
+            if entry and not entry.get("stale"):
+                status["skipped"] += 1
+                return
+            async with semaphore:
+                fetched = await _fetch_catalog(honeycomb, table)
+            # Expecting a list of field dicts; if API returns wrapper, unwrap best-effort
+            fields = fetched if isinstance(fetched, list) else fetched.get("values") if isinstance(fetched, dict) else []
+            if fields:
+                await _cache_catalog_fields(fields, default_table=table)
+            status["fetched"] += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            status["failed"] += 1
+            print(f"[Fathom] Schema prewarm failed for {table}: {e}")
+        finally:
+            status["completed"] += 1
+
+    await asyncio.gather(*(_warm(t) for t in tables))
+    status.update({"state": "done", "duration_ms": int((time.time() - started_at) * 1000)})
+    return status
+
+
+async def warm_schema_catalog(
+    honeycomb: HoneycombClient,
+    tables: List[str],
+    status: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """Startup warm-up: build the local catalog index from disk, bulk-load the whole catalog when
+    SCHEMA_CATALOG_BULK_LOAD is on, then prewarm `tables` (already fresh after a bulk load)."""
+    status = status if status is not None else {}
+    index = await _catalog_index()
+    status["catalog"] = {"tables": len(index), "complete": index.complete}
+    if catalog_bulk_load_enabled():
+        status["state"] = "loading_catalog"
+        await _full_catalog(honeycomb)
+        status["catalog"] = {"tables": len(index), "complete": index.complete}
+    if tables:
+        return await prewarm_schema_cache(honeycomb, tables, status=status)
+    status["state"] = "done"
+    return status
+
+
+async def _schema_summary_for_tables(
+    tables: List[str],
+    top_n: int = 12,
+    main_only: bool = True,
+    honeycomb: Optional[HoneycombClient] = None,
+) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
     schemas: Dict[str, Any] = {}
     has_more: Dict[str, bool] = {}
     for t in tables:
-        entry = _SCHEMA_CACHE.get(t)
+        entry = await _SCHEMA_CACHE.get(t)
+        if entry and entry.get("stale") and honeycomb is not None:
+            _revalidate_in_background(honeycomb, t)
         if not entry:
-            suggestions = difflib.get_close_matches(t.strip().lower(), _SCHEMA_CACHE.list_tables(), n=5, cutoff=0.3)
+            suggestions = (await _catalog_index()).suggest_tables(t, n=5)
             err = {
                 "code": "SCHEMA_NOT_FOUND",
                 "message": f"No cached schema for '{t}'. Use catalog_get_fields(tableLike) to discover or choose a suggestion.",
@@ -234,8 +752,8 @@ def _schema_summary_for_tables(tables: List[str], top_n: int = 12, main_only: bo
     return {"by_table": schemas, "has_more": has_more}, None
 
 
-def run_sql_execute(
-    api_factory: lusid.ApiClientFactory | None,
+async def run_sql_execute(
+    honeycomb: HoneycombClient,
     sql: Optional[str] = None,
     scalar_parameters: Optional[Dict[str, Any]] = None,
     query_name: Optional[str] = None,
@@ -244,12 +762,21 @@ def run_sql_execute(
     mode: Optional[str] = None,
     topN: int = 12,
     mainOnly: bool = True,
+    progress: Optional[ProgressCallback] = None,
+    use_cache: bool = True,
+    session_id: Optional[str] = None,
 ) -> Dict[str, Any]:
     """Combined schema + SQL tool (keeps the same name for the agent).
 
     - If only tables provided or mode=='schema': return cached schema summary.
     - If sql provided and mode in (None, 'both', 'execute'): execute SQL; if tables provided, also include schema summary.
     - On cache miss: return SCHEMA_NOT_FOUND with did_you_mean suggestions.
+    - SQL runs as a Luminesce background query (HONEYCOMB_SQL_BACKGROUND, default true): progress is reported
+      through `progress(payload)` while polling; falls back to /api/Sql/json where SqlBackground is unavailable.
+    - Results are cached per normalised SQL + caller identity (see SqlResultCache); hits carry `cached: true`.
+      Identical cacheable queries already in flight are joined rather than re-sent (single-flight).
+    - With a `session_id` the full result is kept as a session result set; its `result_id` can be passed to
+      result_query for local filters, group-bys and top-N.
     """
     include_schema_only = (sql is None) or (mode == "schema")
     include_both = sql is not None and (mode in (None, "both"))
@@ -281,7 +808,7 @@ def run_sql_execute(
         tables = inferred if inferred else None
 
     if tables:
-        schema_block, err = _schema_summary_for_tables(tables, top_n=topN, main_only=mainOnly)
+        schema_block, err = await _schema_summary_for_tables(tables, top_n=topN, main_only=mainOnly, honeycomb=honeycomb)
         if err is not None:
             return {"error": err}
         if include_schema_only and not include_both and not include_execute_only:
@@ -290,7 +817,8 @@ def run_sql_execute(
     if sql is None:
         return {"schema": schema_block} if schema_block else {"message": "No SQL provided."}
 
-    client = _get_honeycomb_client(api_factory)
+    _SCHEMA_CACHE.record_usage(referenced_tables(sql))
+
     # Normalize scalar parameters (accepted input; currently not sent downstream as we inline literals)
     normalized_params: Dict[str, Any] = {}
     if isinstance(scalar_parameters, dict):
@@ -310,22 +838,173 @@ def run_sql_execute(
             except Exception:
                 normalized_params = {}
 
-    started_at = time.time()
-    raw = client.execute_sql_json(sql=sql, scalar_parameters=normalized_params, query_name=query_name, json_proper=True)
-    duration_ms = int((time.time() - started_at) * 1000)
-
-    columns, sample_rows, row_count = _summarize_tabular_result(raw, sample_limit=sample_limit)
-    result: Dict[str, Any] = {
-        "query_name": query_name,
-        "duration_ms": duration_ms,
-        "row_count": row_count,
-        "columns": columns,
-        "sample_rows": sample_rows,
-        "data": raw if row_count == 0 else None,
-        "executedSql": sql,
-    }
+    cache_key: Optional[str] = None
+    if use_cache and _RESULT_CACHE.cacheable(sql):
+        cache_key = _RESULT_CACHE.key(sql, await honeycomb.caller_identity(), variant=f"sample={sample_limit}")
+        hit = _RESULT_CACHE.get(cache_key)
+        if hit is not None:
+            cached, age = hit
+            result = dict(cached)
+            result.update({"query_name": query_name, "executedSql": sql, "duration_ms": 0, "cached": True, "cache_age_ms": int(age * 1000)})
+            if session_id:
+                table = await _RESULT_SETS.find_by_key(cache_key)
+                if table is not None:
+                    result["result_id"] = await _RESULT_SETS.add(session_id, table, sql, key=cache_key)
+            if schema_block is not None:
+                result["schema"] = schema_block
+            return result
+
+    async def _execute(notify: Optional[ProgressCallback]) -> Tuple[Dict[str, Any], ColumnarResult]:
+        global _background_supported
+        started_at = time.time()
+        execution_id: Optional[str] = None
+        raw: Any = []
+        background = _use_background_queries()
+        if background:
+            try:
+                execution_id, table = await _run_background_query(honeycomb, sql, query_name, notify)
+            except BackgroundQueryUnavailable as e:
+                print(f"[Fathom] SqlBackground unavailable ({e}); using /api/Sql/json")
+                _background_supported = False
+                background = False
+        if not background:
+            # Rows go into columnar form as the body streams in; only non-array bodies are parsed whole
+            stream = honeycomb.stream_sql_json(sql=sql, query_name=query_name, json_proper=True)
+            table = await ColumnarResult.from_row_stream(stream, max_rows=_result_max_rows())
+            if stream.document is not None:
+                raw = stream.document
+                table = ColumnarResult.from_document(raw, max_rows=_result_max_rows())
+        duration_ms = int((time.time() - started_at) * 1000)
+        row_count = table.total_rows
+
+        executed: Dict[str, Any] = {
+            "query_name": query_name,
+            "duration_ms": duration_ms,
+            "row_count": row_count,
+            "columns": table.columns,
+            "sample_rows": table.head(sample_limit),
+            "column_stats": table.stats(),
+            "data": raw if row_count == 0 else None,
+            "executedSql": sql,
+        }
+        if execution_id is not None:
+            executed["execution_id"] = execution_id
+        if table.truncated:
+            executed["stats_row_count"] = len(table)
+        if cache_key is not None:
+            _RESULT_CACHE.set(cache_key, executed)
+        return executed, table
+
+    if cache_key is not None:
+        # Concurrent identical read-only probes share one Honeycomb call (and its progress updates)
+        executed, table = await _INFLIGHT.do(f"sql:{cache_key}", _execute, listener=progress)
+    else:
+        executed, table = await _execute(progress)
+    result = dict(executed)
+    if session_id and table.columns:
+        result["result_id"] = await _RESULT_SETS.add(session_id, table, sql, key=cache_key)
     if schema_block is not None:
         result["schema"] = schema_block
     return result
 
 
+_RESULT_QUERY_MAX_ROWS = 200
+
+
+async def drop_session_results(session_id: str) -> None:
+    """Forget every result set of a chat session (memory and spilled files)."""
+    await _RESULT_SETS.drop_session(session_id)
+
+
+def _sort_key(value: Any, descending: bool = False) -> Tuple[bool, Any]:
+    """Nulls last in either direction (pair with `reverse=descending`)."""
+    if value is None:
+        return (not descending, "")
+    return (descending, value)
+
+
+async def run_result_query(
+    session_id: Optional[str],
+    result_id: str,
+    where: Optional[List[Dict[str, Any]]] = None,
+    columns: Optional[List[str]] = None,
+    group_by: Optional[List[str]] = None,
+    aggregates: Optional[List[Dict[str, Any]]] = None,
+    order_by: Optional[List[Dict[str, Any]]] = None,
+    limit: int = 20,
+) -> Dict[str, Any]:
+    """Filter / group / aggregate / top-N over a stored sql_execute result without another Luminesce call.
+
+    - where: [{column, op, value}] with op in =, !=, >, >=, <, <=, in, not_in, contains, startswith, is_null, not_null
+    - group_by + aggregates ({fn: count|sum|avg|min|max|count_distinct, column?, as?}); group_by alone counts rows per group
+    - order_by: [{column, desc?}] over output columns (aggregate aliases included); limit ≤ 200
+    """
+    started_at = time.time()
+    found = await _RESULT_SETS.get(session_id, result_id) if session_id else None
+    if found is None:
+        return {
+            "error": {
+                "code": "RESULT_NOT_FOUND",
+                "message": f"No stored result '{result_id}' in this session. Run sql_execute again to get a result_id.",
+            }
+        }
+    table, source_sql = found
+    limit = max(1, min(int(limit or 20), _RESULT_QUERY_MAX_ROWS))
+    try:
+        rows = table.filter(where or [])
+        if group_by or aggregates:
+            out_columns, out_rows = table.aggregate(rows, group_by or [], aggregates or [])
+        else:
+            out_columns = list(columns) if columns else table.columns
+            unknown = [name for name in out_columns if name not in table.columns]
+            if unknown:
+                raise ValueError(f"Unknown column: {', '.join(unknown)}. Columns: {', '.join(table.columns)}")
+            out_rows = None
+    except ValueError as e:
+        return {"error": {"code": "INVALID_QUERY", "message": str(e)}}
+
+    orders = [o for o in (order_by or []) if o.get("column")]
+    for o in orders:
+        if o["column"] not in out_columns and (out_rows is not None or o["column"] not in table.columns):
+            return {"error": {"code": "INVALID_QUERY", "message": f"Unknown order_by column: {o['column']}"}}
+    if out_rows is None:
+        # Plain selection: order/top-N on row indices, then materialise only the rows returned
+        selected: List[int] = rows
+        if len(orders) == 1:
+            col = table.column(orders[0]["column"])
+            pick = heapq.nlargest if orders[0].get("desc") else heapq.nsmallest
+            desc = bool(orders[0].get("desc"))
+            try:
+                selected = pick(limit, rows, key=col.sort_key(desc))
+            except TypeError:
+                selected = pick(limit, rows, key=lambda i: _sort_key(None if col.value(i) is None else str(col.value(i)), desc))
+        elif orders:
+            selected = list(rows)
+            for o in reversed(orders):
+                col, desc = table.column(o["column"]), bool(o.get("desc"))
+                try:
+                    selected.sort(key=col.sort_key(desc), reverse=desc)
+                except TypeError:
+                    selected.sort(key=lambda i: _sort_key(None if col.value(i) is None else str(col.value(i)), desc), reverse=desc)
+        result_rows = [{name: table.column(name).value(i) for name in out_columns} for i in selected[:limit]]
+        matched = len(rows)
+    else:
+        for o in reversed(orders):
+            name, desc = o["column"], bool(o.get("desc"))
+            try:
+                out_rows.sort(key=lambda r: _sort_key(r.get(name), desc), reverse=desc)
+            except TypeError:
+                out_rows.sort(key=lambda r: _sort_key(None if r.get(name) is None else str(r.get(name)), desc), reverse=desc)
+        result_rows = out_rows[:limit]
+        matched = len(out_rows)
+
+    return {
+        "result_id": result_id,
+        "source_sql": source_sql,
+        "source_rows": len(table),
+        "source_truncated": table.truncated,
+        "duration_ms": int((time.time() - started_at) * 1000),
+        "matched": matched,
+        "columns": out_columns,
+        "rows": result_rows,
+    }
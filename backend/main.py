@@ -2,6 +2,11 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fathom.routers import tasks
 from fathom.routers import playground as playground_router
+from fathom.cache.task_index import TaskIndex
+from fathom.clients.honeycomb_client import create_honeycomb_client
+from fathom.clients.token_provider import LusidTokenProvider
+from fathom.tools.registry import prewarm_table_list
+from fathom.tools.sql import catalog_bulk_load_enabled, close_schema_cache, remove_stale_result_spills, warm_schema_catalog
 import os
 from dotenv import load_dotenv
 import asyncio
@@ -34,13 +39,25 @@ async def lifespan(app: FastAPI):
     else:
         print(f"[Fathom] Using LUSID secrets: {secrets_path}")
 
-    # Create shared aiohttp session and ApiClientFactory
-    session = aiohttp.ClientSession()
+    # Create shared aiohttp session (keep-alive pool with per-host limits) and ApiClientFactory
+    connector = aiohttp.TCPConnector(
+        limit=int(os.getenv("HTTP_POOL_LIMIT", "100")),
+        limit_per_host=int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "20")),
+        keepalive_timeout=float(os.getenv("HTTP_KEEPALIVE_SECONDS", "30")),
+        ttl_dns_cache=300,
+    )
+    timeout = aiohttp.ClientTimeout(
+        total=float(os.getenv("HTTP_TIMEOUT_SECONDS", "300")),
+        connect=float(os.getenv("HTTP_CONNECT_TIMEOUT_SECONDS", "10")),
+    )
+    session = aiohttp.ClientSession(connector=connector, timeout=timeout)
     app.state.http_session = session
+    config_loaders = None
     try:
         loader = SecretsFileConfigurationLoader(secrets_path)
+        config_loaders = [loader]
         app.state.lusid_factory = lusid.ApiClientFactory(
-            config_loaders=[loader],
+            config_loaders=config_loaders,
             app_name="Fathom",
             client_session=session
         )
@@ -48,10 +65,45 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         print(f"[Fathom] Failed to initialise LUSID ApiClientFactory: {e}")
         app.state.lusid_factory = None
+        config_loaders = None
+
+    # Shared bearer token cache, refreshed in the background before expiry
+    app.state.token_provider = LusidTokenProvider(config_loaders)
+    app.state.token_provider.start()
+
+    # Process-wide workflow task index (filled lazily on first /fathom/tasks request)
+    app.state.task_index = TaskIndex()
+
+    # Result sets spilled by earlier runs are unreachable now; clear them (other live workers' files are kept)
+    await remove_stale_result_spills()
+
+    # Warm the Luminesce schema cache / catalog index in the background (readiness is not delayed; progress on /health)
+    app.state.schema_prewarm = {"state": "disabled"}
+    prewarm_task = None
+    prewarm_enabled = os.getenv("SCHEMA_PREWARM_ENABLED", "true").strip().lower() not in ("0", "false", "no")
+    if (prewarm_enabled or catalog_bulk_load_enabled()) and app.state.lusid_factory is not None:
+        app.state.schema_prewarm = {"state": "pending"}
+
+        async def _prewarm() -> None:
+            tables = await prewarm_table_list() if prewarm_enabled else []
+            await warm_schema_catalog(create_honeycomb_client(app), tables, status=app.state.schema_prewarm)
+
+        prewarm_task = asyncio.create_task(_prewarm())
 
     yield
 
     # Teardown
+    if prewarm_task is not None:
+        # Let the warm-up unwind before the session and schema store it uses are closed
+        prewarm_task.cancel()
+        try:
+            await prewarm_task
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"[Fathom] Schema prewarm failed: {e}")
+    await app.state.token_provider.stop()
+    await close_schema_cache()
     try:
         await session.close()
     except Exception:
@@ -82,7 +134,11 @@ app.include_router(playground_router.router, prefix="/v1/playground", tags=["pla
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy", "service": "fathom-backend"}
+    return {
+        "status": "healthy",
+        "service": "fathom-backend",
+        "schemaPrewarm": getattr(app.state, "schema_prewarm", {"state": "disabled"}),
+    }
 
 if __name__ == "__main__":
     import uvicorn
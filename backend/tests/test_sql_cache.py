@@ -0,0 +1,39 @@
+import pytest
+
+from fathom.cache.sql_results import SqlResultCache
+
+
+@pytest.mark.parametrize(
+    "sql",
+    [
+        "select * from Lusid.Instrument.Equity limit 10",
+        "SELECT replace(DisplayName, 'a', 'b') FROM Lusid.Portfolio;",
+        "with p as (select PortfolioCode from Lusid.Portfolio) select * from p",
+        "-- latest\nselect Code from Lusid.Portfolio where Code = 'x;y'",
+    ],
+)
+def test_plain_reads_are_cacheable(sql):
+    assert SqlResultCache(ttl_seconds=60, max_bytes=1024, exclude=[]).cacheable(sql)
+
+
+@pytest.mark.parametrize(
+    "sql",
+    [
+        "@rows = select 'p1' as Code; select * from Lusid.Portfolio.Writer where ToWrite = @rows",
+        "@@scope = select 'x'; select * from Lusid.Portfolio where PortfolioScope = @@scope",
+        "select * from Lusid.Portfolio.Writer",
+        "select * from Drive.SaveAs where UseDefaultIfEmpty = 1",
+        "select * from Sys.Admin.SetupView",
+        "select 1; delete from Lusid.Portfolio",
+        "insert into t select * from Lusid.Portfolio",
+        "with x as (select 1) update t set a = 1",
+        "select * from Lusid.Portfolio where Created > getdate()",
+    ],
+)
+def test_scripts_writes_and_volatile_queries_are_not_cacheable(sql):
+    assert not SqlResultCache(ttl_seconds=60, max_bytes=1024, exclude=[]).cacheable(sql)
+
+
+def test_exclude_patterns_still_apply():
+    cache = SqlResultCache(ttl_seconds=60, max_bytes=1024, exclude=["Scheduler.*"])
+    assert not cache.cacheable("select * from Scheduler.Job")
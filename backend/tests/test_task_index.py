@@ -0,0 +1,74 @@
+import pytest
+
+from fathom.cache.task_index import TaskIndex
+from fathom.clients.workflow_filters import filter_tasks
+from fathom.models.tasks import TaskFilter, WorkflowTask
+
+
+def _task(i: int, name: str, state: str, created: str, fields=(), correlation_ids=()) -> WorkflowTask:
+    return WorkflowTask(
+        id=f"t{i}",
+        taskDefinitionId={"scope": "s", "code": "c"},
+        taskDefinitionVersion={"asAtModified": "2024-01-01T00:00:00Z"},
+        taskDefinitionDisplayName=name,
+        state=state,
+        correlationIds=list(correlation_ids),
+        version={
+            "asAtCreated": created,
+            "userIdCreated": "u",
+            "requestIdCreated": "r",
+            "asAtModified": created,
+            "userIdModified": "u",
+            "requestIdModified": "r",
+            "asAtVersionNumber": 1,
+        },
+        terminalState=state == "Done",
+        asAtLastTransition=created,
+        fields=[{"name": k, "value": v} for k, v in fields],
+    )
+
+
+TASKS = [
+    _task(1, "Trade Break Review", "Open", "2024-03-01T09:00:00Z", [("Portfolio", "UK-Equity"), ("Trader", "J. Smith")], ["c1"]),
+    _task(2, "Trade Break Review", "Done", "2024-03-02T10:30:00Z", [("Portfolio", "US-Credit")], ["c1", "c2"]),
+    _task(3, "Price Exception", "Open", "2024-03-05T08:00:00Z", [("Instrument", "GB00B03MLX29"), ("Note", None)]),
+    _task(4, "Reconciliation - Cash", "InProgress", "2024-04-10T12:00:00Z", [("Account", "cash-001")], ["c3"]),
+    _task(5, "Corporate Action: Dividend", "Pending", "2024-04-11T00:00:00Z", [("Event", "div/2024-Q1")]),
+    _task(6, "price exception", "Done", "2024-02-28T23:59:59Z"),
+]
+
+QUERIES = [
+    None, "", " ", "-", "  -- ", ":/", "trade", "Trade Break", "tra bre", "review", "eview", "open",
+    "uk-equity", "uk eq", "price", "PRICE EXC", "gb00", "cash-001", "cash", "div/2024", "2024", "q1",
+    "smith", "j. s", "nomatch", "recon cash", "corporate action", "action:",
+]
+
+FILTERS = [
+    {},
+    {"states": ["Open"]},
+    {"states": ["done", "Pending"]},
+    {"correlationIds": ["c1"]},
+    {"dateFrom": "2024-03-01", "dateTo": "2024-03-31"},
+    {"dateFrom": "2024-03-02T10:30:00Z"},
+]
+
+
+@pytest.fixture(scope="module")
+def index() -> TaskIndex:
+    idx = TaskIndex()
+    idx.replace_all(TASKS)
+    return idx
+
+
+@pytest.mark.parametrize("mode", [None, "substring", "prefix"])
+@pytest.mark.parametrize("query", QUERIES)
+@pytest.mark.parametrize("extra", FILTERS)
+def test_query_matches_filter_tasks(index: TaskIndex, mode, query, extra) -> None:
+    task_filter = TaskFilter(searchQuery=query, searchMode=mode, **extra)
+    expected = {task.id for task in filter_tasks(TASKS, task_filter)}
+    assert {task.id for task in index.query(task_filter)} == expected
+
+
+def test_query_is_newest_first(index: TaskIndex) -> None:
+    created = [task.version.asAtCreated for task in index.query(TaskFilter())]
+    assert created == sorted(created, reverse=True)